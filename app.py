@@ -1,16 +1,29 @@
+import atexit
+import codecs
+import contextlib
+import functools
+import hashlib
+import hmac
 import os
+import random
 import secrets
+import threading
+import time
 import uuid
+import zlib
 import json
+import logging
+import multiprocessing
 import requests
 import magic
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import BinaryIO, Callable, List, Dict, Optional, Tuple
 from urllib.parse import urljoin, urlparse
 from io import BytesIO
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from flask_socketio import SocketIO, emit
+from flask import Flask, Response, abort, g, render_template, request, jsonify, send_file, session, redirect, stream_with_context, url_for
+from flask_socketio import SocketIO, emit, join_room
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
 import anthropic
@@ -21,6 +34,31 @@ from docx import Document
 import pandas as pd
 import markdown
 
+import tracing
+from assets import StaticAssets, available_encodings, compress, is_compressible
+from blobstore import BlobStore
+from images import VISION_MIME_TYPES, describe_image, image_block, images_supported, prepare_image
+from profiling import ProfileStore, SamplingProfiler
+from upload_stream import UploadRejected, receive_upload
+from batch import BatchPipeline, extraction_error_rows
+from cache import ResponseCache
+from cancellation import CancellationRegistry, CancelToken
+from realtime import queue_options, session_room
+from routing import ModelRouter, Route
+from sessionlocks import SessionLocks, TurnQueue, TurnTimeout
+from records import Conversation, FileEntry, Message, SearchEntry, format_id, format_timestamp, new_id, parse_id
+from metrics import Registry, estimate_size
+from resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    RETRYABLE_STATUS_CODES,
+    call_with_resilience,
+    classify_anthropic_error,
+    classify_requests_error,
+)
+from tracing import span, traced
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -37,91 +75,510 @@ app.config['SECRET_KEY'] = SECRET_KEY
 
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 app.config['UPLOAD_FOLDER'] = 'uploads'
-socketio = SocketIO(app, cors_allowed_origins="*")
+# /api/upload/stream reads the raw body itself, so it gets its own, much higher ceiling
+STREAM_UPLOAD_MAX_BYTES = int(os.getenv('STREAM_UPLOAD_MAX_BYTES', 512 * 1024 * 1024))
+# Bytes of an upload kept in memory before it spills to a temp file
+UPLOAD_SPOOL_BYTES = int(os.getenv('UPLOAD_SPOOL_BYTES', 1024 * 1024))
+EXTRACTABLE_MIME_TYPES = {
+    'application/pdf',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.ms-excel'
+}
+# Processes that extract several uploaded documents at once (0 extracts them in the request)
+FILE_EXTRACTION_WORKERS = int(os.getenv('FILE_EXTRACTION_WORKERS', 4))
+MAX_UPLOAD_FILES = int(os.getenv('MAX_UPLOAD_FILES', 20))
+# Images are downscaled to this many pixels on the longer side and this many encoded bytes
+# before they are sent as vision input; both bound upload latency and input tokens
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', 1568))
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', 1024 * 1024))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+# With a message queue (redis://, amqp://, ...) events reach clients on any worker or node;
+# memory:// is an in-process stand-in for tests and single-process development
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'claude-chat')
+socketio = SocketIO(app, cors_allowed_origins="*", **queue_options(SOCKETIO_MESSAGE_QUEUE, SOCKETIO_CHANNEL))
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 try:
-    anthropic_client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+    # Retries are handled by our own resilience layer, not the SDK
+    anthropic_client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), max_retries=0)
 except Exception as e:
     print(f"Error initializing Anthropic client: {e}")
     anthropic_client = None
 
 BRAVE_API_KEY = os.getenv('BRAVE_API_KEY')
 SEARCH_ENDPOINTS = {
-    'brave': 'https://api.search.brave.com/res/v1/web/search',
-    'duckduckgo': 'https://api.duckduckgo.com/'
+    'brave': os.getenv('BRAVE_SEARCH_URL', 'https://api.search.brave.com/res/v1/web/search'),
+    'duckduckgo': os.getenv('DUCKDUCKGO_SEARCH_URL', 'https://html.duckduckgo.com/html/')
+}
+
+UPSTREAM_RETRY_POLICY = RetryPolicy(
+    max_attempts=int(os.getenv('UPSTREAM_MAX_ATTEMPTS', 3)),
+    base_delay=float(os.getenv('UPSTREAM_BACKOFF_BASE', 0.5)),
+    max_delay=float(os.getenv('UPSTREAM_BACKOFF_MAX', 8.0)),
+    max_retry_after=float(os.getenv('UPSTREAM_MAX_RETRY_AFTER', 30.0))
+)
+UPSTREAM_BREAKERS = {
+    name: CircuitBreaker(
+        name,
+        failure_threshold=int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5)),
+        reset_timeout=float(os.getenv('BREAKER_RESET_TIMEOUT', 30.0))
+    )
+    for name in ('anthropic', 'brave', 'duckduckgo')
 }
 
+# Off by default: Server-Timing shows anyone the per-stage breakdown of each request
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'false').lower() == 'true'
+TRACE_LOG_ENABLED = os.getenv('TRACE_LOG', 'false').lower() == 'true'
+# Endpoints whose JSON payload carries the trace id for bug reports
+TRACED_PAYLOAD_ENDPOINTS = {'chat', 'upload_file', 'upload_files', 'upload_stream'}
+
+# Admin endpoints and the X-Profile header are disabled unless a token is configured
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0.0))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.005))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', 50))
+# Endpoints PROFILE_SAMPLE_RATE applies to; any endpoint can be profiled on demand
+PROFILED_ENDPOINTS = {'chat', 'upload_file', 'upload_files', 'upload_stream', 'search', 'fetch_url'}
+PROFILER = SamplingProfiler(PROFILE_INTERVAL)
+PROFILE_STORE = ProfileStore(PROFILE_DIR, PROFILE_KEEP)
+if ADMIN_TOKEN or PROFILE_SAMPLE_RATE > 0:
+    # Must happen at import, on the main thread
+    PROFILER.install()
+
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+ASSET_MAX_AGE = 365 * 24 * 3600
+STATIC_ASSETS = StaticAssets(app.static_folder)
+
+# 'native' uses the API's extended thinking with a token budget per mode;
+# 'template' falls back to wrapping the prompt in a hand-written <thinking> template
+THINKING_STRATEGY = os.getenv('THINKING_STRATEGY', 'native')
+THINKING_ANSWER_TOKENS = int(os.getenv('THINKING_ANSWER_TOKENS', 4000))
+THINKING_BUDGET_TOKENS = {
+    'deep_analysis': 10000,
+    'research_synthesis': 8000,
+    'strategic_thinking': 8000,
+    'creative_exploration': 6000,
+    **json.loads(os.getenv('THINKING_BUDGET_TOKENS', '{}'))
+}
+
+# Ordered policy table picking the model and max_tokens per chat request; see routing.DEFAULT_ROUTES
+MODEL_ROUTER = ModelRouter.from_json(os.getenv('MODEL_ROUTES'))
+
+# Generations in flight per worker; further chat requests wait briefly for a slot, then get a 503
+CHAT_MAX_CONCURRENCY = int(os.getenv('CHAT_MAX_CONCURRENCY', 64))
+CHAT_SLOT_TIMEOUT = float(os.getenv('CHAT_SLOT_TIMEOUT', 10))
+# How long a message waits for the previous answer in its conversation; that answer is superseded, so usually briefly
+CHAT_TURN_TIMEOUT = float(os.getenv('CHAT_TURN_TIMEOUT', 30))
+# How long a session's answers outlive its last socket, so a reload or reconnect doesn't cancel them
+CHAT_DISCONNECT_GRACE = float(os.getenv('CHAT_DISCONNECT_GRACE', 10))
+CHAT_SLOTS = threading.BoundedSemaphore(CHAT_MAX_CONCURRENCY)
+CANCELLATIONS = CancellationRegistry()
+
+# Polling cadence for Message Batches submitted by the batch CLI and /api/batch
+BATCH_POLL_INTERVAL = float(os.getenv('BATCH_POLL_INTERVAL', 5))
+BATCH_MAX_POLL_INTERVAL = float(os.getenv('BATCH_MAX_POLL_INTERVAL', 60))
+# Batch id -> custom id/filename mapping and extraction failures, for batches submitted by this process.
+# Bounded: a batch ends within 24 hours, and older entries only cost the filenames in their results
+BATCH_JOBS = ResponseCache(
+    max_entries=int(os.getenv('BATCH_JOBS_MAX_ENTRIES', 256)),
+    ttl=float(os.getenv('BATCH_JOBS_TTL', 7 * 24 * 3600))
+)
+
+# Opt-in: identical payloads (model, max_tokens, messages, thinking mode) reuse the earlier answer
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+# Processed images by content hash, so a re-uploaded screenshot isn't resized again
+IMAGE_CACHE = ResponseCache(
+    max_entries=int(os.getenv('IMAGE_CACHE_MAX_ENTRIES', 64)),
+    ttl=float(os.getenv('IMAGE_CACHE_TTL', 3600))
+)
+RESPONSE_CACHE = ResponseCache(
+    max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 256)),
+    ttl=float(os.getenv('RESPONSE_CACHE_TTL', 300))
+) if RESPONSE_CACHE_ENABLED else None
+
+trace_logger = logging.getLogger('claude_chat.trace')
+if TRACE_LOG_ENABLED and not trace_logger.handlers:
+    trace_logger.addHandler(logging.StreamHandler())
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+
+METRICS = Registry()
+REQUEST_LATENCY = METRICS.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route', 'status'))
+SEARCH_LATENCY = METRICS.histogram(
+    'search_duration_seconds', 'Web search latency by provider', ('provider',))
+PAGE_FETCH_LATENCY = METRICS.histogram(
+    'page_fetch_duration_seconds', 'Page fetch and text extraction latency')
+FILE_EXTRACTION_LATENCY = METRICS.histogram(
+    'file_extraction_duration_seconds', 'Uploaded file text extraction latency by MIME type', ('mime_type',))
+LLM_FIRST_TOKEN_LATENCY = METRICS.histogram(
+    'llm_time_to_first_token_seconds', 'Time until the first token of a Claude response arrives', ('model',))
+LLM_LATENCY = METRICS.histogram(
+    'llm_duration_seconds', 'Total Claude call latency including retries', ('model', 'thinking_mode'))
+LLM_TOKENS = METRICS.counter(
+    'llm_tokens_total', 'Claude token usage by thinking mode', ('thinking_mode', 'kind'))
+LLM_CACHE_REQUESTS = METRICS.counter(
+    'llm_cache_requests_total', 'Response cache lookups by result', ('result',))
+LLM_CACHE_TOKENS_SAVED = METRICS.counter(
+    'llm_cache_tokens_saved_total', 'Claude tokens not spent thanks to response cache hits')
+CHAT_CANCELLED = METRICS.counter(
+    'chat_cancelled_total', 'Chat generations stopped before completion by reason', ('reason',))
+CHAT_GENERATIONS = METRICS.gauge(
+    'chat_generations_active', 'Chat requests currently holding a concurrency slot')
+SOCKETIO_CLIENTS = METRICS.gauge(
+    'socketio_connected_clients', 'Currently connected Socket.IO clients')
+METRICS.gauge(
+    'conversations_live', 'Conversations held in memory',
+    callback=lambda: {(): len(conversation_manager.conversations)})
+METRICS.gauge(
+    'conversations_memory_bytes', 'Estimated memory held by in-memory conversations',
+    callback=lambda: {(): conversation_manager.memory_bytes})
+METRICS.gauge(
+    'conversation_blob_bytes', 'Large conversation values in the blob store, as stored and as referenced', ('kind',),
+    callback=lambda: {
+        (kind,): conversation_manager.blobs.stats()[f'{kind}_bytes'] for kind in ('stored', 'referenced')
+    })
+METRICS.gauge(
+    'upstream_circuit_open', 'Whether the circuit breaker for an upstream is open (1) or not (0)', ('upstream',),
+    callback=lambda: {(name,): int(breaker.state == breaker.OPEN) for name, breaker in UPSTREAM_BREAKERS.items()})
+
+def emit_to_session(session_id: str, event: str, payload: dict):
+    # Safe from request handlers and background work alike; the queue routes it to the right worker
+    socketio.emit(event, payload, to=session_room(session_id))
+
+def record_token_usage(thinking_mode: str, **counts):
+    for kind, count in counts.items():
+        if isinstance(count, int):
+            LLM_TOKENS.inc(count, thinking_mode=thinking_mode, kind=kind)
+
+def call_anthropic(func: Callable):
+    return call_with_resilience(func, UPSTREAM_BREAKERS['anthropic'], UPSTREAM_RETRY_POLICY, classify_anthropic_error)
+
+def content_chars(content) -> int:
+    # Content is a string, or a list of blocks when a message carries an image
+    if isinstance(content, str):
+        return len(content)
+    return sum(len(block.get('text', '')) for block in content)
+
+_process_pools: Dict[str, ProcessPoolExecutor] = {}
+_process_pools_lock = threading.Lock()
+
+def process_pool(name: str, workers: int, initializer: Optional[Callable] = None) -> ProcessPoolExecutor:
+    # One long-lived pool per kind of job, sized on first use; spawning workers per request costs more than it saves
+    with _process_pools_lock:
+        pool = _process_pools.get(name)
+        if pool is None:
+            # Spawned rather than forked: eventlet's hub does not survive a fork
+            pool = _process_pools[name] = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context('spawn'), initializer=initializer)
+        return pool
+
+def shutdown_process_pools():
+    # Under eventlet the executors' own exit hook never wakes their workers, and multiprocessing's
+    # then waits for them forever. Registered after both, so it runs first, while the hub still runs
+    with _process_pools_lock:
+        pools = list(_process_pools.values())
+        _process_pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+atexit.register(shutdown_process_pools)
+
+def run_image_job(func, *args):
+    # Resizing is CPU-bound; worker processes keep it off the request's thread and the GIL
+    if IMAGE_WORKERS <= 0:
+        return func(*args)
+    return process_pool('images', IMAGE_WORKERS).submit(func, *args).result()
+
+def _init_extraction_worker():
+    # Already in a worker process: resize images here rather than in a pool of its own
+    global IMAGE_WORKERS
+    IMAGE_WORKERS = 0
+
+def build_request_options(messages: List[Dict], thinking_mode: str, has_files: bool = False,
+                          has_search: bool = False) -> Tuple[Route, dict]:
+    # Cheap, short turns go to a faster model; the policy table decides
+    route = MODEL_ROUTER.route(
+        thinking_mode,
+        prompt_chars=sum(content_chars(message['content']) for message in messages),
+        has_files=has_files,
+        has_search=has_search
+    )
+    options = {'model': route.model, 'messages': messages}
+    if thinking_mode != 'normal' and THINKING_STRATEGY == 'native':
+        options.update(ExtendedThinking.native_options(thinking_mode, route.max_tokens))
+    else:
+        # Adjust token limit based on thinking mode unless the route sets one
+        options['max_tokens'] = route.max_tokens or (4000 if thinking_mode == 'normal' else 6000)
+    return route, options
+
+def batch_params(prompt: str, thinking_mode: str, document: Dict) -> dict:
+    # One document and the shared prompt, phrased the way chat() would send them
+    content = ConversationManager.format_file_prompt(document['filename'], document['content'], prompt)
+    if thinking_mode != 'normal' and THINKING_STRATEGY != 'native':
+        content = ExtendedThinking.create_thinking_prompt(content, thinking_mode)
+    _, options = build_request_options([{'role': 'user', 'content': content}], thinking_mode, has_files=True)
+    return options
+
+def batch_pipeline(prompt: str = '', thinking_mode: str = 'normal') -> BatchPipeline:
+    # Only submitting needs the prompt; polling and results work on any batch
+    return BatchPipeline(
+        anthropic_client,
+        lambda document: batch_params(prompt, thinking_mode, document),
+        call=call_anthropic,
+        poll_interval=BATCH_POLL_INTERVAL,
+        max_poll_interval=BATCH_MAX_POLL_INTERVAL
+    )
+
+def stream_reply(session_id: str, options: dict, cancel_token: Optional[CancelToken] = None) -> Tuple[dict, Optional[float]]:
+    # Thinking and answer text reach the session's sockets as separate events while they are generated.
+    # Each attempt announces itself, so the client drops partial text from a failed one before a retry
+    emit_to_session(session_id, 'chat_status', {
+        'stage': 'generating',
+        'request_id': cancel_token.request_id if cancel_token else None
+    })
+    started = time.perf_counter()
+    first_token = None
+    thinking_parts, text_parts = [], []
+    cancelled = False
+    with anthropic_client.messages.stream(**options) as stream:
+        for event in stream:
+            if cancel_token is not None and cancel_token.cancelled:
+                # Leaving the block closes the upstream connection, so generation stops being billed
+                cancelled = True
+                break
+            if event.type != 'content_block_delta':
+                continue
+            if event.delta.type == 'thinking_delta':
+                name, delta, parts = 'chat_thinking', event.delta.thinking, thinking_parts
+            elif event.delta.type == 'text_delta':
+                name, delta, parts = 'chat_delta', event.delta.text, text_parts
+            else:
+                continue
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            parts.append(delta)
+            emit_to_session(session_id, name, {'delta': delta})
+        # A cancelled stream never got its final usage; only the input count is known
+        usage = stream.current_message_snapshot.usage if cancelled else stream.get_final_message().usage
+
+    thinking = ''.join(thinking_parts)
+    text = ''.join(text_parts)
+    # Measured, and covers the thinking as well as the answer
+    output_tokens = None if cancelled else usage.output_tokens
+    thinking_tokens_estimated = None
+    if thinking and output_tokens is not None:
+        # Usage has no separate thinking count; this is the thinking's share of the characters, for display only
+        thinking_tokens_estimated = round(output_tokens * len(thinking) / (len(thinking) + len(text)))
+    reply = {
+        'text': text,
+        'thinking': thinking or None,
+        'input_tokens': usage.input_tokens,
+        'output_tokens': output_tokens,
+        'thinking_tokens_estimated': thinking_tokens_estimated,
+        'cancelled': cancelled
+    }
+    return reply, first_token
+
+def upload_preview(content: str) -> str:
+    return content[:500] + '...' if len(content) > 500 else content
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    response = requests.get(url, **kwargs)
+    # Surface throttling and server errors so the retry layer can see them
+    if response.status_code in RETRYABLE_STATUS_CODES:
+        response.raise_for_status()
+    return response
+
 class FileProcessor:
+    # Extracted text kept per file
+    MAX_CONTENT_CHARS = 10000
+
     @staticmethod
+    @traced('file_extract')
     def process_file(file: FileStorage) -> Dict[str, str]:
         try:
             filename = secure_filename(file.filename)
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}_{filename}")
             file.save(file_path)
+            try:
+                return FileProcessor.extract(file_path, filename)
+            finally:
+                # Clean up
+                os.remove(file_path)
+        except Exception as e:
+            return {'filename': file.filename, 'content': f"Error processing file: {str(e)}", 'error': True}
+
+    @staticmethod
+    def process_uploads(files: List[FileStorage]) -> List[Dict[str, str]]:
+        # Saved here and extracted in worker processes: an upload's stream can't be sent to another process
+        saved = []
+        try:
+            for file in files:
+                filename = secure_filename(file.filename)
+                file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}_{filename}")
+                file.save(file_path)
+                saved.append((file_path, filename))
+            return FileProcessor.process_many(FileProcessor.process_saved, saved)
+        finally:
+            for file_path, _ in saved:
+                os.remove(file_path)
+
+    @staticmethod
+    def process_saved(item: Tuple[str, str]) -> Dict[str, str]:
+        file_path, filename = item
+        try:
+            return FileProcessor.extract(file_path, filename)
+        except Exception as e:
+            return {'filename': filename, 'content': f"Error processing file: {str(e)}", 'error': True}
+
+    @staticmethod
+    def extract_received(item: Tuple[str, str, str]) -> Dict[str, str]:
+        # A streamed upload already on disk, with the type sniffed while it was received
+        file_path, filename, mime_type = item
+        with open(file_path, 'rb') as f:
+            return FileProcessor.extract_stream(f, filename, mime_type)
+
+    @staticmethod
+    def process_path(file_path: str) -> Dict[str, str]:
+        # Same as process_file for a document already on disk, which is left in place
+        try:
+            return FileProcessor.extract(file_path, os.path.basename(file_path))
+        except Exception as e:
+            return {'filename': os.path.basename(file_path), 'content': f"Error processing file: {str(e)}", 'error': True}
+
+    @staticmethod
+    def process_many(process: Callable, items: List, max_workers: Optional[int] = None,
+                     use_processes: bool = True) -> List[Dict[str, str]]:
+        # Runs process_saved/process_path over many items in a bounded pool; results keep the input order.
+        # Processes sidestep the GIL for the pure-Python extractors and, under eventlet, keep CPU-bound
+        # extraction from blocking the hub. Threads are for callables that can't be pickled
+        if max_workers is None:
+            max_workers = FILE_EXTRACTION_WORKERS
+        if max_workers <= 0 or (len(items) <= 1 and not use_processes):
+            return [process(item) for item in items]
+        if use_processes:
+            pool = process_pool('extraction', max_workers, initializer=_init_extraction_worker)
+            return list(pool.map(process, items))
+        with ThreadPoolExecutor(min(max_workers, len(items))) as pool:
+            return list(pool.map(process, items))
 
-            # Detect file type
-            mime_type = magic.from_file(file_path, mime=True)
-            content = ""
+    @staticmethod
+    def extract(file_path: str, filename: str) -> Dict[str, str]:
+        # Detect file type
+        mime_type = magic.from_file(file_path, mime=True)
+        with open(file_path, 'rb') as f:
+            return FileProcessor.extract_stream(f, filename, mime_type)
 
-            if mime_type == 'application/pdf':
-                content = FileProcessor._extract_pdf_text(file_path)
+    @staticmethod
+    def is_supported(mime_type: str) -> bool:
+        if mime_type in VISION_MIME_TYPES:
+            return images_supported()
+        return mime_type in EXTRACTABLE_MIME_TYPES or mime_type.startswith('text/')
+
+    @staticmethod
+    def extract_stream(source: BinaryIO, filename: str, mime_type: str) -> Dict[str, str]:
+        # Extractors read from any seekable binary file object, so spooled uploads never need a path
+        content = ""
+        image = None
+        size = None
+
+        with FILE_EXTRACTION_LATENCY.time(mime_type=mime_type):
+            if mime_type in VISION_MIME_TYPES and images_supported():
+                image = FileProcessor._prepare_image(source)
+                content = describe_image(image)
+            elif mime_type == 'application/pdf':
+                content = FileProcessor._extract_pdf_text(source)
             elif mime_type in ['application/vnd.openxmlformats-officedocument.wordprocessingml.document']:
-                content = FileProcessor._extract_docx_text(file_path)
+                content = FileProcessor._extract_docx_text(source)
             elif mime_type in ['application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'application/vnd.ms-excel']:
-                content = FileProcessor._extract_excel_text(file_path)
+                content = FileProcessor._extract_excel_text(source)
             elif mime_type.startswith('text/'):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
+                content, size = FileProcessor._read_text(source, FileProcessor.MAX_CONTENT_CHARS)
             else:
                 content = f"Unsupported file type: {mime_type}"
 
-            # Clean up
-            os.remove(file_path)
+        if image is not None:
+            return {'filename': filename, 'content': content, 'mime_type': mime_type, 'size': image['bytes'], 'image': image}
+        return {
+            'filename': filename,
+            'content': content[:FileProcessor.MAX_CONTENT_CHARS],  # Limit content size
+            'mime_type': mime_type,
+            'size': len(content) if size is None else size
+        }
 
-            return {
-                'filename': filename,
-                'content': content[:10000],  # Limit content size
-                'mime_type': mime_type,
-                'size': len(content)
-            }
-        except Exception as e:
-            return {'filename': file.filename, 'content': f"Error processing file: {str(e)}", 'error': True}
+    @staticmethod
+    def _read_text(source: BinaryIO, max_chars: int) -> Tuple[str, int]:
+        # Decodes only as much as the kept prefix can need (UTF-8 takes at most 4 bytes a character).
+        # The size in bytes comes from seeking to the end, so a huge text file is never held in memory
+        start = source.tell()
+        limit = max_chars * 4
+        data = source.read(limit)
+        # A character cut off by the limit is dropped rather than failing the decode
+        text = codecs.getincrementaldecoder('utf-8')().decode(data, final=len(data) < limit)
+        return text[:max_chars], source.seek(0, os.SEEK_END) - start
+
+    @staticmethod
+    def _prepare_image(source: BinaryIO) -> Dict:
+        data = source.read()
+        # Keyed by the settings too, so changing the limits doesn't serve stale sizes
+        key = f"{hashlib.sha256(data).hexdigest()}:{IMAGE_MAX_DIMENSION}:{IMAGE_MAX_BYTES}"
+        image = IMAGE_CACHE.get(key)
+        if image is None:
+            image = run_image_job(prepare_image, data, IMAGE_MAX_DIMENSION, IMAGE_MAX_BYTES)
+            IMAGE_CACHE.put(key, image)
+        return image
 
     @staticmethod
-    def _extract_pdf_text(file_path: str) -> str:
+    def _extract_pdf_text(source: BinaryIO) -> str:
         text = ""
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
+        pdf_reader = PyPDF2.PdfReader(source)
+        for page in pdf_reader.pages:
+            text += page.extract_text() + "\n"
         return text
 
     @staticmethod
-    def _extract_docx_text(file_path: str) -> str:
-        doc = Document(file_path)
+    def _extract_docx_text(source: BinaryIO) -> str:
+        doc = Document(source)
         text = ""
         for paragraph in doc.paragraphs:
             text += paragraph.text + "\n"
         return text
 
     @staticmethod
-    def _extract_excel_text(file_path: str) -> str:
-        df = pd.read_excel(file_path)
+    def _extract_excel_text(source: BinaryIO) -> str:
+        df = pd.read_excel(source)
         return df.to_string()
 
 class WebSearcher:
     @staticmethod
+    @traced('search')
     def search_web(query: str, num_results: int = 5) -> List[Dict]:
-        try:
-            if BRAVE_API_KEY:
-                return WebSearcher._search_brave(query, num_results)
-            else:
-                return WebSearcher._search_duckduckgo(query, num_results)
-        except Exception as e:
-            print(f"Search error: {e}")
-            return []
+        providers = []
+        if BRAVE_API_KEY:
+            providers.append(('brave', WebSearcher._search_brave))
+        providers.append(('duckduckgo', WebSearcher._search_duckduckgo))
+
+        # Fall through to the next provider when one is down or its circuit is open
+        for name, provider in providers:
+            try:
+                with SEARCH_LATENCY.time(provider=name):
+                    return call_with_resilience(
+                        lambda provider=provider: provider(query, num_results),
+                        UPSTREAM_BREAKERS[name],
+                        UPSTREAM_RETRY_POLICY,
+                        classify_requests_error
+                    )
+            except CircuitOpenError as e:
+                print(f"Search provider skipped: {e}")
+            except Exception as e:
+                print(f"Search error ({name}): {e}")
+        return []
 
     @staticmethod
     def _search_brave(query: str, num_results: int) -> List[Dict]:
@@ -137,7 +594,7 @@ class WebSearcher:
             'safesearch': 'moderate'
         }
 
-        response = requests.get(SEARCH_ENDPOINTS['brave'], headers=headers, params=params)
+        response = http_get(SEARCH_ENDPOINTS['brave'], headers=headers, params=params, timeout=10)
         if response.status_code == 200:
             data = response.json()
             results = []
@@ -153,54 +610,79 @@ class WebSearcher:
 
     @staticmethod
     def _search_duckduckgo(query: str, num_results: int) -> List[Dict]:
-        try:
-            url = f"https://html.duckduckgo.com/html/?q={query}"
-            headers = {'User-Agent': 'Mozilla/5.0 (compatible; Claude Chat App)'}
-            response = requests.get(url, headers=headers, timeout=10)
+        headers = {'User-Agent': 'Mozilla/5.0 (compatible; Claude Chat App)'}
+        response = http_get(SEARCH_ENDPOINTS['duckduckgo'], headers=headers, params={'q': query}, timeout=10)
 
-            soup = BeautifulSoup(response.content, 'html.parser')
-            results = []
+        soup = BeautifulSoup(response.content, 'html.parser')
+        results = []
 
-            for result in soup.find_all('div', class_='result')[:num_results]:
-                title_elem = result.find('a', class_='result__a')
-                snippet_elem = result.find('a', class_='result__snippet')
+        for result in soup.find_all('div', class_='result')[:num_results]:
+            title_elem = result.find('a', class_='result__a')
+            snippet_elem = result.find('a', class_='result__snippet')
 
-                if title_elem:
-                    results.append({
-                        'title': title_elem.get_text(strip=True),
-                        'url': title_elem.get('href', ''),
-                        'snippet': snippet_elem.get_text(strip=True) if snippet_elem else '',
-                        'source': 'duckduckgo'
-                    })
+            if title_elem:
+                results.append({
+                    'title': title_elem.get_text(strip=True),
+                    'url': title_elem.get('href', ''),
+                    'snippet': snippet_elem.get_text(strip=True) if snippet_elem else '',
+                    'source': 'duckduckgo'
+                })
 
-            return results
-        except Exception as e:
-            print(f"DuckDuckGo search error: {e}")
-            return []
+        return results
 
     @staticmethod
+    @traced('page_fetch')
     def fetch_page_content(url: str) -> str:
-        try:
-            headers = {'User-Agent': 'Mozilla/5.0 (compatible; Claude Chat App)'}
-            response = requests.get(url, headers=headers, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-
-            # Get text content
-            text = soup.get_text()
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = ' '.join(chunk for chunk in chunks if chunk)
-
-            return text[:5000]  # Limit content size
-        except Exception as e:
-            return f"Error fetching content: {str(e)}"
+        with PAGE_FETCH_LATENCY.time():
+            try:
+                headers = {'User-Agent': 'Mozilla/5.0 (compatible; Claude Chat App)'}
+                # Arbitrary hosts get retries but no breaker
+                response = call_with_resilience(
+                    lambda: http_get(url, headers=headers, timeout=10),
+                    None,
+                    UPSTREAM_RETRY_POLICY,
+                    classify_requests_error
+                )
+                soup = BeautifulSoup(response.content, 'html.parser')
+
+                # Remove script and style elements
+                for script in soup(["script", "style"]):
+                    script.decompose()
+
+                # Get text content
+                text = soup.get_text()
+                lines = (line.strip() for line in text.splitlines())
+                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+                text = ' '.join(chunk for chunk in chunks if chunk)
+
+                return text[:5000]  # Limit content size
+            except Exception as e:
+                return f"Error fetching content: {str(e)}"
 
 class ExtendedThinking:
+    DEFAULT_MODE = 'deep_analysis'
+    INSTRUCTIONS = {
+        'deep_analysis': "Provide a comprehensive, multi-layered analysis that examines the topic from multiple angles, including underlying principles, historical context, and broader implications.",
+        'research_synthesis': "Conduct thorough research using available sources, synthesize findings from multiple perspectives, and provide a well-supported analysis with proper attribution.",
+        'strategic_thinking': "Think strategically about this issue, considering multiple scenarios, stakeholder perspectives, implementation challenges, and both short-term and long-term implications.",
+        'creative_exploration': "Explore this topic creatively, challenging assumptions, making unexpected connections, and generating innovative ideas and solutions."
+    }
+
+    @classmethod
+    def native_options(cls, mode: str, answer_tokens: Optional[int] = None) -> Dict:
+        # Request options for the API's own extended thinking: the instruction becomes a short
+        # system prompt and the reasoning happens within a per-mode token budget
+        if mode not in cls.INSTRUCTIONS:
+            mode = cls.DEFAULT_MODE
+        budget = THINKING_BUDGET_TOKENS.get(mode, THINKING_BUDGET_TOKENS[cls.DEFAULT_MODE])
+        return {
+            'max_tokens': budget + (answer_tokens or THINKING_ANSWER_TOKENS),
+            'thinking': {'type': 'enabled', 'budget_tokens': budget},
+            'system': cls.INSTRUCTIONS[mode]
+        }
+
     @staticmethod
+    @traced('thinking_prompt')
     def create_thinking_prompt(query: str, mode: str, research_context: str = "") -> str:
 
         base_thinking = """<thinking>
@@ -233,7 +715,7 @@ For this deep analysis, I should:
 - Evaluate different theoretical frameworks
 - Consider long-term implications and consequences
 """,
-                'instruction': "Provide a comprehensive, multi-layered analysis that examines the topic from multiple angles, including underlying principles, historical context, and broader implications."
+                'instruction': ExtendedThinking.INSTRUCTIONS['deep_analysis']
             },
 
             'research_synthesis': {
@@ -248,7 +730,7 @@ For this research synthesis, I need to:
 
 Research context available: {research_context}
 """,
-                'instruction': "Conduct thorough research using available sources, synthesize findings from multiple perspectives, and provide a well-supported analysis with proper attribution."
+                'instruction': ExtendedThinking.INSTRUCTIONS['research_synthesis']
             },
 
             'strategic_thinking': {
@@ -262,7 +744,7 @@ For strategic thinking, I should:
 - Think about implementation challenges
 - Consider short-term and long-term implications
 """,
-                'instruction': "Think strategically about this issue, considering multiple scenarios, stakeholder perspectives, implementation challenges, and both short-term and long-term implications."
+                'instruction': ExtendedThinking.INSTRUCTIONS['strategic_thinking']
             },
 
             'creative_exploration': {
@@ -276,11 +758,11 @@ For creative exploration, I should:
 - Generate multiple innovative solutions
 - Build on ideas to create new possibilities
 """,
-                'instruction': "Explore this topic creatively, challenging assumptions, making unexpected connections, and generating innovative ideas and solutions."
+                'instruction': ExtendedThinking.INSTRUCTIONS['creative_exploration']
             }
         }
 
-        selected_mode = mode_prompts.get(mode, mode_prompts['deep_analysis'])
+        selected_mode = mode_prompts.get(mode, mode_prompts[ExtendedThinking.DEFAULT_MODE])
 
         return base_thinking.format(
             query=query,
@@ -289,92 +771,540 @@ For creative exploration, I should:
         )
 
 class ConversationManager:
-    def __init__(self):
-        self.conversations = {}
-
-    def get_or_create_conversation(self, session_id):
-        if session_id not in self.conversations:
-            self.conversations[session_id] = {
-                'messages': [],
-                'created_at': datetime.now(),
-                'last_updated': datetime.now(),
-                'files': [],
-                'search_history': []
-            }
-        return self.conversations[session_id]
-
-    def add_message(self, session_id, role, content, message_type='text', metadata=None):
-        conversation = self.get_or_create_conversation(session_id)
-        message = {
-            'id': str(uuid.uuid4()),
-            'role': role,
-            'content': content,
-            'type': message_type,
-            'timestamp': datetime.now().isoformat(),
-            'metadata': metadata or {}
-        }
-        conversation['messages'].append(message)
-        conversation['last_updated'] = datetime.now()
-        return message
+    # Metadata that can be large; left out of light projections unless asked for
+    HEAVY_METADATA_KEYS = ('search_results', 'file_content', 'thinking', 'image')
+    FILE_PREVIEW_CHARS = 200
+
+    def __init__(self, blobs: Optional[BlobStore] = None, locks: Optional[SessionLocks] = None):
+        self.conversations: Dict[str, Conversation] = {}
+        self.blobs = blobs if blobs is not None else BlobStore()
+        # Writes to a session's conversation hold its shard lock; chat turns also queue per session
+        self.locks = locks if locks is not None else SessionLocks()
+        self.turns = TurnQueue(self.locks)
+        # Running total of every conversation's size_bytes, so reading it never walks the conversations
+        self.memory_bytes = 0
+        self._memory_lock = threading.Lock()
+
+    def _grow(self, conversation, *records):
+        # Callers hold the session's lock, which guards conversation.size_bytes
+        size = sum(estimate_size(record) for record in records)
+        conversation.size_bytes += size
+        with self._memory_lock:
+            self.memory_bytes += size
+
+    def get_or_create_conversation(self, session_id) -> Conversation:
+        conversation = self.conversations.get(session_id)
+        if conversation is None:
+            with self.locks(session_id):
+                conversation = self.conversations.get(session_id)
+                if conversation is None:
+                    conversation = self.conversations[session_id] = Conversation()
+                    self._grow(conversation, conversation)
+        return conversation
+
+    def clear_conversation(self, session_id):
+        with self.locks(session_id):
+            old = self.conversations.get(session_id)
+            if old is None:
+                return
+            conversation = self.conversations[session_id] = Conversation()
+            self._grow(conversation, conversation)
+            with self._memory_lock:
+                self.memory_bytes -= old.size_bytes
+        for blob_id in old.blob_refs:
+            self.blobs.release(blob_id)
+
+    @contextlib.contextmanager
+    def turn(self, session_id, timeout=None):
+        # Answers a session's messages one at a time, in arrival order. Yields the conversation's
+        # epoch so the turn can tell whether the conversation was cleared while it ran
+        with self.turns.turn(session_id, timeout):
+            yield self.get_or_create_conversation(session_id).epoch
+
+    def _put_blob(self, conversation, value):
+        blob_id = self.blobs.put(value)
+        conversation.blob_refs.append(blob_id)
+        return blob_id
+
+    def _intern(self, conversation, metadata):
+        # Swap large values for '<key>_blob' ids; the caller's dict is left untouched
+        if not any(key in metadata for key in self.HEAVY_METADATA_KEYS):
+            return metadata
+        interned = dict(metadata)
+        for key in self.HEAVY_METADATA_KEYS:
+            if key in interned:
+                interned[f'{key}_blob'] = self._put_blob(conversation, interned.pop(key))
+        return interned
+
+    def _resolve(self, metadata):
+        if not any(f'{key}_blob' in metadata for key in self.HEAVY_METADATA_KEYS):
+            return metadata
+        resolved = dict(metadata)
+        for key in self.HEAVY_METADATA_KEYS:
+            blob_id = resolved.pop(f'{key}_blob', None)
+            if blob_id is not None:
+                resolved[key] = self.blobs.get(blob_id)
+        return resolved
+
+    # Records are converted to the public JSON shape only on the way out
+
+    def resolve_message(self, message: Message):
+        data = message.to_dict()
+        if message.metadata:
+            data['metadata'] = self._resolve(message.metadata)
+        return data
+
+    def resolve_file(self, file_entry: FileEntry):
+        return file_entry.to_dict(self.blobs.get(file_entry.content_blob))
+
+    def resolve_search(self, search_entry: SearchEntry):
+        return search_entry.to_dict(self.blobs.get(search_entry.results_blob))
+
+    @traced('store')
+    def add_message(self, session_id, role, content, message_type='text', metadata=None, epoch=None):
+        # With an epoch, nothing is stored (and None is returned) if the conversation was cleared since
+        with self.locks(session_id):
+            conversation = self.get_or_create_conversation(session_id)
+            if epoch is not None and conversation.epoch != epoch:
+                return None
+            message = Message(
+                id=new_id(),
+                role=role,
+                content=content,
+                type=message_type,
+                timestamp=time.time(),
+                metadata=self._intern(conversation, metadata) if metadata else None
+            )
+            conversation.message_index[message.id] = len(conversation.messages)
+            conversation.messages.append(message)
+            conversation.last_updated = message.timestamp
+            self._grow(conversation, message)
+            return message
 
+    @traced('store')
     def add_file(self, session_id, file_info):
-        conversation = self.get_or_create_conversation(session_id)
-        conversation['files'].append(file_info)
-
+        with self.locks(session_id):
+            conversation = self.get_or_create_conversation(session_id)
+            file_entry = FileEntry(
+                filename=file_info['filename'],
+                content_blob=self._put_blob(conversation, file_info.get('content', '')),
+                mime_type=file_info.get('mime_type'),
+                size=file_info.get('size'),
+                error=bool(file_info.get('error'))
+            )
+            conversation.files.append(file_entry)
+            conversation.last_updated = time.time()
+            self._grow(conversation, file_entry)
+
+    @traced('store')
+    def add_files(self, session_id, files_info):
+        # Attaches several uploads in one update: each file and its message, with a single timestamp bump.
+        # The session lock is re-entrant, so the files land together with nothing interleaved
+        with self.locks(session_id):
+            conversation = self.get_or_create_conversation(session_id)
+            messages = []
+            for file_info in files_info:
+                self.add_file(session_id, file_info)
+                metadata = {
+                    'filename': file_info['filename'],
+                    'file_content': file_info['content'],
+                    'mime_type': file_info.get('mime_type', ''),
+                    'size': file_info.get('size', 0)
+                }
+                if file_info.get('image'):
+                    metadata['image'] = file_info['image']
+                messages.append(self.add_message(
+                    session_id,
+                    'user',
+                    f"Uploaded file: {file_info['filename']}",
+                    message_type='file',
+                    metadata=metadata
+                ))
+            conversation.last_updated = time.time()
+            return messages
+
+    @traced('store')
     def add_search(self, session_id, query, results):
-        conversation = self.get_or_create_conversation(session_id)
-        search_entry = {
-            'query': query,
-            'results': results,
-            'timestamp': datetime.now().isoformat()
-        }
-        conversation['search_history'].append(search_entry)
+        with self.locks(session_id):
+            conversation = self.get_or_create_conversation(session_id)
+            search_entry = SearchEntry(
+                query=query,
+                results_blob=self._put_blob(conversation, results),
+                timestamp=time.time()
+            )
+            conversation.search_history.append(search_entry)
+            conversation.last_updated = time.time()
+            self._grow(conversation, search_entry)
 
-    def get_messages_for_api(self, session_id):
-        conversation = self.get_or_create_conversation(session_id)
+    @staticmethod
+    def format_file_prompt(filename, file_content, query):
+        return f"File: {filename}\nContent: {file_content}\n\nUser query: {query}"
+
+    @traced('history')
+    def get_messages_for_api(self, session_id, epoch=None):
+        # With an epoch, returns None if the conversation was cleared since. Snapshot under the lock,
+        # with blobs resolved there too since a clear releases them; the prompt is built outside it
+        with self.locks(session_id):
+            conversation = self.get_or_create_conversation(session_id)
+            if epoch is not None and conversation.epoch != epoch:
+                return None
+            # A generation cancelled before any text leaves an empty answer the API would reject
+            messages = [
+                (msg, self._resolve(msg.metadata) if msg.type == 'file' and msg.metadata else None)
+                for msg in conversation.messages
+                if msg.role in ['user', 'assistant'] and msg.content
+            ]
         api_messages = []
 
-        for msg in conversation['messages']:
-            if msg['role'] in ['user', 'assistant']:
-                content = msg['content']
+        for msg, metadata in messages:
+            content = msg.content
 
-                # Add file context if available
-                if msg['type'] == 'file' and 'file_content' in msg['metadata']:
-                    content = f"File: {msg['metadata']['filename']}\nContent: {msg['metadata']['file_content']}\n\nUser query: {content}"
+            # Images go to the model as vision input next to the upload message
+            if metadata and 'image' in metadata:
+                content = [image_block(metadata['image']), {'type': 'text', 'text': content}]
+            # Add file context if available
+            elif metadata and 'file_content' in metadata:
+                content = self.format_file_prompt(metadata['filename'], metadata['file_content'], content)
 
-                api_messages.append({'role': msg['role'], 'content': content})
+            api_messages.append({'role': msg.role, 'content': content})
 
         return api_messages
 
-    def export_conversation(self, session_id):
+    def get_cursor(self, session_id):
+        # Lists are append-only between clears, so their lengths identify a version
         conversation = self.get_or_create_conversation(session_id)
+        return self._format_cursor(
+            conversation.epoch,
+            len(conversation.messages),
+            len(conversation.files),
+            len(conversation.search_history)
+        )
+
+    @staticmethod
+    def _format_cursor(epoch, messages, files, searches):
+        return f"{epoch}.{messages}.{files}.{searches}"
+
+    @staticmethod
+    def _parse_cursor(cursor):
+        try:
+            epoch, messages, files, searches = cursor.split('.')
+            return epoch, int(messages), int(files), int(searches)
+        except (AttributeError, ValueError):
+            return None
+
+    def get_message_page(self, session_id, before=None, after=None, limit=50):
+        # Under the session lock, so a page is read from one consistent snapshot
+        with self.locks(session_id):
+            conversation = self.get_or_create_conversation(session_id)
+            messages = conversation.messages
+            index = conversation.message_index
+
+            if after is not None:
+                key = parse_id(after)
+                if key not in index:
+                    raise KeyError(after)
+                start = index[key] + 1
+                end = min(len(messages), start + limit)
+            else:
+                key = parse_id(before) if before is not None else None
+                if key is not None and key not in index:
+                    raise KeyError(before)
+                end = index[key] if key is not None else len(messages)
+                start = max(0, end - limit)
+
+            return {
+                'messages': [self.resolve_message(m) for m in messages[start:end]],
+                'has_more_before': start > 0,
+                'has_more_after': end < len(messages)
+            }
+
+    def get_changes_since(self, session_id, cursor, limit=50):
+        with self.locks(session_id):
+            conversation = self.get_or_create_conversation(session_id)
+            parsed = self._parse_cursor(cursor)
+            messages = conversation.messages
+            files = conversation.files
+            searches = conversation.search_history
+
+            if (parsed is None or parsed[0] != conversation.epoch
+                    or parsed[1] > len(messages) or parsed[2] > len(files) or parsed[3] > len(searches)):
+                # Unknown or stale cursor (e.g. the conversation was cleared): start over
+                page = self.get_message_page(session_id, limit=limit)
+                return {
+                    'reset': True,
+                    'messages': page['messages'],
+                    'files': [self.resolve_file(f) for f in files],
+                    'search_history': [self.resolve_search(e) for e in searches],
+                    'has_more_before': page['has_more_before'],
+                    'has_more_after': False,
+                    'cursor': self.get_cursor(session_id)
+                }
+
+            _, message_start, file_start, search_start = parsed
+            message_end = min(len(messages), message_start + limit)
+            return {
+                'reset': False,
+                'messages': [self.resolve_message(m) for m in messages[message_start:message_end]],
+                'files': [self.resolve_file(f) for f in files[file_start:]],
+                'search_history': [self.resolve_search(e) for e in searches[search_start:]],
+                'has_more_before': message_start > 0,
+                'has_more_after': message_end < len(messages),
+                'cursor': self._format_cursor(conversation.epoch, message_end, len(files), len(searches))
+            }
+
+    @classmethod
+    def project_message(cls, message, include_metadata=False):
+        metadata = message['metadata']
+        if include_metadata or not any(key in metadata for key in cls.HEAVY_METADATA_KEYS):
+            return message
+
+        light = {key: value for key, value in metadata.items() if key not in cls.HEAVY_METADATA_KEYS}
+        if metadata.get('search_results'):
+            light['search_sources'] = [
+                {'title': result.get('title', ''), 'url': result.get('url', '')}
+                for result in metadata['search_results']
+            ]
+        if 'file_content' in metadata:
+            light['file_preview'] = metadata['file_content'][:cls.FILE_PREVIEW_CHARS]
+        return {**message, 'metadata': light}
+
+    @staticmethod
+    def project_file(file_info, include_content=False):
+        if include_content:
+            return file_info
+        return {key: value for key, value in file_info.items() if key != 'content'}
+
+    @staticmethod
+    def project_search(search_entry, include_results=False):
+        if include_results:
+            return search_entry
         return {
-            'messages': conversation['messages'],
-            'files': conversation['files'],
-            'search_history': conversation['search_history'],
-            'created_at': conversation['created_at'].isoformat(),
-            'last_updated': conversation['last_updated'].isoformat()
+            'query': search_entry['query'],
+            'timestamp': search_entry['timestamp'],
+            'result_count': len(search_entry['results'])
         }
 
+    @contextlib.contextmanager
+    def _export_snapshot(self, session_id):
+        # Lists are copied and the conversation's blobs pinned under the lock, so neither a concurrent
+        # append nor a clear (which releases the blobs) changes what an export sees while it is resolved
+        with self.locks(session_id):
+            conversation = self.get_or_create_conversation(session_id)
+            snapshot = {
+                'messages': list(conversation.messages),
+                'files': list(conversation.files),
+                'search_history': list(conversation.search_history),
+                'created_at': format_timestamp(conversation.created_at),
+                'last_updated': format_timestamp(conversation.last_updated)
+            }
+            pinned = [blob_id for blob_id in conversation.blob_refs if self.blobs.retain(blob_id)]
+        try:
+            yield snapshot
+        finally:
+            for blob_id in pinned:
+                self.blobs.release(blob_id)
+
+    def iter_export_records(self, session_id):
+        with self._export_snapshot(session_id) as snapshot:
+            yield {
+                'kind': 'conversation',
+                'created_at': snapshot['created_at'],
+                'last_updated': snapshot['last_updated'],
+                'counts': {key: len(snapshot[key]) for key in ('messages', 'files', 'search_history')}
+            }
+            for message in snapshot['messages']:
+                yield {'kind': 'message', 'data': self.resolve_message(message)}
+            for file_entry in snapshot['files']:
+                yield {'kind': 'file', 'data': self.resolve_file(file_entry)}
+            for search_entry in snapshot['search_history']:
+                yield {'kind': 'search', 'data': self.resolve_search(search_entry)}
+
+    @traced('export')
+    def export_conversation(self, session_id):
+        with self._export_snapshot(session_id) as snapshot:
+            return {
+                'messages': [self.resolve_message(m) for m in snapshot['messages']],
+                'files': [self.resolve_file(f) for f in snapshot['files']],
+                'search_history': [self.resolve_search(e) for e in snapshot['search_history']],
+                'created_at': snapshot['created_at'],
+                'last_updated': snapshot['last_updated']
+            }
+
 conversation_manager = ConversationManager()
 
+# Registered first so it runs after every other after_request hook
+@app.after_request
+def compress_response(response):
+    if not COMPRESSION_ENABLED or request.method == 'HEAD':
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+        return response
+    # Responses that negotiate their own encoding (fingerprinted assets, exports) are left alone
+    if 'Accept-Encoding' in response.vary or not is_compressible(response.mimetype):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_BYTES:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # The compressed bytes differ, so the validator is only semantically equal
+        response.set_etag(etag, weak=True)
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def start_request_trace():
+    if TRACING_ENABLED and request.endpoint not in ('static', 'asset'):
+        g.trace = tracing.start_trace(request.endpoint or 'request', request.headers.get('X-Request-ID'))
+
+@app.after_request
+def emit_request_trace(response):
+    trace = g.pop('trace', None)
+    if trace is None:
+        return response
+    tracing.end_trace(trace)
+    response.headers['Server-Timing'] = trace.server_timing()
+    response.headers['X-Trace-Id'] = trace.trace_id
+    if request.endpoint in TRACED_PAYLOAD_ENDPOINTS and response.is_json and not response.is_streamed:
+        payload = response.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload['trace_id'] = trace.trace_id
+            response.set_data(json.dumps(payload))
+    if TRACE_LOG_ENABLED:
+        trace_logger.info(json.dumps({
+            'event': 'request_trace',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **trace.to_dict()
+        }))
+    return response
+
+@app.teardown_request
+def discard_request_trace(error=None):
+    # after_request is skipped for unhandled exceptions; don't leak the trace
+    trace = g.pop('trace', None)
+    if trace is not None:
+        tracing.end_trace(trace)
+
+def is_admin() -> bool:
+    # Header only: a token in the query string ends up in access logs, proxies and browser history
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+def admin_required(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            abort(404)
+        if not is_admin():
+            return jsonify({'error': 'Admin token required'}), 403
+        return func(*args, **kwargs)
+    return wrapper
+
+@app.before_request
+def start_request_profile():
+    if request.endpoint in (None, 'static', 'asset'):
+        return
+    requested = request.headers.get('X-Profile', '').lower() in ('1', 'true') and is_admin()
+    sampled = request.endpoint in PROFILED_ENDPOINTS and random.random() < PROFILE_SAMPLE_RATE
+    if requested or sampled:
+        g.profile = PROFILER.start()
+        g.profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{request.endpoint}-{uuid.uuid4().hex[:8]}"
+
+@app.after_request
+def announce_request_profile(response):
+    if g.get('profile') is not None:
+        response.headers['X-Profile-Id'] = g.profile_id
+    return response
+
+@app.teardown_request
+def save_request_profile(error=None):
+    # Teardown also runs after unhandled exceptions, so the timer is always disarmed
+    profile = g.pop('profile', None)
+    if profile is None:
+        return
+    PROFILER.stop(profile)
+    try:
+        PROFILE_STORE.save(g.profile_id, profile, {
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'trace_id': tracing.current_trace_id()
+        })
+    except OSError as e:
+        print(f"Failed to save profile {g.profile_id}: {e}")
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - started,
+            method=request.method, route=route, status=response.status_code
+        )
+    return response
+
 @app.route('/')
 def index():
     if 'session_id' not in session:
         session['session_id'] = str(uuid.uuid4())
     return render_template('index.html')
 
+@app.template_global()
+def asset_url(filename):
+    digest = STATIC_ASSETS.digest(filename)
+    if digest is None:
+        return url_for('static', filename=filename)
+    return url_for('asset', digest=digest, filename=filename)
+
+@app.route('/assets/<digest>/<path:filename>')
+def asset(digest, filename):
+    entry = STATIC_ASSETS.get(filename)
+    if entry is None:
+        abort(404)
+    variants = entry['variants']
+    encoding = request.accept_encodings.best_match([e for e in available_encodings() if e in variants])
+    response = Response(variants[encoding or 'identity'], mimetype=entry['mimetype'])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(f"{entry['digest']}-{encoding or 'identity'}")
+    if digest == entry['digest']:
+        response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    else:
+        # Stale fingerprint from an old page; serve current content but don't pin it
+        response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     if not anthropic_client:
         return jsonify({'error': 'Claude API not configured'}), 500
 
+    # Released in reverse: the concurrency slot, the session's turn, then the cancellation token
+    held = contextlib.ExitStack()
     try:
         data = request.get_json()
         user_message = data.get('message', '').strip()
         use_search = data.get('use_search', False)
         search_query = data.get('search_query', '')
         thinking_mode = data.get('thinking_mode', 'normal')  # New parameter
+        # Regenerating must not hand back the answer the user is trying to replace
+        bypass_cache = bool(data.get('regenerate') or data.get('bypass_cache'))
 
         if not user_message:
             return jsonify({'error': 'Message cannot be empty'}), 400
@@ -384,10 +1314,26 @@ def chat():
             session_id = str(uuid.uuid4())
             session['session_id'] = session_id
 
+        # The client picks the id up front so it can cancel before the response arrives
+        request_id = str(data.get('request_id') or uuid.uuid4().hex)
+        cancel_token = CANCELLATIONS.register(session_id, request_id)
+        held.callback(CANCELLATIONS.release, cancel_token)
+        # A session's turns are answered one after another; the turn just superseded stores its partial answer first
+        epoch = held.enter_context(conversation_manager.turn(session_id, CHAT_TURN_TIMEOUT))
+        # Only once it is this request's turn, so requests queued behind another don't sit on slots
+        if not CHAT_SLOTS.acquire(timeout=CHAT_SLOT_TIMEOUT):
+            response = jsonify({'error': 'Too many responses are being generated, please retry shortly'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        CHAT_GENERATIONS.inc()
+        held.callback(CHAT_SLOTS.release)
+        held.callback(CHAT_GENERATIONS.dec)
+
         # Handle web search if requested
         search_results = []
         research_context = ""
         if use_search and search_query:
+            emit_to_session(session_id, 'chat_status', {'stage': 'searching'})
             search_results = WebSearcher.search_web(search_query)
             conversation_manager.add_search(session_id, search_query, search_results)
 
@@ -399,8 +1345,9 @@ def chat():
                 user_message += search_context
                 research_context = search_context
 
-        # Apply extended thinking if requested
-        if thinking_mode != 'normal':
+        # Apply extended thinking if requested: natively, or by templating the prompt as a fallback
+        native_thinking = thinking_mode != 'normal' and THINKING_STRATEGY == 'native'
+        if thinking_mode != 'normal' and not native_thinking:
             enhanced_prompt = ExtendedThinking.create_thinking_prompt(
                 user_message, thinking_mode, research_context
             )
@@ -411,54 +1358,236 @@ def chat():
             session_id,
             'user',
             data.get('message', '').strip(),  # Store original message
-            metadata={'thinking_mode': thinking_mode, 'enhanced_prompt_used': thinking_mode != 'normal'}
+            metadata={
+                'thinking_mode': thinking_mode,
+                'enhanced_prompt_used': thinking_mode != 'normal' and not native_thinking,
+                'native_thinking': native_thinking
+            },
+            epoch=epoch
         )
+        if user_msg is None:
+            return conversation_cleared(session_id, request_id)
 
-        # Get conversation history for API
-        messages = conversation_manager.get_messages_for_api(session_id)
+        # Get conversation history for API; a clear since the question was stored ends the turn
+        messages = conversation_manager.get_messages_for_api(session_id, epoch=epoch)
+        if messages is None:
+            return conversation_cleared(session_id, request_id)
 
-        # Replace the last message with enhanced prompt if using extended thinking
+        # Replace the last message with the enhanced prompt (and search context) if using extended thinking
         if thinking_mode != 'normal':
             messages[-1]['content'] = user_message
 
-        # Adjust token limit based on thinking mode
-        max_tokens = 4000 if thinking_mode == 'normal' else 6000
-
-        # Get response from Claude
-        response = anthropic_client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=max_tokens,
-            messages=messages
+        route, request_options = build_request_options(
+            messages,
+            thinking_mode,
+            has_files=bool(conversation_manager.get_or_create_conversation(session_id).files),
+            has_search=bool(search_results)
         )
-
-        claude_response = response.content[0].text
+        model = route.model
+
+        cache_key = None
+        cached = None
+        if RESPONSE_CACHE is not None:
+            cache_key = ResponseCache.key_for({**request_options, 'thinking_mode': thinking_mode})
+            if not bypass_cache:
+                cached = RESPONSE_CACHE.get(cache_key)
+                LLM_CACHE_REQUESTS.inc(result='hit' if cached is not None else 'miss')
+
+        llm_elapsed = None
+        if cached is not None:
+            reply = cached
+            tokens_saved = sum(
+                count for count in (reply['input_tokens'], reply['output_tokens']) if isinstance(count, int)
+            )
+            LLM_CACHE_TOKENS_SAVED.inc(tokens_saved)
+        elif cancel_token.cancelled:
+            # Stopped while searching; nothing was generated
+            reply = {'text': '', 'thinking': None, 'input_tokens': None, 'output_tokens': None,
+                     'thinking_tokens_estimated': None, 'cancelled': True}
+            tokens_saved = 0
+        else:
+            # Get response from Claude
+            llm_started = time.perf_counter()
+            with span('llm'):
+                reply, first_token = call_with_resilience(
+                    lambda: stream_reply(session_id, request_options, cancel_token),
+                    UPSTREAM_BREAKERS['anthropic'],
+                    UPSTREAM_RETRY_POLICY,
+                    classify_anthropic_error
+                )
+            llm_elapsed = time.perf_counter() - llm_started
+            if first_token is not None:
+                LLM_FIRST_TOKEN_LATENCY.observe(first_token, model=model)
+            LLM_LATENCY.observe(llm_elapsed, model=model, thinking_mode=thinking_mode)
+            # Measured counts only; the thinking estimate stays out of the metrics
+            record_token_usage(thinking_mode, input=reply['input_tokens'], output=reply['output_tokens'])
+            tokens_saved = 0
+            if cache_key is not None and not reply['cancelled']:
+                RESPONSE_CACHE.put(cache_key, reply)
+
+        claude_response = reply['text']
+        output_tokens = reply['output_tokens']
 
         # Add Claude's response to conversation
-        claude_message = conversation_manager.add_message(
-            session_id,
-            'assistant',
-            claude_response,
-            metadata={
-                'search_used': use_search,
-                'search_results': search_results,
-                'thinking_mode': thinking_mode,
-                'token_usage': response.usage.output_tokens if hasattr(response, 'usage') else None
-            }
-        )
-
+        metadata = {
+            'search_used': use_search,
+            'search_results': search_results,
+            'thinking_mode': thinking_mode,
+            'token_usage': output_tokens,
+            'model': model,
+            'route': route.name,
+            'llm_latency_ms': round(llm_elapsed * 1000) if llm_elapsed is not None else None,
+            'cache_hit': cached is not None
+        }
+        if reply['thinking']:
+            metadata['thinking'] = reply['thinking']
+            metadata['thinking_tokens_estimated'] = reply['thinking_tokens_estimated']
+        if reply['cancelled']:
+            # Keep whatever was generated, marked so it isn't mistaken for a complete answer
+            metadata['cancelled'] = True
+            metadata['cancel_reason'] = cancel_token.reason
+            CHAT_CANCELLED.inc(reason=cancel_token.reason)
+        claude_message = conversation_manager.add_message(session_id, 'assistant', claude_response, metadata=metadata, epoch=epoch)
+        if claude_message is None:
+            return conversation_cleared(session_id, request_id)
+
+        emit_to_session(session_id, 'chat_status', {
+            'stage': 'cancelled' if reply['cancelled'] else 'complete',
+            'request_id': request_id,
+            'message_id': format_id(claude_message.id)
+        })
         return jsonify({
             'response': claude_response,
-            'message_id': claude_message['id'],
-            'timestamp': claude_message['timestamp'],
+            'message_id': format_id(claude_message.id),
+            'timestamp': format_timestamp(claude_message.timestamp),
             'search_results': search_results if use_search else [],
             'thinking_mode': thinking_mode,
-            'token_usage': response.usage.output_tokens if hasattr(response, 'usage') else None
+            'model': model,
+            'route': route.name,
+            'token_usage': output_tokens,
+            'thinking': reply['thinking'],
+            'thinking_tokens_estimated': reply['thinking_tokens_estimated'],
+            'cache_hit': cached is not None,
+            'tokens_saved': tokens_saved,
+            'request_id': request_id,
+            'cancelled': reply['cancelled']
         })
 
+    except TurnTimeout:
+        response = jsonify({'error': 'The previous message in this conversation is still being answered'})
+        response.headers['Retry-After'] = '1'
+        return response, 409
+    except CircuitOpenError as e:
+        response = jsonify({'error': 'Claude API is temporarily unavailable, please retry shortly'})
+        response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+        return response, 503
     except anthropic.APIError as e:
-        return jsonify({'error': f'Claude API error: {str(e)}'}), 500
+        # Transient errors already exhausted their retries
+        retryable, _ = classify_anthropic_error(e)
+        return jsonify({'error': f'Claude API error: {str(e)}'}), 503 if retryable else 500
     except Exception as e:
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
+    finally:
+        held.close()
+
+def conversation_cleared(session_id, request_id):
+    # The conversation was cleared while this turn ran; its messages belonged to the old one
+    emit_to_session(session_id, 'chat_status', {'stage': 'cancelled', 'request_id': request_id})
+    return jsonify({'error': 'The conversation was cleared', 'request_id': request_id, 'cancelled': True}), 409
+
+@app.route('/api/chat/cancel', methods=['POST'])
+def cancel_chat():
+    # HTTP counterpart of the 'cancel' socket event
+    session_id = session.get('session_id')
+    if not session_id:
+        return jsonify({'cancelled': []})
+    data = request.get_json(silent=True) or {}
+    return jsonify({'cancelled': CANCELLATIONS.cancel(session_id, data.get('request_id'))})
+
+@app.route('/api/batch', methods=['POST'])
+def create_batch():
+    # Offline bulk analysis: one prompt over many documents, answered by the Message Batches API
+    if not anthropic_client:
+        return jsonify({'error': 'Claude API not configured'}), 500
+
+    files = [file for file in request.files.getlist('files') if file.filename]
+    prompt = request.form.get('prompt', '').strip()
+    thinking_mode = request.form.get('thinking_mode', 'normal')
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    if not prompt:
+        return jsonify({'error': 'Prompt cannot be empty'}), 400
+
+    documents = FileProcessor.process_uploads(files)
+    failed = [document for document in documents if document.get('error')]
+    extracted = [document for document in documents if not document.get('error')]
+    if not extracted:
+        return jsonify({'error': 'No file could be processed', 'errors': extraction_error_rows(failed)}), 422
+
+    try:
+        batch, documents_by_id = batch_pipeline(prompt, thinking_mode).submit(extracted)
+    except CircuitOpenError as e:
+        response = jsonify({'error': 'Claude API is temporarily unavailable, please retry shortly'})
+        response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+        return response, 503
+    except anthropic.APIError as e:
+        retryable, _ = classify_anthropic_error(e)
+        return jsonify({'error': f'Claude API error: {str(e)}'}), 503 if retryable else 500
+
+    job = {'documents': documents_by_id, 'errors': extraction_error_rows(failed)}
+    BATCH_JOBS.put(batch.id, job)
+    return jsonify({
+        'batch_id': batch.id,
+        'status': batch.processing_status,
+        'documents': [{'custom_id': custom_id, 'filename': filename} for custom_id, filename in documents_by_id.items()],
+        'errors': job['errors']
+    }), 202
+
+@app.route('/api/batch/<batch_id>')
+def get_batch(batch_id):
+    try:
+        batch = batch_pipeline().retrieve(batch_id)
+    except anthropic.NotFoundError:
+        return jsonify({'error': 'Batch not found'}), 404
+    except (CircuitOpenError, anthropic.APIError) as e:
+        return jsonify({'error': f'Claude API error: {str(e)}'}), 503
+    counts = batch.request_counts
+    return jsonify({
+        'batch_id': batch.id,
+        'status': batch.processing_status,
+        'request_counts': {
+            'processing': counts.processing,
+            'succeeded': counts.succeeded,
+            'errored': counts.errored,
+            'canceled': counts.canceled,
+            'expired': counts.expired
+        }
+    })
+
+@app.route('/api/batch/<batch_id>/results')
+def get_batch_results(batch_id):
+    pipeline = batch_pipeline()
+    try:
+        batch = pipeline.retrieve(batch_id)
+    except anthropic.NotFoundError:
+        return jsonify({'error': 'Batch not found'}), 404
+    except (CircuitOpenError, anthropic.APIError) as e:
+        return jsonify({'error': f'Claude API error: {str(e)}'}), 503
+    if batch.processing_status != 'ended':
+        response = jsonify({'error': 'Batch is still processing', 'status': batch.processing_status})
+        response.headers['Retry-After'] = str(int(BATCH_POLL_INTERVAL))
+        return response, 409
+
+    # Only the worker that submitted the batch knows the filenames; elsewhere rows carry custom ids alone
+    job = BATCH_JOBS.get(batch_id) or {}
+
+    def generate():
+        for row in job.get('errors', []):
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+        for row in pipeline.results(batch_id, job.get('documents')):
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
@@ -478,33 +1607,129 @@ def upload_file():
             session_id = str(uuid.uuid4())
             session['session_id'] = session_id
 
-        # Add file to conversation
-        conversation_manager.add_file(session_id, file_info)
-
-        # Add file message to conversation
-        conversation_manager.add_message(
-            session_id,
-            'user',
-            f"Uploaded file: {file_info['filename']}",
-            message_type='file',
-            metadata={
-                'filename': file_info['filename'],
-                'file_content': file_info['content'],
-                'mime_type': file_info.get('mime_type', ''),
-                'size': file_info.get('size', 0)
-            }
-        )
+        # Add file and its message to conversation
+        conversation_manager.add_files(session_id, [file_info])
 
         return jsonify({
             'success': True,
             'filename': file_info['filename'],
-            'content_preview': file_info['content'][:500] + '...' if len(file_info['content']) > 500 else file_info['content'],
+            'content_preview': upload_preview(file_info['content']),
             'size': file_info.get('size', 0)
         })
 
     except Exception as e:
         return jsonify({'error': f'File processing error: {str(e)}'}), 500
 
+@app.route('/api/upload/stream', methods=['POST', 'PUT'])
+def upload_stream():
+    # The raw body is the file; its name comes from X-Filename or ?filename=
+    filename = secure_filename(request.headers.get('X-Filename') or request.args.get('filename', ''))
+    if not filename:
+        return jsonify({'error': 'No filename provided'}), 400
+    if request.content_length is not None and request.content_length > STREAM_UPLOAD_MAX_BYTES:
+        return jsonify({'error': f'Upload exceeds {STREAM_UPLOAD_MAX_BYTES} bytes'}), 413
+
+    # Raise the app-wide form limit for this request only; receive_upload also enforces it while reading
+    request.max_content_length = STREAM_UPLOAD_MAX_BYTES
+    # Large documents are parsed in the extraction pool, which needs the body under a path it can open
+    upload_path = None
+    if FILE_EXTRACTION_WORKERS > 0:
+        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}_{filename}")
+    try:
+        return attach_streamed_upload(filename, upload_path)
+    finally:
+        if upload_path is not None and os.path.exists(upload_path):
+            os.remove(upload_path)
+
+def attach_streamed_upload(filename: str, upload_path: Optional[str]):
+    try:
+        with span('upload_receive'):
+            upload = receive_upload(
+                request.stream, filename, STREAM_UPLOAD_MAX_BYTES,
+                sniff=lambda head: magic.from_buffer(head, mime=True),
+                accept=FileProcessor.is_supported,
+                spool_bytes=UPLOAD_SPOOL_BYTES,
+                spool=open(upload_path, 'w+b') if upload_path is not None else None
+            )
+    except UploadRejected as e:
+        # Answer now; the unread remainder of the body is dropped with the connection
+        response = jsonify({'error': e.message})
+        response.status_code = e.status
+        response.headers['Connection'] = 'close'
+        return response
+
+    try:
+        with span('file_extract'), upload:
+            if upload_path is None:
+                file_info = FileProcessor.extract_stream(upload.file, filename, upload.mime_type)
+            else:
+                upload.file.flush()
+                [file_info] = FileProcessor.process_many(
+                    FileProcessor.extract_received, [(upload_path, filename, upload.mime_type)])
+        file_info['sha256'] = upload.sha256
+
+        session_id = session.get('session_id')
+        if not session_id:
+            session_id = str(uuid.uuid4())
+            session['session_id'] = session_id
+
+        conversation_manager.add_files(session_id, [file_info])
+
+        return jsonify({
+            'success': True,
+            'filename': file_info['filename'],
+            'content_preview': upload_preview(file_info['content']),
+            'size': file_info.get('size', 0),
+            'bytes': upload.size,
+            'sha256': upload.sha256
+        })
+
+    except Exception as e:
+        return jsonify({'error': f'File processing error: {str(e)}'}), 500
+
+@app.route('/api/upload/batch', methods=['POST'])
+def upload_files():
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    if len(files) > MAX_UPLOAD_FILES:
+        return jsonify({'error': f'At most {MAX_UPLOAD_FILES} files per upload'}), 400
+
+    try:
+        # Extract concurrently; results come back in upload order
+        with span('file_extract'):
+            files_info = FileProcessor.process_uploads(files)
+
+        session_id = session.get('session_id')
+        if not session_id:
+            session_id = str(uuid.uuid4())
+            session['session_id'] = session_id
+
+        # Failed files are reported, not attached
+        attached = [file_info for file_info in files_info if not file_info.get('error')]
+        conversation_manager.add_files(session_id, attached)
+
+        results = []
+        for file_info in files_info:
+            if file_info.get('error'):
+                results.append({'success': False, 'filename': file_info['filename'], 'error': file_info['content']})
+            else:
+                results.append({
+                    'success': True,
+                    'filename': file_info['filename'],
+                    'content_preview': upload_preview(file_info['content']),
+                    'size': file_info.get('size', 0)
+                })
+        return jsonify({
+            'success': bool(attached),
+            'uploaded': len(attached),
+            'failed': len(files_info) - len(attached),
+            'files': results
+        }), 200 if attached else 422
+
+    except Exception as e:
+        return jsonify({'error': f'File processing error: {str(e)}'}), 500
+
 @app.route('/api/search', methods=['POST'])
 def search():
     try:
@@ -541,18 +1766,70 @@ def fetch_url():
     except Exception as e:
         return jsonify({'error': f'Fetch error: {str(e)}'}), 500
 
+MAX_PAGE_SIZE = 200
+
 @app.route('/api/conversation')
 def get_conversation():
     session_id = session.get('session_id')
     if not session_id:
         return jsonify({'messages': [], 'files': [], 'search_history': []})
 
+    args = request.args
+    paginated = any(key in args for key in ('limit', 'before', 'after', 'since'))
     conversation = conversation_manager.get_or_create_conversation(session_id)
-    return jsonify({
-        'messages': conversation['messages'],
-        'files': conversation['files'],
-        'search_history': conversation['search_history']
-    })
+
+    # The cursor changes on every append or clear, so it doubles as a cheap validator
+    etag = f"{conversation_manager.get_cursor(session_id)}-{hashlib.sha1(request.query_string).hexdigest()[:12]}"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    if not paginated:
+        # Legacy full dump
+        response = jsonify({
+            'messages': [conversation_manager.resolve_message(m) for m in conversation.messages],
+            'files': [conversation_manager.resolve_file(f) for f in conversation.files],
+            'search_history': [conversation_manager.resolve_search(e) for e in conversation.search_history],
+            'cursor': conversation_manager.get_cursor(session_id)
+        })
+        response.set_etag(etag)
+        return response
+
+    try:
+        limit = min(MAX_PAGE_SIZE, max(1, int(args.get('limit', 50))))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    include = {part.strip() for part in args.get('include', '').split(',') if part.strip()}
+    include_metadata = 'metadata' in include
+
+    if 'since' in args:
+        payload = conversation_manager.get_changes_since(session_id, args['since'], limit)
+        payload['files'] = [conversation_manager.project_file(f, include_metadata) for f in payload['files']]
+        payload['search_history'] = [conversation_manager.project_search(e, include_metadata) for e in payload['search_history']]
+    else:
+        try:
+            payload = conversation_manager.get_message_page(
+                session_id, before=args.get('before'), after=args.get('after'), limit=limit
+            )
+        except KeyError:
+            return jsonify({'error': 'Unknown message id, reload the conversation'}), 400
+        payload['cursor'] = conversation_manager.get_cursor(session_id)
+        if 'files' in include:
+            payload['files'] = [
+                conversation_manager.project_file(conversation_manager.resolve_file(f), include_metadata)
+                for f in conversation.files
+            ]
+        if 'search_history' in include:
+            payload['search_history'] = [
+                conversation_manager.project_search(conversation_manager.resolve_search(e), include_metadata)
+                for e in conversation.search_history
+            ]
+
+    payload['messages'] = [conversation_manager.project_message(m, include_metadata) for m in payload['messages']]
+    response = jsonify(payload)
+    response.set_etag(etag)
+    return response
 
 @app.route('/api/conversation/export')
 def export_conversation():
@@ -560,29 +1837,119 @@ def export_conversation():
     if not session_id:
         return jsonify({'error': 'No conversation found'}), 404
 
+    if request.args.get('format') == 'ndjson':
+        return stream_export(session_id)
+
     conversation_data = conversation_manager.export_conversation(session_id)
 
     return jsonify(conversation_data)
 
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+def iter_ndjson(records, compress=False):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = []
+    buffered = 0
+    first = True
+    for record in records:
+        line = (json.dumps(record, default=str) + '\n').encode('utf-8')
+        buffer.append(line)
+        buffered += len(line)
+        # Flush the header record right away so the download starts immediately
+        if first or buffered >= EXPORT_CHUNK_BYTES:
+            chunk = b''.join(buffer)
+            buffer, buffered, first = [], 0, False
+            if compressor:
+                chunk = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield chunk
+    chunk = b''.join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+def stream_export(session_id):
+    filename = f"claude-conversation-{datetime.now().strftime('%Y-%m-%d')}.ndjson"
+    headers = {}
+    if request.args.get('compress') == 'gzip':
+        # Explicit request for a .gz file download
+        mimetype = 'application/gzip'
+        filename += '.gz'
+        compress = True
+    else:
+        mimetype = 'application/x-ndjson'
+        # Quality-aware, so gzip;q=0 is a refusal rather than a match
+        compress = request.accept_encodings.best_match(['gzip', 'identity']) == 'gzip'
+        if compress:
+            headers['Content-Encoding'] = 'gzip'
+    headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    headers['Vary'] = 'Accept-Encoding'
+
+    records = conversation_manager.iter_export_records(session_id)
+    return Response(stream_with_context(iter_ndjson(records, compress)), mimetype=mimetype, headers=headers)
+
 @app.route('/api/clear', methods=['POST'])
 def clear_conversation():
     session_id = session.get('session_id')
-    if session_id and session_id in conversation_manager.conversations:
-        conversation_manager.conversations[session_id] = {
-            'messages': [],
-            'created_at': datetime.now(),
-            'last_updated': datetime.now(),
-            'files': [],
-            'search_history': []
-        }
+    if session_id:
+        # Stop answers in progress; they are dropped rather than stored in the fresh conversation
+        CANCELLATIONS.cancel(session_id, reason='cleared')
+        conversation_manager.clear_conversation(session_id)
     return jsonify({'success': True})
 
+@app.route('/api/health/upstreams')
+def upstream_health():
+    return jsonify({name: breaker.snapshot() for name, breaker in UPSTREAM_BREAKERS.items()})
+
+@app.route('/api/health/cache')
+def cache_health():
+    if RESPONSE_CACHE is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **RESPONSE_CACHE.snapshot()})
+
+@app.route('/api/admin/profiles')
+@admin_required
+def list_profiles():
+    return jsonify({'profiles': PROFILE_STORE.list(), 'sampler_installed': PROFILER.installed})
+
+@app.route('/api/admin/profiles/<profile_id>')
+@admin_required
+def download_profile(profile_id):
+    path = PROFILE_STORE.path(profile_id)
+    if path is None:
+        abort(404)
+    return send_file(os.path.abspath(path), mimetype='text/plain', as_attachment=True,
+                     download_name=f'{profile_id}.collapsed')
+
+@app.route('/metrics')
+def metrics():
+    return Response(METRICS.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @socketio.on('connect')
 def handle_connect():
+    SOCKETIO_CLIENTS.inc()
+    # The Flask session cookie comes along with the handshake, so each tab joins its conversation's room
+    session_id = session.get('session_id')
+    if session_id:
+        join_room(session_room(session_id))
+        CANCELLATIONS.attach(session_id)
     print(f'Client connected: {request.sid}')
 
+@socketio.on('cancel')
+def handle_cancel(data=None):
+    session_id = session.get('session_id')
+    if not session_id:
+        return {'cancelled': []}
+    request_id = data.get('request_id') if isinstance(data, dict) else None
+    return {'cancelled': CANCELLATIONS.cancel(session_id, request_id)}
+
 @socketio.on('disconnect')
 def handle_disconnect():
+    SOCKETIO_CLIENTS.dec()
+    # Nobody is left to read the answer once the session's last tab is gone and doesn't come back
+    session_id = session.get('session_id')
+    if session_id and CANCELLATIONS.detach(session_id) == 0:
+        CANCELLATIONS.cancel_when_detached(session_id, CHAT_DISCONNECT_GRACE)
     print(f'Client disconnected: {request.sid}')
 
 if __name__ == '__main__':
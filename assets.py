@@ -0,0 +1,81 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from typing import Dict, Optional
+
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; fall back to gzip only
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'application/x-ndjson',
+    'application/xml',
+    'image/svg+xml',
+}
+
+
+def available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def is_compressible(mimetype: Optional[str]) -> bool:
+    return bool(mimetype) and (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES)
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=level if level is not None else 5)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level if level is not None else 6, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class StaticAssets:
+    """Content-hashed static files with precompressed variants held in memory"""
+
+    def __init__(self, static_folder: str, digest_length: int = 12):
+        self.static_folder = static_folder
+        self.digest_length = digest_length
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename: str) -> Optional[Dict]:
+        path = safe_join(self.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            return None
+        mtime = os.stat(path).st_mtime_ns
+        entry = self._cache.get(filename)
+        if entry is not None and entry['mtime'] == mtime:
+            return entry
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        variants = {'identity': data}
+        if is_compressible(mimetype):
+            # Static files are compressed once, so spend more CPU for smaller output
+            for encoding in available_encodings():
+                level = 11 if encoding == 'br' else 9
+                compressed = compress(data, encoding, level)
+                if len(compressed) < len(data):
+                    variants[encoding] = compressed
+        entry = {
+            'mtime': mtime,
+            'digest': hashlib.sha256(data).hexdigest()[:self.digest_length],
+            'mimetype': mimetype,
+            'variants': variants
+        }
+        with self._lock:
+            self._cache[filename] = entry
+        return entry
+
+    def digest(self, filename: str) -> Optional[str]:
+        entry = self.get(filename)
+        return entry['digest'] if entry else None
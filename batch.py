@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+# Row status for files that never made it into the batch, next to the API's succeeded/errored/canceled/expired
+EXTRACTION_ERROR = 'extraction_error'
+
+
+def custom_id_for(index: int) -> str:
+    # Batch custom ids are limited to 64 characters of [a-zA-Z0-9_-]; filenames are not
+    return f'doc-{index:05d}'
+
+
+class BatchPipeline:
+    """Runs one prompt over many documents through the Message Batches API
+
+    build_params turns an extracted document into the Messages API parameters for it;
+    call wraps each API request (e.g. with retries and a circuit breaker).
+    """
+
+    def __init__(self, client, build_params: Callable[[dict], dict], call: Optional[Callable] = None,
+                 poll_interval: float = 5.0, max_poll_interval: float = 60.0, backoff: float = 1.5,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic):
+        self.client = client
+        self.build_params = build_params
+        self._call = call or (lambda func: func())
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
+        self._sleep = sleep
+        self._clock = clock
+
+    def submit(self, documents: List[dict]) -> Tuple[object, Dict[str, str]]:
+        # Returns the created batch and the custom id -> filename mapping needed to read its results
+        documents_by_id = {}
+        batch_requests = []
+        for index, document in enumerate(documents):
+            custom_id = custom_id_for(index)
+            documents_by_id[custom_id] = document['filename']
+            batch_requests.append({'custom_id': custom_id, 'params': self.build_params(document)})
+        batch = self._call(lambda: self.client.messages.batches.create(requests=batch_requests))
+        return batch, documents_by_id
+
+    def retrieve(self, batch_id: str):
+        return self._call(lambda: self.client.messages.batches.retrieve(batch_id))
+
+    def poll_delays(self) -> Iterator[float]:
+        # Batches take minutes to hours; start reasonably quick and back off to the cap
+        delay = self.poll_interval
+        while True:
+            yield delay
+            delay = min(self.max_poll_interval, delay * self.backoff)
+
+    def wait(self, batch_id: str, timeout: Optional[float] = None, on_poll: Optional[Callable] = None):
+        started = self._clock()
+        for delay in self.poll_delays():
+            batch = self.retrieve(batch_id)
+            if on_poll is not None:
+                on_poll(batch)
+            if batch.processing_status == 'ended':
+                return batch
+            if timeout is not None and self._clock() - started + delay > timeout:
+                raise TimeoutError(f'Batch {batch_id} still {batch.processing_status} after {timeout:.0f}s')
+            self._sleep(delay)
+
+    def results(self, batch_id: str, documents_by_id: Optional[Dict[str, str]] = None) -> Iterator[dict]:
+        # Entries are decoded one line at a time as they are downloaded, in no particular order
+        documents_by_id = documents_by_id or {}
+        for entry in self._call(lambda: self.client.messages.batches.results(batch_id)):
+            yield result_row(entry, documents_by_id.get(entry.custom_id))
+
+
+def result_row(entry, filename: Optional[str]) -> dict:
+    result = entry.result
+    row = {'custom_id': entry.custom_id, 'filename': filename, 'status': result.type}
+    if result.type == 'succeeded':
+        message = result.message
+        thinking = ''.join(block.thinking for block in message.content if block.type == 'thinking')
+        row['text'] = ''.join(block.text for block in message.content if block.type == 'text')
+        row['thinking'] = thinking or None
+        row['model'] = message.model
+        row['usage'] = {'input_tokens': message.usage.input_tokens, 'output_tokens': message.usage.output_tokens}
+    elif result.type == 'errored':
+        # The error response wraps the actual error object
+        error = getattr(result.error, 'error', result.error)
+        row['error'] = getattr(error, 'message', str(error))
+    return row
+
+
+def extraction_error_rows(documents: Iterable[dict]) -> List[dict]:
+    return [
+        {'custom_id': None, 'filename': document['filename'], 'status': EXTRACTION_ERROR, 'error': document['content']}
+        for document in documents
+    ]
+
+
+def write_jsonl(rows: Iterable[dict], out: IO[str]) -> Counter:
+    # One flushed line per result, so the file can be tailed while a large batch downloads
+    counts = Counter()
+    for row in rows:
+        out.write(json.dumps(row, ensure_ascii=False) + '\n')
+        out.flush()
+        counts[row['status']] += 1
+    return counts
+
+
+def _print_progress(batch):
+    counts = batch.request_counts
+    print(f"{batch.id}: {batch.processing_status} "
+          f"({counts.processing} processing, {counts.succeeded} succeeded, {counts.errored} errored)", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run one prompt over many documents with the Message Batches API')
+    parser.add_argument('files', nargs='*', help='documents to analyse')
+    parser.add_argument('--prompt', help='instruction applied to every document')
+    parser.add_argument('--thinking-mode', default='normal',
+                        choices=['normal', 'deep_analysis', 'research_synthesis', 'strategic_thinking', 'creative_exploration'])
+    parser.add_argument('--output', '-o', required=True, help='JSONL file for the results')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='parallel extraction processes')
+    parser.add_argument('--resume', metavar='MANIFEST', help='wait for the batch recorded in a manifest instead of submitting')
+    parser.add_argument('--poll-interval', type=float, help='first polling delay (default: BATCH_POLL_INTERVAL)')
+    parser.add_argument('--max-poll-interval', type=float, help='polling delay cap (default: BATCH_MAX_POLL_INTERVAL)')
+    parser.add_argument('--timeout', type=float, help='give up waiting after this many seconds')
+    args = parser.parse_args(argv)
+
+    # Imported here so the web app can import this module without a cycle
+    from app import FileProcessor, anthropic_client, batch_pipeline
+
+    if anthropic_client is None:
+        parser.error('Claude API not configured')
+    manifest_path = args.resume or f'{args.output}.manifest.json'
+
+    if args.resume:
+        with open(args.resume) as f:
+            manifest = json.load(f)
+        pipeline = batch_pipeline(manifest['prompt'], manifest['thinking_mode'])
+        failed = []
+    else:
+        if not args.files or not args.prompt:
+            parser.error('files and --prompt are required unless --resume is given')
+        pipeline = batch_pipeline(args.prompt, args.thinking_mode)
+        documents = FileProcessor.process_many(FileProcessor.process_path, args.files, args.workers, use_processes=True)
+        failed = [document for document in documents if document.get('error')]
+        extracted = [document for document in documents if not document.get('error')]
+        print(f"Extracted {len(extracted)} of {len(documents)} documents", file=sys.stderr)
+        if not extracted:
+            with open(args.output, 'w', encoding='utf-8') as out:
+                write_jsonl(extraction_error_rows(failed), out)
+            return 1
+
+        batch, documents_by_id = pipeline.submit(extracted)
+        manifest = {
+            'batch_id': batch.id,
+            'prompt': args.prompt,
+            'thinking_mode': args.thinking_mode,
+            'documents': documents_by_id
+        }
+        # Lets --resume pick the batch up again if this process dies while waiting
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        print(f"Submitted batch {batch.id}; manifest written to {manifest_path}", file=sys.stderr)
+
+    if args.poll_interval is not None:
+        pipeline.poll_interval = args.poll_interval
+    if args.max_poll_interval is not None:
+        pipeline.max_poll_interval = args.max_poll_interval
+    pipeline.wait(manifest['batch_id'], timeout=args.timeout, on_poll=_print_progress)
+
+    with open(args.output, 'w', encoding='utf-8') as out:
+        counts = write_jsonl(extraction_error_rows(failed), out)
+        counts += write_jsonl(pipeline.results(manifest['batch_id'], manifest['documents']), out)
+    print(', '.join(f'{count} {status}' for status, count in sorted(counts.items())), file=sys.stderr)
+    return 0 if counts['succeeded'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
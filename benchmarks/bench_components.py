@@ -0,0 +1,102 @@
+import json
+import random
+from io import BytesIO
+from unittest.mock import MagicMock, patch
+
+from werkzeug.datastructures import FileStorage
+
+from app import ConversationManager, ExtendedThinking, FileProcessor, WebSearcher, iter_ndjson
+from benchmarks import corpus
+from benchmarks.harness import benchmark
+
+THINKING_MODES = ('deep_analysis', 'research_synthesis', 'strategic_thinking', 'creative_exploration')
+
+
+def _file_benchmark(filename: str, data: bytes):
+    def run():
+        result = FileProcessor.process_file(FileStorage(stream=BytesIO(data), filename=filename))
+        if result.get('error'):
+            raise RuntimeError(result['content'])
+    return run
+
+
+@benchmark('file_processor.pdf', min_rounds=3)
+def bench_pdf():
+    yield _file_benchmark('corpus.pdf', corpus.pdf_bytes())
+
+
+@benchmark('file_processor.docx', min_rounds=3)
+def bench_docx():
+    yield _file_benchmark('corpus.docx', corpus.docx_bytes())
+
+
+@benchmark('file_processor.xlsx', min_rounds=3)
+def bench_xlsx():
+    yield _file_benchmark('corpus.xlsx', corpus.xlsx_bytes())
+
+
+@benchmark('file_processor.text_1mb')
+def bench_text():
+    yield _file_benchmark('corpus.txt', corpus.text_bytes())
+
+
+def _recorded_response(name: str):
+    response = MagicMock()
+    response.status_code = 200
+    response.content = corpus.read_data(name)
+    return response
+
+
+@benchmark('web_searcher.duckduckgo_parse')
+def bench_duckduckgo():
+    with patch('requests.get', return_value=_recorded_response('duckduckgo_results.html')):
+        yield lambda: WebSearcher._search_duckduckgo('benchmark query', 10)
+
+
+@benchmark('web_searcher.fetch_page_content')
+def bench_fetch_page():
+    with patch('requests.get', return_value=_recorded_response('article.html')):
+        yield lambda: WebSearcher.fetch_page_content('https://example.com/article')
+
+
+def _conversation(turns: int):
+    manager = ConversationManager()
+    corpus.populate_conversation(manager, 'bench', turns)
+    return manager
+
+
+def _register_conversation_benchmarks(turns: int):
+    @benchmark(f'conversation.get_messages_for_api.{turns}')
+    def bench_messages():
+        manager = _conversation(turns)
+        yield lambda: manager.get_messages_for_api('bench')
+
+    @benchmark(f'conversation.export.{turns}')
+    def bench_export():
+        manager = _conversation(turns)
+        # The route serializes the export, so that is part of the cost
+        yield lambda: json.dumps(manager.export_conversation('bench'))
+
+    @benchmark(f'conversation.export_ndjson_gzip.{turns}')
+    def bench_export_ndjson():
+        manager = _conversation(turns)
+
+        def run():
+            for _ in iter_ndjson(manager.iter_export_records('bench'), compress=True):
+                pass
+        yield run
+
+
+for _turns in (10, 100, 1000):
+    _register_conversation_benchmarks(_turns)
+
+
+@benchmark('thinking.create_thinking_prompt')
+def bench_thinking_prompt():
+    query = corpus.paragraph(random.Random(8), 6)
+    context = '\n'.join(result['snippet'] for result in corpus.search_results())
+
+    def run():
+        for mode in THINKING_MODES:
+            ExtendedThinking.create_thinking_prompt(query, mode, context)
+    yield run
@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app import ConversationManager  # noqa: E402
+
+
+def _global_turn(manager, lock):
+    # What ordering costs with one lock for everything: it is held for the whole turn
+    def turn(session_id):
+        with lock:
+            yield manager.get_or_create_conversation(session_id).epoch
+    return turn
+
+
+def _session_turn(manager):
+    def turn(session_id):
+        with manager.turn(session_id) as epoch:
+            yield epoch
+    return turn
+
+
+def _client(manager, turn, session_id: str, client: int, turns: int, llm_latency: float):
+    # Mirrors chat(): store the question, wait on the model, store the answer
+    for index in range(turns):
+        for epoch in turn(session_id):
+            tag = f'{client}-{index}'
+            manager.add_message(session_id, 'user', tag, epoch=epoch)
+            time.sleep(llm_latency)
+            manager.add_message(session_id, 'assistant', f're: {tag}', epoch=epoch)
+
+
+def ordered(manager) -> bool:
+    # Every answer directly follows its own question
+    for conversation in manager.conversations.values():
+        messages = conversation.messages
+        if len(messages) % 2:
+            return False
+        for question, answer in zip(messages[::2], messages[1::2]):
+            if question.role != 'user' or answer.role != 'assistant' or answer.content != f're: {question.content}':
+                return False
+    return True
+
+
+def _run(manager, turn, sessions: int, clients: int, turns: int, llm_latency: float):
+    threads = [
+        threading.Thread(target=_client, args=(manager, turn, f'session-{index}', client, turns, llm_latency))
+        for index in range(sessions)
+        for client in range(clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    total = sessions * clients * turns
+    return {
+        'turns': total,
+        'seconds': round(elapsed, 4),
+        'turns_per_second': round(total / elapsed, 1),
+        'ordered': ordered(manager)
+    }
+
+
+def measure(sessions: int = 50, clients: int = 2, turns: int = 10, llm_latency: float = 0.005):
+    """Concurrent sessions, each with several clients sending messages at once
+
+    Compares one global lock held across each turn with the per-session turn
+    queue. Both keep every session's turns strictly ordered; only the per-session
+    queue lets different sessions wait on the model at the same time.
+    """
+    manager = ConversationManager()
+    global_lock = _run(manager, _global_turn(manager, threading.Lock()), sessions, clients, turns, llm_latency)
+    manager = ConversationManager()
+    per_session = _run(manager, _session_turn(manager), sessions, clients, turns, llm_latency)
+    return {
+        'sessions': sessions,
+        'clients_per_session': clients,
+        'turns_per_client': turns,
+        'llm_latency_ms': llm_latency * 1000,
+        'global_lock': global_lock,
+        'per_session': per_session,
+        'speedup': round(per_session['turns_per_second'] / global_lock['turns_per_second'], 2)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure chat turn throughput across concurrent sessions')
+    parser.add_argument('--sessions', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=2, help='concurrent clients per session')
+    parser.add_argument('--turns', type=int, default=10, help='turns per client')
+    parser.add_argument('--llm-latency', type=float, default=0.005, help='simulated model latency in seconds')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args(argv)
+
+    report = measure(args.sessions, args.clients, args.turns, args.llm_latency)
+    print(f"{args.sessions} sessions x {args.clients} clients x {args.turns} turns, "
+          f"{report['llm_latency_ms']:.1f} ms per answer")
+    for name in ('global_lock', 'per_session'):
+        result = report[name]
+        print(f"{name + ':':<14}{result['turns_per_second']:>10} turns/s "
+              f"({result['seconds']} s, ordered: {result['ordered']})")
+    print(f"Speedup:      {report['speedup']:>10}x")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0 if report['global_lock']['ordered'] and report['per_session']['ordered'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import os
+import random
+from io import BytesIO
+
+import pandas as pd
+from docx import Document
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+WORDS = (
+    'analysis system latency request response model token context search result '
+    'document page section table value report summary detail source network cache '
+    'session message thinking research strategy creative performance memory throughput'
+).split()
+
+
+def sentence(rng: random.Random, length: int = 12) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(length)).capitalize() + '.'
+
+
+def paragraph(rng: random.Random, sentences: int = 5) -> str:
+    return ' '.join(sentence(rng) for _ in range(sentences))
+
+
+def read_data(name: str) -> bytes:
+    with open(os.path.join(DATA_DIR, name), 'rb') as f:
+        return f.read()
+
+
+def text_bytes(size: int = 1_000_000, seed: int = 1) -> bytes:
+    rng = random.Random(seed)
+    chunks = []
+    total = 0
+    while total < size:
+        chunk = paragraph(rng) + '\n\n'
+        chunks.append(chunk)
+        total += len(chunk)
+    return ''.join(chunks).encode('utf-8')[:size]
+
+
+def docx_bytes(paragraphs: int = 400, seed: int = 2) -> bytes:
+    rng = random.Random(seed)
+    document = Document()
+    for i in range(paragraphs):
+        if i % 20 == 0:
+            document.add_heading(sentence(rng, 5), level=2)
+        document.add_paragraph(paragraph(rng))
+    buffer = BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def xlsx_bytes(rows: int = 2000, seed: int = 3) -> bytes:
+    rng = random.Random(seed)
+    frame = pd.DataFrame({
+        'id': range(rows),
+        'name': [sentence(rng, 3) for _ in range(rows)],
+        'value': [rng.random() * 1000 for _ in range(rows)],
+        'category': [rng.choice(WORDS) for _ in range(rows)],
+    })
+    buffer = BytesIO()
+    frame.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def pdf_bytes(pages: int = 30, lines_per_page: int = 40, seed: int = 4) -> bytes:
+    # Minimal hand-written PDF with one Helvetica text stream per page
+    rng = random.Random(seed)
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # page tree, filled in once page ids are known
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    page_ids = []
+    for _ in range(pages):
+        lines = [sentence(rng, 10) for _ in range(lines_per_page)]
+        text = ' T* '.join(f"({line})" + ' Tj' for line in lines)
+        stream = f"BT /F1 10 Tf 14 TL 40 800 Td {text} ET".encode('latin-1')
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+        content_id = len(objects)
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b' '.join(b'%d 0 R' % page_id for page_id in page_ids)
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, pages)
+
+    output = BytesIO()
+    output.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(output.tell())
+        output.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+    xref_offset = output.tell()
+    output.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for offset in offsets:
+        output.write(b'%010d 00000 n \n' % offset)
+    output.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_offset))
+    return output.getvalue()
+
+
+def search_results(count: int = 5, seed: int = 5):
+    rng = random.Random(seed)
+    return [
+        {
+            'title': sentence(rng, 6),
+            'url': f"https://example.com/{i}",
+            'snippet': paragraph(rng, 2),
+            'source': 'duckduckgo'
+        }
+        for i in range(count)
+    ]
+
+
+def populate_conversation(manager, session_id: str, turns: int, seed: int = 6):
+    # A realistic mix: plain turns, an uploaded file every 25 turns, search every 10
+    rng = random.Random(seed)
+    for turn in range(turns):
+        if turn % 25 == 0:
+            content = paragraph(rng, 40)
+            file_info = {'filename': f'doc{turn}.txt', 'content': content, 'mime_type': 'text/plain', 'size': len(content)}
+            manager.add_file(session_id, file_info)
+            manager.add_message(session_id, 'user', f"Uploaded file: doc{turn}.txt", message_type='file', metadata={
+                'filename': file_info['filename'],
+                'file_content': content,
+                'mime_type': 'text/plain',
+                'size': len(content)
+            })
+        results = search_results(seed=turn) if turn % 10 == 0 else []
+        if results:
+            manager.add_search(session_id, sentence(rng, 4), results)
+        manager.add_message(session_id, 'user', paragraph(rng, 2), metadata={'thinking_mode': 'normal', 'enhanced_prompt_used': False})
+        manager.add_message(session_id, 'assistant', paragraph(rng, 12), metadata={
+            'search_used': bool(results),
+            'search_results': results,
+            'thinking_mode': 'normal',
+            'token_usage': 250
+        })
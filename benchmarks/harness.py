@@ -0,0 +1,105 @@
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+REGISTRY = {}
+
+
+def benchmark(name: str, min_rounds: int = 5, min_time: float = 0.5, max_rounds: int = 200):
+    # The decorated function is a generator: setup, yield the callable to time, teardown
+    def decorator(func):
+        REGISTRY[name] = {
+            'func': func,
+            'min_rounds': min_rounds,
+            'min_time': min_time,
+            'max_rounds': max_rounds
+        }
+        return func
+    return decorator
+
+
+def run_one(name: str, quick: bool = False) -> Dict:
+    spec = REGISTRY[name]
+    generator = spec['func']()
+    target = next(generator)
+    try:
+        target()  # warm-up
+        min_rounds = 2 if quick else spec['min_rounds']
+        min_time = 0.05 if quick else spec['min_time']
+        samples = []
+        started = time.perf_counter()
+        while len(samples) < spec['max_rounds']:
+            t0 = time.perf_counter()
+            target()
+            samples.append((time.perf_counter() - t0) * 1000)
+            if len(samples) >= min_rounds and time.perf_counter() - started >= min_time:
+                break
+    finally:
+        generator.close()
+    return {
+        'median_ms': round(statistics.median(samples), 4),
+        'mean_ms': round(statistics.fmean(samples), 4),
+        'min_ms': round(min(samples), 4),
+        'stdev_ms': round(statistics.stdev(samples), 4) if len(samples) > 1 else 0.0,
+        'rounds': len(samples)
+    }
+
+
+def run_all(pattern: Optional[str] = None, quick: bool = False,
+            progress: Callable[[str, Dict], None] = lambda name, result: None) -> Dict:
+    results = {}
+    for name in sorted(REGISTRY):
+        if pattern and pattern not in name:
+            continue
+        results[name] = run_one(name, quick)
+        progress(name, results[name])
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+
+
+def save(report: Dict, path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def load(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    # A benchmark regresses when its median is slower than baseline by more than the tolerance
+    rows = []
+    for name, result in sorted(current['results'].items()):
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            rows.append({'name': name, 'baseline_ms': None, 'current_ms': result['median_ms'], 'change': None, 'status': 'new'})
+            continue
+        change = (result['median_ms'] - base['median_ms']) / base['median_ms'] if base['median_ms'] else 0.0
+        if change > tolerance:
+            status = 'REGRESSION'
+        elif change < -tolerance:
+            status = 'improved'
+        else:
+            status = 'ok'
+        rows.append({'name': name, 'baseline_ms': base['median_ms'], 'current_ms': result['median_ms'], 'change': change, 'status': status})
+    return rows
+
+
+def format_comparison(rows: List[Dict]) -> str:
+    width = max([len(row['name']) for row in rows] + [9])
+    lines = [f"{'benchmark':<{width}}  {'baseline':>12}  {'current':>12}  {'change':>8}  status"]
+    for row in rows:
+        baseline = f"{row['baseline_ms']:.3f}ms" if row['baseline_ms'] is not None else '-'
+        change = f"{row['change'] * 100:+.1f}%" if row['change'] is not None else '-'
+        lines.append(f"{row['name']:<{width}}  {baseline:>12}  {row['current_ms']:>10.3f}ms  {change:>8}  {row['status']}")
+    return '\n'.join(lines)
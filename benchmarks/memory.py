@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app import ConversationManager  # noqa: E402
+from benchmarks import corpus  # noqa: E402
+
+
+def _extracted_text(seed: int, sentences: int) -> str:
+    # Rebuilt on every call, like re-extracting an uploaded file, so equal
+    # contents are separate string objects unless something deduplicates them
+    return corpus.paragraph(random.Random(seed), sentences)
+
+
+def simulate_session(manager, session_id: str, turns: int, seed: int):
+    # Mirrors what upload_file() and chat() store for each request
+    rng = random.Random(seed)
+    for turn in range(turns):
+        if turn % 25 == 0:
+            # Half the uploads are a document shared across the team, the rest are private
+            shared = turn % 50 == 0
+            content = _extracted_text(1000 + turn if shared else seed * 10_000 + turn, 200)
+            file_info = {'filename': f'doc{turn}.txt', 'content': content, 'mime_type': 'text/plain', 'size': len(content)}
+            manager.add_file(session_id, file_info)
+            manager.add_message(session_id, 'user', f"Uploaded file: {file_info['filename']}", message_type='file', metadata={
+                'filename': file_info['filename'],
+                'file_content': file_info['content'],
+                'mime_type': file_info['mime_type'],
+                'size': file_info['size']
+            })
+        results = []
+        if turn % 5 == 0:
+            # Popular queries come back with the same results for everyone
+            query_seed = rng.randrange(20)
+            results = corpus.search_results(seed=query_seed)
+            manager.add_search(session_id, f'query {query_seed}', results)
+        manager.add_message(session_id, 'user', corpus.paragraph(rng, 2), metadata={'thinking_mode': 'normal'})
+        manager.add_message(session_id, 'assistant', corpus.paragraph(rng, 12), metadata={
+            'search_used': bool(results),
+            'search_results': results,
+            'thinking_mode': 'normal',
+            'token_usage': 250
+        })
+
+
+def measure(sessions: int = 20, turns: int = 100, seed: int = 0):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        manager = ConversationManager()
+        for index in range(sessions):
+            simulate_session(manager, f'session-{index}', turns, seed + index + 1)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    footprint = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    blobs = manager.blobs.stats()
+    saved = blobs['referenced_bytes'] - blobs['stored_bytes']
+    return {
+        'sessions': sessions,
+        'turns': turns,
+        'footprint_bytes': footprint,
+        'bytes_per_session': footprint // sessions,
+        'blobs': blobs,
+        'blob_bytes_saved': saved,
+        'blob_bytes_saved_per_session': saved // sessions,
+        'blob_dedup_ratio': round(blobs['referenced_bytes'] / blobs['stored_bytes'], 2) if blobs['stored_bytes'] else 1.0
+    }
+
+
+def _append_messages(manager, total: int, sessions: int, texts):
+    for i in range(total):
+        role = 'user' if i % 2 == 0 else 'assistant'
+        metadata = {'thinking_mode': 'normal'} if role == 'user' else {'thinking_mode': 'normal', 'token_usage': 250}
+        manager.add_message(f'session-{i % sessions}', role, texts[i % len(texts)], metadata=metadata)
+
+
+def measure_messages(total: int = 100_000, sessions: int = 1_000, seed: int = 0):
+    # Message text is shared so the numbers reflect per-record overhead, not content
+    rng = random.Random(seed)
+    texts = [corpus.paragraph(rng, 2) for _ in range(64)]
+
+    manager = ConversationManager()
+    started = time.perf_counter()
+    _append_messages(manager, total, sessions, texts)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        measured = ConversationManager()
+        _append_messages(measured, total, sessions, texts)
+        after_records = tracemalloc.take_snapshot()
+        # The same messages as the plain dicts they used to be stored as, each with its own metadata dict
+        as_dicts = [
+            {**data, 'metadata': dict(data['metadata'])}
+            for conversation in measured.conversations.values()
+            for data in map(measured.resolve_message, conversation.messages)
+        ]
+        after_dicts = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    record_bytes = sum(stat.size_diff for stat in after_records.compare_to(before, 'filename'))
+    dict_bytes = sum(stat.size_diff for stat in after_dicts.compare_to(after_records, 'filename'))
+    del as_dicts
+    return {
+        'messages': total,
+        'sessions': sessions,
+        'appends_per_second': round(total / elapsed),
+        'bytes_per_message': record_bytes // total,
+        'dict_bytes_per_message': dict_bytes // total
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the memory footprint of stored conversations')
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--turns', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=100_000, help='messages for the per-message benchmark')
+    parser.add_argument('--message-sessions', type=int, default=1_000, help='sessions the messages are spread over')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args(argv)
+
+    report = measure(args.sessions, args.turns, args.seed)
+    blobs = report['blobs']
+    print(f"{args.sessions} sessions x {args.turns} turns")
+    print(f"Measured footprint:  {report['footprint_bytes'] / 1024:>10.1f} KiB "
+          f"({report['bytes_per_session'] / 1024:.1f} KiB per session)")
+    print(f"Blob store:          {blobs['stored_bytes'] / 1024:>10.1f} KiB stored in {blobs['blobs']} blobs, "
+          f"{blobs['referenced_bytes'] / 1024:.1f} KiB referenced by {blobs['references']} records")
+    print(f"Saved by dedup:      {report['blob_bytes_saved'] / 1024:>10.1f} KiB "
+          f"({report['blob_bytes_saved_per_session'] / 1024:.1f} KiB per session, {report['blob_dedup_ratio']}x)")
+
+    messages = measure_messages(args.messages, args.message_sessions, args.seed)
+    print(f"\n{messages['messages']} messages across {messages['sessions']} sessions")
+    print(f"Append throughput:   {messages['appends_per_second']:>10} messages/s")
+    print(f"Bytes per message:   {messages['bytes_per_message']:>10} "
+          f"(as plain dicts: {messages['dict_bytes_per_message']})")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'sessions': report, 'messages': messages}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import argparse
+import importlib
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app import app  # noqa: E402
+from benchmarks import harness  # noqa: E402
+
+SUITES = ['benchmarks.bench_components']
+DEFAULT_RESULTS = os.path.join(ROOT, 'benchmarks', 'results', 'latest.json')
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'results', 'baseline.json')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run component micro-benchmarks')
+    parser.add_argument('-k', '--filter', help='only run benchmarks whose name contains this string')
+    parser.add_argument('--quick', action='store_true', help='fewer rounds, for smoke testing')
+    parser.add_argument('--output', default=DEFAULT_RESULTS, help='where to save results as JSON')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown of the median, as a fraction')
+    parser.add_argument('--update-baseline', action='store_true', help='save these results as the new baseline')
+    args = parser.parse_args(argv)
+
+    for suite in SUITES:
+        importlib.import_module(suite)
+
+    app.config['UPLOAD_FOLDER'] = tempfile.mkdtemp(prefix='bench-uploads-')
+
+    def progress(name, result):
+        print(f"{name:<45} median {result['median_ms']:>10.3f}ms  ({result['rounds']} rounds)")
+
+    report = harness.run_all(args.filter, args.quick, progress)
+    harness.save(report, args.output)
+    print(f"\nResults saved to {args.output}")
+
+    if args.update_baseline:
+        harness.save(report, args.baseline)
+        print(f"Baseline updated at {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline found; run with --update-baseline to create one')
+        return 0
+
+    rows = harness.compare(report, harness.load(args.baseline), args.tolerance)
+    print()
+    print(harness.format_comparison(rows))
+    regressions = [row for row in rows if row['status'] == 'REGRESSION']
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
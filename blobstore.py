@@ -0,0 +1,79 @@
+import hashlib
+import json
+import threading
+from typing import Any, Dict
+
+
+class BlobStore:
+    """Content-addressed, reference-counted storage for large conversation values
+
+    Equal values share one stored copy no matter how many messages, files or
+    sessions refer to them. Stored values are shared, so callers must treat
+    what they get back as read-only.
+    """
+
+    def __init__(self):
+        # blob id -> [value, refcount, size in bytes]
+        self._blobs: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _encode(value: Any):
+        # Prefix the kind so the text '[]' and the empty list don't share an id
+        if isinstance(value, str):
+            return b's:' + value.encode('utf-8')
+        return b'j:' + json.dumps(value, sort_keys=True, default=str).encode('utf-8')
+
+    def put(self, value: Any) -> str:
+        encoded = self._encode(value)
+        blob_id = hashlib.sha256(encoded).hexdigest()[:32]
+        with self._lock:
+            entry = self._blobs.get(blob_id)
+            if entry is None:
+                self._blobs[blob_id] = [value, 1, len(encoded) - 2]
+            else:
+                entry[1] += 1
+        return blob_id
+
+    def get(self, blob_id: str, default: Any = None) -> Any:
+        entry = self._blobs.get(blob_id)
+        return entry[0] if entry is not None else default
+
+    def retain(self, blob_id: str) -> bool:
+        # One more reference to a value that is already stored; False if it is gone
+        with self._lock:
+            entry = self._blobs.get(blob_id)
+            if entry is None:
+                return False
+            entry[1] += 1
+            return True
+
+    def release(self, blob_id: str):
+        with self._lock:
+            entry = self._blobs.get(blob_id)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._blobs[blob_id]
+
+    def refcount(self, blob_id: str) -> int:
+        entry = self._blobs.get(blob_id)
+        return entry[1] if entry is not None else 0
+
+    def __contains__(self, blob_id: str) -> bool:
+        return blob_id in self._blobs
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = list(self._blobs.values())
+        return {
+            'blobs': len(entries),
+            'references': sum(entry[1] for entry in entries),
+            'stored_bytes': sum(entry[2] for entry in entries),
+            # What the same references would cost if every one held its own copy
+            'referenced_bytes': sum(entry[1] * entry[2] for entry in entries)
+        }
@@ -0,0 +1,121 @@
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+
+class CancelToken:
+    """Cooperative cancellation flag for one in-flight request"""
+
+    __slots__ = ('session_id', 'request_id', 'reason', '_event')
+
+    def __init__(self, session_id: str, request_id: str):
+        self.session_id = session_id
+        self.request_id = request_id
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = 'cancelled') -> bool:
+        # The first reason sticks; returns whether this call did the cancelling
+        if self._event.is_set():
+            return False
+        self.reason = reason
+        self._event.set()
+        return True
+
+
+class CancellationRegistry:
+    """Tokens for in-flight requests by session, plus the sockets each session has open
+
+    The registry is per process: a cancel reaches the generation only when it
+    arrives at the worker serving it, which sticky sessions already ensure.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, Dict[str, CancelToken]] = {}
+        self._sockets: Counter = Counter()
+        self._pending: Dict[str, threading.Timer] = {}
+
+    def register(self, session_id: str, request_id: str, supersede: bool = True) -> CancelToken:
+        token = CancelToken(session_id, request_id)
+        with self._lock:
+            active = self._tokens.setdefault(session_id, {})
+            superseded = list(active.values()) if supersede else []
+            active[request_id] = token
+        # A new message makes the answer still being generated for the old one moot
+        for previous in superseded:
+            previous.cancel('superseded')
+        return token
+
+    def release(self, token: CancelToken):
+        with self._lock:
+            active = self._tokens.get(token.session_id)
+            if active and active.get(token.request_id) is token:
+                del active[token.request_id]
+                if not active:
+                    del self._tokens[token.session_id]
+
+    def cancel(self, session_id: str, request_id: Optional[str] = None, reason: str = 'cancelled') -> List[str]:
+        # Cancels one request, or every request of the session; returns the ids actually cancelled
+        with self._lock:
+            active = dict(self._tokens.get(session_id, {}))
+        if request_id is not None:
+            active = {request_id: active[request_id]} if request_id in active else {}
+        return [rid for rid, token in active.items() if token.cancel(reason)]
+
+    def active(self, session_id: str) -> List[str]:
+        with self._lock:
+            return list(self._tokens.get(session_id, {}))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(active) for active in self._tokens.values())
+
+    def attach(self, session_id: str):
+        with self._lock:
+            self._sockets[session_id] += 1
+            pending = self._pending.pop(session_id, None)
+        # A tab that reconnects in time (a reload, a network blip) keeps the answer going
+        if pending is not None:
+            pending.cancel()
+
+    def detach(self, session_id: str) -> int:
+        # Returns the number of sockets the session still has open
+        with self._lock:
+            self._sockets[session_id] -= 1
+            remaining = self._sockets[session_id]
+            if remaining <= 0:
+                del self._sockets[session_id]
+        return max(remaining, 0)
+
+    def cancel_when_detached(self, session_id: str, grace: float, reason: str = 'disconnected'):
+        # Cancels the session's requests unless one of its sockets attaches within grace seconds
+        if grace <= 0:
+            self._cancel_if_detached(session_id, None, reason)
+            return
+
+        def expire():
+            self._cancel_if_detached(session_id, timer, reason)
+
+        timer = threading.Timer(grace, expire)
+        timer.daemon = True
+        with self._lock:
+            previous = self._pending.get(session_id)
+            self._pending[session_id] = timer
+        if previous is not None:
+            previous.cancel()
+        timer.start()
+
+    def _cancel_if_detached(self, session_id: str, timer: Optional[threading.Timer], reason: str):
+        with self._lock:
+            if timer is not None:
+                if self._pending.get(session_id) is not timer:
+                    return
+                del self._pending[session_id]
+            if self._sockets[session_id] > 0:
+                return
+        self.cancel(session_id, reason=reason)
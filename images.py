@@ -0,0 +1,98 @@
+import base64
+import io
+from typing import Dict
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it images are rejected as unsupported
+    Image = None
+
+# Image types the Messages API accepts as vision input
+VISION_MIME_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp'}
+
+# Quality steps tried before the image is scaled down further to fit the byte limit
+JPEG_QUALITIES = (85, 75, 65, 50)
+
+
+def images_supported() -> bool:
+    return Image is not None
+
+
+def _flatten(image):
+    # JPEG has no alpha channel; composite transparent images onto white
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, media_type: str, quality: int) -> bytes:
+    out = io.BytesIO()
+    if media_type == 'image/png':
+        image.save(out, format='PNG', optimize=True)
+    else:
+        image.save(out, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def prepare_image(data: bytes, max_dimension: int, max_bytes: int) -> Dict:
+    """Downscales and recompresses an image for a vision request
+
+    The longer side is limited to max_dimension and the encoded size to
+    max_bytes. PNG is kept for small, lossless-friendly images such as
+    screenshots; otherwise the image is re-encoded as JPEG at decreasing
+    quality, and then at smaller sizes, until it fits. Runs in a worker process.
+    """
+    with Image.open(io.BytesIO(data)) as opened:
+        source_format = opened.format
+        original_width, original_height = opened.size
+        # Animated images keep only their first frame; EXIF orientation is applied to the pixels
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+    if image.mode in ('P', '1'):
+        # Palette images would otherwise be resized with nearest-neighbour sampling
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    encoded = None
+    media_type = 'image/png'
+    if source_format == 'PNG':
+        encoded = _encode(image, media_type, 0)
+    if encoded is None or len(encoded) > max_bytes:
+        media_type = 'image/jpeg'
+        image = _flatten(image)
+        while True:
+            for quality in JPEG_QUALITIES:
+                encoded = _encode(image, media_type, quality)
+                if len(encoded) <= max_bytes:
+                    break
+            if len(encoded) <= max_bytes or min(image.size) <= 64:
+                break
+            image = image.resize((max(1, image.width * 3 // 4), max(1, image.height * 3 // 4)), Image.LANCZOS)
+
+    return {
+        'media_type': media_type,
+        'data': base64.b64encode(encoded).decode('ascii'),
+        'bytes': len(encoded),
+        'width': image.width,
+        'height': image.height,
+        'original_width': original_width,
+        'original_height': original_height
+    }
+
+
+def describe_image(image: Dict) -> str:
+    # Stands in for the image wherever text is expected: previews, history and exports
+    description = f"Image {image['width']}x{image['height']} ({image['media_type']}, {image['bytes']} bytes)"
+    if (image['width'], image['height']) != (image['original_width'], image['original_height']):
+        description += f", downscaled from {image['original_width']}x{image['original_height']}"
+    return description
+
+
+def image_block(image: Dict) -> Dict:
+    return {
+        'type': 'image',
+        'source': {'type': 'base64', 'media_type': image['media_type'], 'data': image['data']}
+    }
@@ -0,0 +1,263 @@
+import argparse
+import functools
+import json
+import math
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks import corpus  # noqa: E402
+from loadtest.stubs import UpstreamStubs  # noqa: E402
+
+DEFAULT_MIX = 'chat=40,chat_search=20,upload=10,poll=30'
+PROMPTS = [
+    'Summarize the trade-offs between caching strategies',
+    'Explain how circuit breakers work',
+    'What is a good way to structure a Flask app?',
+    'Compare PDF text extraction libraries',
+    'Give me three ideas for a weekend project',
+]
+
+
+def dockerfile_command(port: int, workers=None):
+    # Run the same gunicorn command the container runs, bound to a local port
+    with open(os.path.join(ROOT, 'DOCKERFILE')) as f:
+        cmd_line = next(line for line in f if line.startswith('CMD'))
+    args = json.loads(cmd_line[len('CMD'):].strip())
+    if args[0] != 'gunicorn':
+        raise RuntimeError(f"Unexpected DOCKERFILE command: {args}")
+    args = args[1:]
+    args[args.index('--bind') + 1] = f"127.0.0.1:{port}"
+    if workers is not None:
+        args[args.index('-w') + 1] = str(workers)
+    return [sys.executable, '-m', 'gunicorn', *args]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url: str, process=None, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"App exited with code {process.returncode} before becoming ready")
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"App did not become ready at {url}")
+
+
+def parse_mix(mix: str):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - set(OPERATIONS)
+    if unknown:
+        raise ValueError(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def op_chat(http, base, rng):
+    return http.post(f"{base}/api/chat", json={'message': rng.choice(PROMPTS)}, timeout=120)
+
+
+def op_chat_search(http, base, rng):
+    prompt = rng.choice(PROMPTS)
+    return http.post(f"{base}/api/chat", json={'message': prompt, 'use_search': True, 'search_query': prompt}, timeout=120)
+
+
+def op_upload(http, base, rng):
+    content = ('\n'.join(rng.choice(PROMPTS) for _ in range(400))).encode('utf-8')
+    return http.post(f"{base}/api/upload", files={'file': ('notes.txt', content, 'text/plain')}, timeout=120)
+
+
+@functools.lru_cache(maxsize=1)
+def batch_documents():
+    return [corpus.pdf_bytes(pages=30, seed=seed) for seed in range(4)]
+
+
+def op_upload_batch(http, base, rng):
+    # CPU-bound extraction of several PDFs; shows whether it holds up everyone else's requests
+    files = [('files', (f'report{index}.pdf', document, 'application/pdf'))
+             for index, document in enumerate(batch_documents())]
+    return http.post(f"{base}/api/upload/batch", files=files, timeout=120)
+
+
+def op_poll(http, base, rng):
+    # Same first page the frontend loads
+    return http.get(f"{base}/api/conversation", params={'limit': 50}, timeout=60)
+
+
+OPERATIONS = {
+    'chat': op_chat,
+    'chat_search': op_chat_search,
+    'upload': op_upload,
+    'upload_batch': op_upload_batch,
+    'poll': op_poll,
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    groups = {'all': samples}
+    for sample in samples:
+        groups.setdefault(sample['op'], []).append(sample)
+    report = {}
+    for name, group in groups.items():
+        latencies = sorted(sample['latency'] for sample in group)
+        errors = sum(1 for sample in group if not sample['ok'])
+        report[name] = {
+            'requests': len(group),
+            'throughput_rps': round(len(group) / elapsed, 2) if elapsed else 0.0,
+            'error_rate': round(errors / len(group), 4) if group else 0.0,
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        }
+    return report
+
+
+def drive(base: str, weights, concurrency: int, duration: float, seed: int = 0):
+    samples = []
+    lock = threading.Lock()
+    names = list(weights)
+    deadline = time.monotonic() + duration
+
+    def user(index):
+        rng = random.Random(seed + index)
+        http = requests.Session()
+        http.get(f"{base}/", timeout=30)  # establishes the session cookie
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights=[weights[n] for n in names])[0]
+            started = time.perf_counter()
+            try:
+                response = OPERATIONS[name](http, base, rng)
+                ok = response.status_code < 400
+                status = response.status_code
+            except requests.RequestException as e:
+                ok, status = False, type(e).__name__
+            sample = {'op': name, 'latency': time.perf_counter() - started, 'ok': ok, 'status': status}
+            with lock:
+                samples.append(sample)
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def format_report(report):
+    lines = [f"{'operation':<12} {'requests':>9} {'rps':>8} {'errors':>8} {'p50':>9} {'p95':>9} {'p99':>9}"]
+    for name in sorted(report, key=lambda n: (n == 'all', n)):
+        row = report[name]
+        lines.append(
+            f"{name:<12} {row['requests']:>9} {row['throughput_rps']:>8.2f} {row['error_rate'] * 100:>7.2f}% "
+            f"{row['p50_ms'] or 0:>7.1f}ms {row['p95_ms'] or 0:>7.1f}ms {row['p99_ms'] or 0:>7.1f}ms"
+        )
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the app against local Anthropic and search stand-ins')
+    parser.add_argument('--concurrency', type=int, default=20, help='number of concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of traffic to generate')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument('--workers', type=int, help='override the gunicorn worker count from the DOCKERFILE')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='fake Claude time before the first token, seconds')
+    parser.add_argument('--token-delay', type=float, default=0.005, help='fake Claude delay per output token, seconds')
+    parser.add_argument('--output-tokens', type=int, default=200, help='fake Claude response length in tokens')
+    parser.add_argument('--search-latency', type=float, default=0.1, help='fake search latency, seconds')
+    parser.add_argument('--upstream-error-rate', type=float, default=0.0, help='fraction of fake Claude calls that return 529')
+    parser.add_argument('--search-provider', choices=['brave', 'duckduckgo'], default='brave')
+    parser.add_argument('--target', help='drive an already running app at this URL instead of starting gunicorn')
+    parser.add_argument('--json', help='also write the report to this file')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    weights = parse_mix(args.mix)
+    stubs = UpstreamStubs(
+        llm_latency=args.llm_latency,
+        token_delay=args.token_delay,
+        output_tokens=args.output_tokens,
+        search_latency=args.search_latency,
+        error_rate=args.upstream_error_rate,
+        seed=args.seed
+    ).start()
+    server = None
+    try:
+        if args.target:
+            base = args.target.rstrip('/')
+        else:
+            port = free_port()
+            command = dockerfile_command(port, args.workers)
+            env = {
+                **os.environ,
+                **stubs.env,
+                'ANTHROPIC_API_KEY': 'stub-key',
+                'SECRET_KEY': 'loadtest-secret',
+                'FLASK_ENV': 'production',
+            }
+            if args.search_provider == 'brave':
+                env['BRAVE_API_KEY'] = 'stub-key'
+            else:
+                env.pop('BRAVE_API_KEY', None)
+            print(f"Starting: {shlex.join(command)}")
+            server = subprocess.Popen(command, cwd=ROOT, env=env)
+            base = f"http://127.0.0.1:{port}"
+            wait_until_ready(f"{base}/", server)
+
+        print(f"Driving {args.concurrency} users for {args.duration:.0f}s against {base} with mix {args.mix}")
+        samples, elapsed = drive(base, weights, args.concurrency, args.duration, args.seed)
+        report = {
+            'config': {key: value for key, value in vars(args).items() if key != 'json'},
+            'elapsed_s': round(elapsed, 2),
+            'upstream_calls': stubs.counts,
+            'operations': summarize(samples, elapsed)
+        }
+        print()
+        print(format_report(report['operations']))
+        print(f"\nUpstream calls: {stubs.counts}")
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+        return 0
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        stubs.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
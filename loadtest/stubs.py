@@ -0,0 +1,190 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+LOREM = (
+    'The quick answer depends on context, so here is a structured overview with the main '
+    'trade-offs, a worked example and a short list of follow-up questions worth exploring.'
+).split()
+
+
+class UpstreamStubs:
+    """Stand-ins for the Anthropic messages API and the Brave/DuckDuckGo search endpoints"""
+
+    def __init__(self, llm_latency: float = 0.5, token_delay: float = 0.01, output_tokens: int = 200,
+                 search_latency: float = 0.1, error_rate: float = 0.0, seed: int = 0):
+        self.llm_latency = llm_latency
+        self.token_delay = token_delay
+        self.output_tokens = output_tokens
+        self.search_latency = search_latency
+        self.error_rate = error_rate
+        self.counts = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.1,), daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def env(self):
+        return {
+            'ANTHROPIC_BASE_URL': self.url,
+            'BRAVE_SEARCH_URL': f"{self.url}/brave/res/v1/web/search",
+            'DUCKDUCKGO_SEARCH_URL': f"{self.url}/duckduckgo/html/"
+        }
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def _should_fail(self):
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def _jittered(self, seconds):
+        with self._lock:
+            return seconds * self._rng.uniform(0.8, 1.2)
+
+    def _words(self, count):
+        with self._lock:
+            return [self._rng.choice(LOREM) for _ in range(count)]
+
+    def _make_handler(self):
+        stubs = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                if path == '/v1/messages':
+                    stubs._count('messages')
+                    return self._messages(payload)
+                self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': path}})
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query).get('q', [''])[0]
+                if parsed.path.startswith('/brave'):
+                    stubs._count('brave')
+                    time.sleep(stubs._jittered(stubs.search_latency))
+                    results = [
+                        {'title': f"{query} result {i}", 'url': f"https://example.com/{i}", 'description': ' '.join(stubs._words(20))}
+                        for i in range(5)
+                    ]
+                    return self._send_json(200, {'web': {'results': results}})
+                if parsed.path.startswith('/duckduckgo'):
+                    stubs._count('duckduckgo')
+                    time.sleep(stubs._jittered(stubs.search_latency))
+                    html = ''.join(
+                        f'<div class="result"><a class="result__a" href="https://example.com/{i}">{query} result {i}</a>'
+                        f'<a class="result__snippet">{" ".join(stubs._words(20))}</a></div>'
+                        for i in range(5)
+                    ).encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('Content-Length', str(len(html)))
+                    self.end_headers()
+                    return self.wfile.write(html)
+                self._send_json(404, {'error': 'not found'})
+
+            def _messages(self, payload):
+                if stubs._should_fail():
+                    return self._send_json(529, {'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'Overloaded'}})
+                max_tokens = int(payload.get('max_tokens', stubs.output_tokens))
+                tokens = stubs._words(min(max_tokens, stubs.output_tokens))
+                input_tokens = sum(len(json.dumps(m.get('content', ''))) for m in payload.get('messages', [])) // 4
+                model = payload.get('model', 'claude-stub')
+                time.sleep(stubs._jittered(stubs.llm_latency))
+                if payload.get('stream'):
+                    return self._stream(model, tokens, input_tokens, payload)
+                if stubs.token_delay:
+                    time.sleep(stubs.token_delay * len(tokens))
+                content = []
+                if payload.get('thinking', {}).get('type') == 'enabled':
+                    content.append({'type': 'thinking', 'thinking': ' '.join(tokens[:20]), 'signature': 'stub'})
+                content.append({'type': 'text', 'text': ' '.join(tokens)})
+                self._send_json(200, {
+                    'id': f"msg_{uuid.uuid4().hex}",
+                    'type': 'message',
+                    'role': 'assistant',
+                    'model': model,
+                    'content': content,
+                    'stop_reason': 'end_turn',
+                    'stop_sequence': None,
+                    'usage': {'input_tokens': input_tokens, 'output_tokens': len(tokens)}
+                })
+
+            def _event(self, name, data):
+                chunk = f"event: {name}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                self.wfile.flush()
+
+            def _stream(self, model, tokens, input_tokens, payload):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                self._event('message_start', {'type': 'message_start', 'message': {
+                    'id': f"msg_{uuid.uuid4().hex}", 'type': 'message', 'role': 'assistant', 'model': model,
+                    'content': [], 'stop_reason': None, 'stop_sequence': None,
+                    'usage': {'input_tokens': input_tokens, 'output_tokens': 0}
+                }})
+                index = 0
+                if payload.get('thinking', {}).get('type') == 'enabled':
+                    self._event('content_block_start', {'type': 'content_block_start', 'index': index,
+                                                        'content_block': {'type': 'thinking', 'thinking': '', 'signature': ''}})
+                    for token in tokens[:20]:
+                        self._event('content_block_delta', {'type': 'content_block_delta', 'index': index,
+                                                            'delta': {'type': 'thinking_delta', 'thinking': token + ' '}})
+                        time.sleep(stubs.token_delay)
+                    self._event('content_block_delta', {'type': 'content_block_delta', 'index': index,
+                                                        'delta': {'type': 'signature_delta', 'signature': 'stub'}})
+                    self._event('content_block_stop', {'type': 'content_block_stop', 'index': index})
+                    index += 1
+                self._event('content_block_start', {'type': 'content_block_start', 'index': index,
+                                                    'content_block': {'type': 'text', 'text': ''}})
+                for token in tokens:
+                    self._event('content_block_delta', {'type': 'content_block_delta', 'index': index,
+                                                        'delta': {'type': 'text_delta', 'text': token + ' '}})
+                    time.sleep(stubs.token_delay)
+                self._event('content_block_stop', {'type': 'content_block_stop', 'index': index})
+                self._event('message_delta', {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                                              'usage': {'output_tokens': len(tokens)}})
+                self._event('message_stop', {'type': 'message_stop'})
+                self.wfile.write(b'0\r\n\r\n')
+                self.wfile.flush()
+
+        return Handler
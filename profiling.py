@@ -0,0 +1,172 @@
+import json
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+_PROFILE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,80}$')
+
+
+def frame_label(code) -> str:
+    # One label per function; ';' separates frames in the collapsed format
+    filename = '/'.join(code.co_filename.replace('\\', '/').split('/')[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(';', ':')
+
+
+def collapse(frame, max_depth: int = 128) -> str:
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class ProfileSession:
+    __slots__ = ('ident', 'stacks', 'started', 'duration')
+
+    def __init__(self, ident: int):
+        self.ident = ident
+        self.stacks = Counter()
+        self.started = time.perf_counter()
+        self.duration = None
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        # Brendan Gregg's collapsed-stack format, read by flamegraph.pl, speedscope and inferno
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class SamplingProfiler:
+    """Statistical CPU profiler for individual requests
+
+    A SIGPROF interval timer runs while at least one session is active. On each
+    tick the profiled thread's stack is recorded: the interrupted frame when the
+    request runs on the signalled thread (the main thread, or the current green
+    thread under eventlet), otherwise the thread's frame from sys._current_frames().
+    The timer counts CPU time, so time spent waiting on the network is not sampled.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 128):
+        self.interval = interval
+        self.max_depth = max_depth
+        # Replaced, never mutated, so the signal handler can read it without a lock
+        self._sessions: Dict[int, ProfileSession] = {}
+        self._lock = threading.Lock()
+        self.installed = False
+
+    def install(self) -> bool:
+        # Signal handlers can only be set from the main thread, and SIGPROF is POSIX only
+        if self.installed:
+            return True
+        if not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+            return False
+        signal.signal(signal.SIGPROF, self._sample)
+        self.installed = True
+        return True
+
+    def start(self) -> Optional[ProfileSession]:
+        if not self.installed:
+            return None
+        session = ProfileSession(threading.get_ident())
+        with self._lock:
+            sessions = dict(self._sessions)
+            sessions[session.ident] = session
+            self._sessions = sessions
+            if len(sessions) == 1:
+                signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return session
+
+    def stop(self, session: ProfileSession) -> ProfileSession:
+        with self._lock:
+            sessions = dict(self._sessions)
+            if sessions.get(session.ident) is session:
+                del sessions[session.ident]
+            self._sessions = sessions
+            if not sessions:
+                signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        session.duration = time.perf_counter() - session.started
+        return session
+
+    def active(self) -> int:
+        return len(self._sessions)
+
+    def _sample(self, signum, frame):
+        sessions = self._sessions
+        if not sessions:
+            return
+        current = threading.get_ident()
+        frames = None
+        for ident, session in sessions.items():
+            if ident == current:
+                sampled = frame
+            else:
+                if frames is None:
+                    frames = sys._current_frames()
+                sampled = frames.get(ident)
+            if sampled is not None:
+                session.stacks[collapse(sampled, self.max_depth)] += 1
+
+
+class ProfileStore:
+    """Writes finished profiles to a directory and keeps the newest few
+
+    Each profile is a .collapsed file next to a .json file with its metadata.
+    """
+
+    def __init__(self, directory: str, keep: int = 50):
+        self.directory = directory
+        self.keep = keep
+
+    def _path(self, profile_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f'{profile_id}{suffix}')
+
+    def save(self, profile_id: str, session: ProfileSession, metadata: Dict) -> Dict:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(profile_id, '.collapsed'), 'w', encoding='utf-8') as f:
+            f.write(session.collapsed())
+        entry = {
+            'id': profile_id,
+            'created_at': time.time(),
+            'duration_ms': round((session.duration or 0) * 1000, 3),
+            'samples': session.samples,
+            **metadata
+        }
+        with open(self._path(profile_id, '.json'), 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        self.prune()
+        return entry
+
+    def list(self) -> List[Dict]:
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(entries, key=lambda entry: entry.get('created_at', 0), reverse=True)
+
+    def path(self, profile_id: str) -> Optional[str]:
+        if not _PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = self._path(profile_id, '.collapsed')
+        return path if os.path.isfile(path) else None
+
+    def prune(self):
+        for entry in self.list()[self.keep:]:
+            for suffix in ('.collapsed', '.json'):
+                try:
+                    os.remove(self._path(entry['id'], suffix))
+                except OSError:
+                    pass
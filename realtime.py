@@ -0,0 +1,63 @@
+import threading
+from typing import Dict, Optional
+
+import socketio
+
+IN_PROCESS_QUEUE_URL = 'memory://'
+
+
+class InProcessManager(socketio.PubSubManager):
+    """Socket.IO message queue stand-in linking every manager on a channel within one process
+
+    Each Flask-SocketIO server in the process behaves like a separate worker
+    attached to a shared broker, which is enough to exercise cross-worker
+    delivery in tests and local development without Redis.
+    """
+
+    name = 'inprocess'
+    _subscribers: Dict[str, list] = {}
+    _subscribers_lock = threading.Lock()
+
+    def __init__(self, url: str = IN_PROCESS_QUEUE_URL, channel: str = 'socketio', write_only: bool = False,
+                 logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self._queue = None
+
+    def initialize(self):
+        if not self.write_only:
+            # A queue native to the server's async mode, so listening doesn't block eventlet
+            self._queue = self.server.eio.create_queue()
+            with self._subscribers_lock:
+                self._subscribers.setdefault(self.channel, []).append(self._queue)
+        super().initialize()
+
+    def close(self):
+        if self._queue is not None:
+            with self._subscribers_lock:
+                self._subscribers.get(self.channel, []).remove(self._queue)
+            self._queue = None
+
+    def _publish(self, data):
+        # Serialize like a real broker would, so nothing relies on shared objects
+        payload = self.json.dumps(data)
+        with self._subscribers_lock:
+            queues = list(self._subscribers.get(self.channel, []))
+        for queue in queues:
+            queue.put(payload)
+
+    def _listen(self):
+        while self._queue is not None:
+            yield self._queue.get()
+
+
+def queue_options(url: Optional[str], channel: str) -> dict:
+    # Keyword arguments for SocketIO(): no queue, the in-process stand-in, or a real broker
+    if not url:
+        return {}
+    if url.startswith(IN_PROCESS_QUEUE_URL):
+        return {'client_manager': InProcessManager(url, channel=channel)}
+    return {'message_queue': url, 'channel': channel}
+
+
+def session_room(session_id: str) -> str:
+    return f'session:{session_id}'
@@ -0,0 +1,94 @@
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+def new_id() -> int:
+    # A uuid4 kept as its 128-bit integer; formatted as a string only for the API
+    return uuid.uuid4().int
+
+
+def format_id(record_id: int) -> str:
+    return str(uuid.UUID(int=record_id))
+
+
+def parse_id(value) -> int:
+    if isinstance(value, int):
+        return value
+    try:
+        return uuid.UUID(value).int
+    except (AttributeError, TypeError, ValueError):
+        raise KeyError(value) from None
+
+
+def format_timestamp(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+@dataclass(slots=True)
+class Message:
+    id: int
+    role: str
+    content: str
+    type: str
+    timestamp: float
+    # None rather than an empty dict for the common case of no metadata
+    metadata: Optional[dict] = None
+
+    def to_dict(self) -> dict:
+        return {
+            'id': format_id(self.id),
+            'role': self.role,
+            'content': self.content,
+            'type': self.type,
+            'timestamp': format_timestamp(self.timestamp),
+            'metadata': self.metadata if self.metadata is not None else {}
+        }
+
+
+@dataclass(slots=True)
+class FileEntry:
+    filename: str
+    content_blob: Optional[str] = None
+    mime_type: Optional[str] = None
+    size: Optional[int] = None
+    error: bool = False
+
+    def to_dict(self, content=None) -> dict:
+        data = {'filename': self.filename, 'content': content}
+        if self.mime_type is not None:
+            data['mime_type'] = self.mime_type
+        if self.size is not None:
+            data['size'] = self.size
+        if self.error:
+            data['error'] = True
+        return data
+
+
+@dataclass(slots=True)
+class SearchEntry:
+    query: str
+    results_blob: str
+    timestamp: float
+
+    def to_dict(self, results=None) -> dict:
+        return {'query': self.query, 'results': results, 'timestamp': format_timestamp(self.timestamp)}
+
+
+@dataclass(slots=True)
+class Conversation:
+    # Changes whenever the conversation is cleared, invalidating old cursors
+    epoch: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
+    messages: List[Message] = field(default_factory=list)
+    files: List[FileEntry] = field(default_factory=list)
+    search_history: List[SearchEntry] = field(default_factory=list)
+    # Message id -> position, for constant-time cursor lookups
+    message_index: Dict[int, int] = field(default_factory=dict)
+    # Every blob reference taken by this conversation, released on clear
+    blob_refs: List[str] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    last_updated: float = field(default_factory=time.time)
+    # Estimated bytes of the records above, kept up to date as they are added
+    size_bytes: int = 0
@@ -0,0 +1,205 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, Tuple
+
+import anthropic
+import requests
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0, max_retry_after: float = 30.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        # Full jitter: sleep a random amount up to the capped exponential delay
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            # The server told us when to come back; give up if that is too far away
+            if retry_after > self.max_retry_after:
+                return None
+            delay = max(delay, retry_after)
+        return delay
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._total_failures = 0
+        self._total_rejections = 0
+        self._last_error = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def before_call(self):
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                # Let exactly one probe through to test the upstream
+                self._probe_in_flight = True
+                return
+            self._total_rejections += 1
+            retry_after = max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+            raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error: Optional[BaseException] = None):
+        with self._lock:
+            self._failures += 1
+            self._total_failures += 1
+            self._last_error = repr(error) if error is not None else None
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+
+    def release_probe(self):
+        # The call ended without a verdict on upstream health (e.g. a client error)
+        with self._lock:
+            self._probe_in_flight = False
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            state = self._current_state()
+            return {
+                'name': self.name,
+                'state': state,
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout,
+                'total_failures': self._total_failures,
+                'total_rejections': self._total_rejections,
+                'last_error': self._last_error,
+            }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _retry_after_from_headers(headers) -> Optional[float]:
+    if headers is None:
+        return None
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+    return parse_retry_after(headers.get('retry-after'))
+
+
+# Classifiers return (retryable, retry_after). Only retryable errors count
+# against the circuit breaker: a 400 means our request was bad, not that
+# the upstream is down.
+def classify_requests_error(error: BaseException) -> Tuple[bool, Optional[float]]:
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True, None
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        if error.response.status_code in RETRYABLE_STATUS_CODES:
+            return True, _retry_after_from_headers(error.response.headers)
+    return False, None
+
+
+def classify_anthropic_error(error: BaseException) -> Tuple[bool, Optional[float]]:
+    if isinstance(error, anthropic.APIConnectionError):
+        return True, None
+    if isinstance(error, anthropic.APIStatusError):
+        headers = error.response.headers if error.response is not None else None
+        should_retry = headers.get('x-should-retry') if headers is not None else None
+        if should_retry in ('true', 'false'):
+            return should_retry == 'true', _retry_after_from_headers(headers)
+        if error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500:
+            return True, _retry_after_from_headers(headers)
+    return False, None
+
+
+def call_with_resilience(func: Callable, breaker: Optional[CircuitBreaker], policy: RetryPolicy,
+                         classify: Callable[[BaseException], Tuple[bool, Optional[float]]],
+                         sleep: Callable[[float], None] = time.sleep):
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = func()
+        except Exception as e:
+            retryable, retry_after = classify(e)
+            if breaker is not None:
+                if retryable:
+                    breaker.record_failure(e)
+                else:
+                    breaker.release_probe()
+            attempt += 1
+            if not retryable or attempt >= policy.max_attempts:
+                raise
+            delay = policy.backoff(attempt - 1, retry_after)
+            if delay is None:
+                raise
+            sleep(delay)
+            continue
+        if breaker is not None:
+            breaker.record_success()
+        return result
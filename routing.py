@@ -0,0 +1,59 @@
+import json
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+
+@dataclass(slots=True, frozen=True)
+class Route:
+    name: str
+    model: str
+    # None leaves the token limit to the caller (e.g. a thinking budget plus answer allowance)
+    max_tokens: Optional[int] = None
+    # Conditions; None matches anything
+    thinking_modes: Optional[Sequence[str]] = None
+    max_prompt_chars: Optional[int] = None
+    files: Optional[bool] = None
+    search: Optional[bool] = None
+
+    def matches(self, thinking_mode: str, prompt_chars: int, has_files: bool, has_search: bool) -> bool:
+        if self.thinking_modes is not None and thinking_mode not in self.thinking_modes:
+            return False
+        if self.max_prompt_chars is not None and prompt_chars > self.max_prompt_chars:
+            return False
+        if self.files is not None and has_files != self.files:
+            return False
+        if self.search is not None and has_search != self.search:
+            return False
+        return True
+
+
+DEFAULT_MODEL = 'claude-sonnet-4-20250514'
+
+# First match wins; the last route catches everything else
+DEFAULT_ROUTES = [
+    # Short plain follow-ups don't need the large model
+    Route('quick', 'claude-3-5-haiku-20241022', max_tokens=2000,
+          thinking_modes=('normal',), max_prompt_chars=4000, files=False, search=False),
+    Route('standard', DEFAULT_MODEL, max_tokens=4000, thinking_modes=('normal',)),
+    Route('thinking', DEFAULT_MODEL),
+]
+
+
+class ModelRouter:
+    """Picks the model and token limit for a chat request from an ordered policy table"""
+
+    def __init__(self, routes: Optional[List[Route]] = None):
+        self.routes = list(routes) if routes else list(DEFAULT_ROUTES)
+
+    @classmethod
+    def from_json(cls, config: Optional[str]) -> 'ModelRouter':
+        # A JSON list of route objects, e.g. [{"name": "quick", "model": "...", "max_prompt_chars": 2000}]
+        if not config:
+            return cls()
+        return cls([Route(**route) for route in json.loads(config)])
+
+    def route(self, thinking_mode: str, prompt_chars: int, has_files: bool = False, has_search: bool = False) -> Route:
+        for route in self.routes:
+            if route.matches(thinking_mode, prompt_chars, has_files, has_search):
+                return route
+        return Route('default', DEFAULT_MODEL)
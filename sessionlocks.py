@@ -0,0 +1,80 @@
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class SessionLocks:
+    """A fixed table of re-entrant locks, one per shard of session ids
+
+    Guards short critical sections on a session's state. Sessions in different
+    shards never contend; the table doesn't grow with the number of sessions.
+    shards=1 degenerates to a single global lock.
+    """
+
+    def __init__(self, shards: int = 64):
+        self._shards = [threading.RLock() for _ in range(max(1, shards))]
+
+    def __len__(self) -> int:
+        return len(self._shards)
+
+    def __call__(self, session_id: str) -> threading.RLock:
+        # crc32 rather than hash(): stable across processes and not salted per run
+        return self._shards[zlib.crc32(str(session_id).encode('utf-8')) % len(self._shards)]
+
+
+class TurnTimeout(TimeoutError):
+    """Raised when a turn gives up waiting for the session's earlier turns"""
+
+
+class _Turns:
+    __slots__ = ('condition', 'next_ticket', 'serving', 'abandoned')
+
+    def __init__(self, lock):
+        self.condition = threading.Condition(lock)
+        self.next_ticket = 0
+        self.serving = 0
+        self.abandoned = set()
+
+
+class TurnQueue:
+    """Serves each session's turns one at a time, in the order they arrived
+
+    Each turn takes a ticket and waits until it is being served, so a session's
+    turns never interleave while other sessions run in parallel. A turn that
+    gives up waiting is skipped when its ticket comes up.
+    """
+
+    def __init__(self, locks: SessionLocks):
+        self._locks = locks
+        self._turns: Dict[str, _Turns] = {}
+
+    @contextmanager
+    def turn(self, session_id: str, timeout: Optional[float] = None):
+        lock = self._locks(session_id)
+        with lock:
+            turns = self._turns.get(session_id)
+            if turns is None:
+                turns = self._turns[session_id] = _Turns(lock)
+            ticket = turns.next_ticket
+            turns.next_ticket += 1
+            if not turns.condition.wait_for(lambda: turns.serving == ticket, timeout):
+                turns.abandoned.add(ticket)
+                raise TurnTimeout(f'Timed out waiting for the previous turn in session {session_id}')
+        try:
+            yield
+        finally:
+            with lock:
+                turns.serving += 1
+                while turns.serving in turns.abandoned:
+                    turns.abandoned.discard(turns.serving)
+                    turns.serving += 1
+                if turns.serving == turns.next_ticket:
+                    # Nobody is waiting; don't keep an entry per idle session
+                    del self._turns[session_id]
+                else:
+                    turns.condition.notify_all()
+
+    def waiting(self, session_id: str) -> int:
+        turns = self._turns.get(session_id)
+        return turns.next_ticket - turns.serving - len(turns.abandoned) if turns is not None else 0
@@ -1,3 +1,198 @@
+// Renders streamed markdown a block at a time: finished blocks are parsed once,
+// only the unfinished tail is re-parsed as tokens arrive
+class IncrementalMarkdown {
+    constructor(container) {
+        this.container = container;
+        this.reset();
+    }
+
+    reset() {
+        this.text = '';
+        // Offset up to which the text has been rendered into finished blocks
+        this.committed = 0;
+        this.inFence = false;
+        this.container.innerHTML = '';
+        this.tail = document.createElement('div');
+        this.tail.className = 'md-block';
+        this.container.appendChild(this.tail);
+    }
+
+    append(delta) {
+        this.text += delta;
+        const boundary = this.blockBoundary();
+        if (boundary > this.committed) {
+            const block = document.createElement('div');
+            block.className = 'md-block';
+            block.innerHTML = marked.parse(this.text.slice(this.committed, boundary));
+            this.container.insertBefore(block, this.tail);
+            this.committed = boundary;
+        }
+        this.tail.innerHTML = marked.parse(this.text.slice(this.committed));
+    }
+
+    blockBoundary() {
+        // The end of the last blank line after the committed text that is not inside a code fence.
+        // Only complete lines past the committed offset are scanned, so each delta costs the tail.
+        let boundary = this.committed;
+        let inFence = this.inFence;
+        let start = this.committed;
+        let end = this.text.indexOf('\n', start);
+        while (end !== -1) {
+            const line = this.text.slice(start, end);
+            if (/^\s*(```|~~~)/.test(line)) {
+                inFence = !inFence;
+            } else if (!inFence && line.trim() === '' && start > boundary) {
+                boundary = end + 1;
+                this.inFence = inFence;
+            }
+            start = end + 1;
+            end = this.text.indexOf('\n', start);
+        }
+        return boundary;
+    }
+}
+
+// Keeps the full message list as data and mounts only the messages near the viewport.
+// Unmounted messages are represented by spacers sized from their last measured height.
+class VirtualMessageList {
+    constructor(scroller, { estimatedHeight = 120, overscan = 800, gap = 16, onNearTop = null } = {}) {
+        this.scroller = scroller;
+        this.estimatedHeight = estimatedHeight;
+        this.overscan = overscan;
+        this.gap = gap;
+        this.onNearTop = onNearTop;
+        // Each item is { render, node, height }
+        this.items = [];
+        this.range = [0, 0];
+        this.frame = null;
+
+        this.root = document.createElement('div');
+        this.root.className = 'message-window';
+        this.topSpacer = document.createElement('div');
+        this.mounted = document.createElement('div');
+        this.mounted.className = 'message-window-items';
+        this.bottomSpacer = document.createElement('div');
+        this.root.append(this.topSpacer, this.mounted, this.bottomSpacer);
+        this.scroller.appendChild(this.root);
+
+        this.scroller.addEventListener('scroll', () => this.scheduleUpdate(), { passive: true });
+        window.addEventListener('resize', () => this.scheduleUpdate());
+    }
+
+    get length() {
+        return this.items.length;
+    }
+
+    append(renders, fresh = true) {
+        renders.forEach(render => this.items.push({ render, node: null, height: null, fresh }));
+        this.update();
+    }
+
+    prepend(renders) {
+        // Keep the viewport where it is while older messages are added above it;
+        // the spacer grows first so the scroll position isn't clamped
+        const items = renders.map(render => ({ render, node: null, height: null, fresh: false }));
+        const added = items.length * (this.estimatedHeight + this.gap);
+        this.items.unshift(...items);
+        this.range = [this.range[0] + items.length, this.range[1] + items.length];
+        this.topSpacer.style.height = `${(parseFloat(this.topSpacer.style.height) || 0) + added}px`;
+        this.scroller.scrollTop += added;
+        this.update();
+    }
+
+    scrollToEnd() {
+        this.scroller.scrollTop = this.scroller.scrollHeight;
+        this.update();
+        // The last messages are measured now, so their real heights may differ from the estimates
+        this.scroller.scrollTop = this.scroller.scrollHeight;
+    }
+
+    clear() {
+        this.items = [];
+        this.range = [0, 0];
+        this.mounted.replaceChildren();
+        this.topSpacer.style.height = '0px';
+        this.bottomSpacer.style.height = '0px';
+    }
+
+    scheduleUpdate() {
+        if (this.frame) return;
+        this.frame = requestAnimationFrame(() => {
+            this.frame = null;
+            this.update();
+        });
+    }
+
+    heightOf(item) {
+        return (item.height === null ? this.estimatedHeight : item.height) + this.gap;
+    }
+
+    update() {
+        // Viewport in the list's own coordinates
+        const offset = this.root.getBoundingClientRect().top - this.scroller.getBoundingClientRect().top + this.scroller.scrollTop;
+        const viewTop = this.scroller.scrollTop - offset;
+        const viewBottom = viewTop + this.scroller.clientHeight;
+
+        let start = 0;
+        let top = 0;
+        while (start < this.items.length && top + this.heightOf(this.items[start]) < viewTop - this.overscan) {
+            top += this.heightOf(this.items[start]);
+            start++;
+        }
+        let end = start;
+        let bottom = top;
+        while (end < this.items.length && bottom < viewBottom + this.overscan) {
+            bottom += this.heightOf(this.items[end]);
+            end++;
+        }
+
+        if (start !== this.range[0] || end !== this.range[1] || this.mounted.childElementCount !== end - start) {
+            this.items.forEach((item, i) => {
+                if ((i < start || i >= end) && item.node) {
+                    item.node = null;
+                }
+            });
+            const nodes = this.items.slice(start, end).map(item => {
+                if (!item.node) {
+                    item.node = item.render();
+                    // Only brand new messages animate in
+                    if (!item.fresh) item.node.classList.add('remounted');
+                    item.fresh = false;
+                }
+                return item.node;
+            });
+            this.mounted.replaceChildren(...nodes);
+            this.range = [start, end];
+        }
+
+        // Measure what is mounted; size changes above the viewport are compensated so content doesn't jump
+        let shiftAbove = 0;
+        let position = top;
+        for (let i = start; i < end; i++) {
+            const item = this.items[i];
+            const previous = this.heightOf(item);
+            item.height = item.node.offsetHeight;
+            if (position + previous <= viewTop) {
+                shiftAbove += this.heightOf(item) - previous;
+            }
+            position += previous;
+        }
+        this.topSpacer.style.height = `${top}px`;
+        let rest = 0;
+        for (let i = end; i < this.items.length; i++) {
+            rest += this.heightOf(this.items[i]);
+        }
+        this.bottomSpacer.style.height = `${rest}px`;
+        if (shiftAbove) {
+            this.scroller.scrollTop += shiftAbove;
+        }
+
+        if (this.onNearTop && this.items.length && viewTop < this.scroller.clientHeight) {
+            this.onNearTop();
+        }
+    }
+}
+
 class ChatApp {
     constructor() {
         this.messagesContainer = document.getElementById('chatMessages');
@@ -13,6 +208,19 @@ class ChatApp {
         this.searchEnabled = false;
         this.uploadedFiles = [];
 
+        // History is fetched a page at a time, newest first, as the user scrolls up
+        this.pageSize = 50;
+        this.oldestMessageId = null;
+        this.hasEarlierMessages = false;
+        this.loadingEarlier = false;
+        this.messageList = new VirtualMessageList(this.messagesContainer, {
+            onNearTop: () => this.loadEarlierMessages()
+        });
+        this.answerMarkdown = null;
+        this.socket = null;
+        // Id of the chat request being generated, so it can be cancelled
+        this.activeRequestId = null;
+
         this.init();
     }
 
@@ -29,6 +237,51 @@ class ChatApp {
 
         // Load existing conversation
         this.loadConversation();
+        this.connectSocket();
+    }
+
+    connectSocket() {
+        // Server-pushed progress is optional; chat works without it if the client library failed to load
+        if (typeof io === 'undefined') return;
+        this.socket = io();
+        this.socket.on('chat_status', (status) => this.updateLoadingStatus(status));
+        this.socket.on('chat_thinking', (chunk) => this.appendPreview('.thinking-preview', chunk.delta));
+        this.socket.on('chat_delta', (chunk) => this.appendPreview('.answer-preview', chunk.delta));
+    }
+
+    appendPreview(selector, delta) {
+        const preview = document.querySelector(`#loading-message ${selector}`);
+        if (!preview) return;
+        if (selector === '.answer-preview' && this.answerMarkdown) {
+            this.answerMarkdown.append(delta);
+        } else {
+            preview.textContent += delta;
+        }
+        preview.hidden = false;
+        this.scrollToBottom();
+    }
+
+    updateLoadingStatus(status) {
+        const label = document.querySelector('#loading-message .loading-label');
+        // An upload's indicator is left alone
+        if (!label || !this.activeRequestId) return;
+        const labels = {
+            searching: 'Searching the web',
+            generating: 'Claude is thinking'
+        };
+        if (labels[status.stage]) {
+            label.textContent = labels[status.stage];
+        }
+        if (status.stage === 'generating') {
+            // A retried call streams again from the start
+            document.querySelectorAll('#loading-message .loading-preview > div').forEach((preview) => {
+                preview.textContent = '';
+                preview.hidden = true;
+            });
+            if (this.answerMarkdown) {
+                this.answerMarkdown.reset();
+            }
+        }
     }
 
     handleKeydown(e) {
@@ -55,11 +308,14 @@ class ChatApp {
         this.autoResize();
 
         // Show loading state
-        this.setLoading(true);
+        const requestId = this.newRequestId();
+        this.activeRequestId = requestId;
+        this.setGenerating(true);
 
         try {
             const requestData = {
                 message,
+                request_id: requestId,
                 use_search: this.searchEnabled,
                 search_query: this.searchEnabled ? this.searchQuery.value.trim() || message : '',
                 thinking_mode: this.thinkingModeSelect ? this.thinkingModeSelect.value : 'normal'
@@ -79,7 +335,7 @@ class ChatApp {
             }
 
             const data = await response.json();
-            this.addMessage('assistant', data.response, data.search_results);
+            this.addMessage('assistant', data.response, data.search_results, data.thinking, data.cancelled);
 
             // Clear search query after use
             if (this.searchEnabled) {
@@ -89,23 +345,86 @@ class ChatApp {
         } catch (error) {
             this.showError(error.message);
         } finally {
-            this.setLoading(false);
+            this.activeRequestId = null;
+            this.setGenerating(false);
+        }
+    }
+
+    newRequestId() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return `${Date.now().toString(16)}-${Math.random().toString(16).slice(2)}`;
+    }
+
+    async cancelGeneration() {
+        if (!this.activeRequestId) return;
+        const stopBtn = document.querySelector('#loading-message .stop-btn');
+        if (stopBtn) {
+            stopBtn.disabled = true;
+            stopBtn.textContent = 'Stopping...';
+        }
+
+        // The pending /api/chat call then returns with whatever was generated so far
+        const payload = { request_id: this.activeRequestId };
+        if (this.socket && this.socket.connected) {
+            this.socket.emit('cancel', payload);
+            return;
+        }
+        try {
+            await fetch('/api/chat/cancel', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(payload)
+            });
+        } catch (error) {
+            this.showError('Failed to stop the response');
         }
     }
 
-    addMessage(role, content, searchResults = null) {
-        // Remove empty state if it exists
+    appendCancelledMarker(messageDiv) {
+        const marker = document.createElement('div');
+        marker.className = 'message-cancelled';
+        marker.textContent = 'Stopped before the answer was complete';
+        messageDiv.appendChild(marker);
+    }
+
+    removeEmptyState() {
         const emptyState = this.messagesContainer.querySelector('.empty-state');
         if (emptyState) {
             emptyState.remove();
         }
+    }
+
+    appendMessageNode(render) {
+        this.removeEmptyState();
+        this.messageList.append([render]);
+        this.scrollToBottom();
+    }
+
+    addMessage(role, content, searchResults = null, thinking = null, cancelled = false) {
+        const timestamp = Date.now();
+        this.appendMessageNode(() => this.renderMessage(role, content, searchResults, thinking, cancelled, timestamp));
+    }
 
+    renderMessage(role, content, searchResults, thinking, cancelled, timestamp) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${role}`;
 
         const contentDiv = document.createElement('div');
         contentDiv.className = 'message-content';
 
+        if (thinking) {
+            const thinkingDetails = document.createElement('details');
+            thinkingDetails.className = 'thinking';
+            const summary = document.createElement('summary');
+            summary.textContent = 'Thinking';
+            const thinkingText = document.createElement('div');
+            thinkingText.textContent = thinking;
+            thinkingDetails.append(summary, thinkingText);
+            messageDiv.appendChild(thinkingDetails);
+        }
+
         // Render markdown for assistant messages
         if (role === 'assistant') {
             contentDiv.innerHTML = marked.parse(content);
@@ -114,6 +433,9 @@ class ChatApp {
         }
 
         messageDiv.appendChild(contentDiv);
+        if (cancelled) {
+            this.appendCancelledMarker(messageDiv);
+        }
 
         // Add search results if available
         if (searchResults && searchResults.length > 0) {
@@ -133,14 +455,13 @@ class ChatApp {
 
         const timeDiv = document.createElement('div');
         timeDiv.className = 'message-time';
-        timeDiv.textContent = new Date().toLocaleTimeString();
+        timeDiv.textContent = new Date(timestamp).toLocaleTimeString();
         messageDiv.appendChild(timeDiv);
 
-        this.messagesContainer.appendChild(messageDiv);
-        this.scrollToBottom();
+        return messageDiv;
     }
 
-    setLoading(loading) {
+    setLoading(loading, label = 'Uploading') {
         this.sendBtn.disabled = loading;
 
         if (loading) {
@@ -148,7 +469,7 @@ class ChatApp {
             loadingDiv.className = 'message assistant loading';
             loadingDiv.innerHTML = `
                 <div>
-                    Claude is thinking
+                    <span class="loading-label">${label}</span>
                     <span class="loading-dots">
                         <span></span>
                         <span></span>
@@ -164,12 +485,34 @@ class ChatApp {
             if (loadingMessage) {
                 loadingMessage.remove();
             }
+            this.answerMarkdown = null;
             this.sendBtn.textContent = 'Send';
         }
 
         this.scrollToBottom();
     }
 
+    setGenerating(generating) {
+        // Only a chat request has a request id to cancel, so only it gets the Stop button and previews
+        this.setLoading(generating, this.searchEnabled ? 'Searching the web' : 'Claude is thinking');
+        if (!generating) return;
+
+        const loadingDiv = document.getElementById('loading-message');
+        const stopBtn = document.createElement('button');
+        stopBtn.type = 'button';
+        stopBtn.className = 'stop-btn';
+        stopBtn.textContent = 'Stop';
+        stopBtn.addEventListener('click', () => this.cancelGeneration());
+        loadingDiv.firstElementChild.appendChild(stopBtn);
+        loadingDiv.insertAdjacentHTML('beforeend', `
+            <div class="loading-preview">
+                <div class="thinking-preview" hidden></div>
+                <div class="answer-preview" hidden></div>
+            </div>
+        `);
+        this.answerMarkdown = new IncrementalMarkdown(loadingDiv.querySelector('.answer-preview'));
+    }
+
     showError(message) {
         const errorDiv = document.createElement('div');
         errorDiv.className = 'error-message';
@@ -201,35 +544,65 @@ class ChatApp {
     }
 
     scrollToBottom() {
-        this.messagesContainer.scrollTop = this.messagesContainer.scrollHeight;
+        this.messageList.scrollToEnd();
     }
 
     async loadConversation() {
         try {
-            const response = await fetch('/api/conversation');
+            const response = await fetch(`/api/conversation?limit=${this.pageSize}`);
             const data = await response.json();
 
             if (data.messages && data.messages.length > 0) {
-                // Remove empty state
-                const emptyState = this.messagesContainer.querySelector('.empty-state');
-                if (emptyState) {
-                    emptyState.remove();
-                }
-
-                // Add messages
-                data.messages.forEach(msg => {
-                    if (msg.role === 'user' || msg.role === 'assistant') {
-                        this.addMessageFromHistory(msg.role, msg.content, msg.timestamp, msg.metadata);
-                    } else if (msg.type === 'file') {
-                        this.addFileMessageFromHistory(msg.content, msg.timestamp, msg.metadata);
-                    }
-                });
+                this.removeEmptyState();
+                this.oldestMessageId = data.messages[0].id;
+                this.messageList.append(this.historyRenderers(data.messages), false);
+                this.scrollToBottom();
+                // Only start paging back once the view sits at the newest message
+                this.hasEarlierMessages = data.has_more_before;
             }
         } catch (error) {
             console.error('Failed to load conversation:', error);
         }
     }
 
+    async loadEarlierMessages() {
+        // Called by the message list whenever the viewport nears the oldest loaded message
+        if (!this.oldestMessageId || !this.hasEarlierMessages || this.loadingEarlier) return;
+        this.loadingEarlier = true;
+
+        try {
+            const params = new URLSearchParams({ limit: this.pageSize, before: this.oldestMessageId });
+            const response = await fetch(`/api/conversation?${params}`);
+            if (!response.ok) {
+                throw new Error('Failed to load earlier messages');
+            }
+            const data = await response.json();
+            this.hasEarlierMessages = data.messages.length > 0 && data.has_more_before;
+            if (data.messages.length) {
+                this.oldestMessageId = data.messages[0].id;
+                this.messageList.prepend(this.historyRenderers(data.messages));
+            }
+        } catch (error) {
+            this.hasEarlierMessages = false;
+            this.showError(error.message);
+        } finally {
+            this.loadingEarlier = false;
+        }
+    }
+
+    historyRenderers(messages) {
+        // Messages are rendered lazily, when the list mounts them
+        const renders = [];
+        messages.forEach(msg => {
+            if (msg.type === 'file') {
+                renders.push(() => this.addFileMessageFromHistory(msg.content, msg.timestamp, msg.metadata));
+            } else if (msg.role === 'user' || msg.role === 'assistant') {
+                renders.push(() => this.addMessageFromHistory(msg.role, msg.content, msg.timestamp, msg.metadata));
+            }
+        });
+        return renders;
+    }
+
     addMessageFromHistory(role, content, timestamp, metadata = {}) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${role}`;
@@ -245,17 +618,21 @@ class ChatApp {
         }
 
         messageDiv.appendChild(contentDiv);
+        if (metadata.cancelled) {
+            this.appendCancelledMarker(messageDiv);
+        }
 
-        // Add search results if available
-        if (metadata.search_results && metadata.search_results.length > 0) {
+        // Add search results if available (history pages only carry titles and URLs)
+        const searchResults = metadata.search_results || metadata.search_sources;
+        if (searchResults && searchResults.length > 0) {
             const searchDiv = document.createElement('div');
             searchDiv.className = 'search-results';
             searchDiv.innerHTML = `
                 <h4>🔍 Search Results Used:</h4>
-                ${metadata.search_results.map(result => `
+                ${searchResults.map(result => `
                     <div class="search-result">
                         <a href="${result.url}" target="_blank">${result.title}</a>
-                        <div style="color: #64748b; font-size: 12px;">${result.snippet}</div>
+                        ${result.snippet ? `<div style="color: #64748b; font-size: 12px;">${result.snippet}</div>` : ''}
                     </div>
                 `).join('')}
             `;
@@ -267,7 +644,7 @@ class ChatApp {
         timeDiv.textContent = new Date(timestamp).toLocaleTimeString();
         messageDiv.appendChild(timeDiv);
 
-        this.messagesContainer.appendChild(messageDiv);
+        return messageDiv;
     }
 
     addFileMessageFromHistory(content, timestamp, metadata = {}) {
@@ -278,12 +655,13 @@ class ChatApp {
         contentDiv.className = 'message-content';
         contentDiv.textContent = content;
 
-        if (metadata.filename && metadata.file_content) {
+        const preview = metadata.file_content || metadata.file_preview;
+        if (metadata.filename && preview) {
             const previewDiv = document.createElement('div');
             previewDiv.className = 'file-preview';
             previewDiv.innerHTML = `
                 <div class="filename">${metadata.filename}</div>
-                <div class="content">${metadata.file_content.substring(0, 200)}${metadata.file_content.length > 200 ? '...' : ''}</div>
+                <div class="content">${preview.substring(0, 200)}${(metadata.size || preview.length) > 200 ? '...' : ''}</div>
             `;
             contentDiv.appendChild(previewDiv);
         }
@@ -295,7 +673,7 @@ class ChatApp {
         timeDiv.textContent = new Date(timestamp).toLocaleTimeString();
         messageDiv.appendChild(timeDiv);
 
-        this.messagesContainer.appendChild(messageDiv);
+        return messageDiv;
     }
 }
 
@@ -314,61 +692,80 @@ function toggleSearch() {
 }
 
 // Handle file upload
+function appendUploadedFile(file) {
+    const timestamp = Date.now();
+    chatApp.appendMessageNode(() => renderUploadedFile(file, timestamp));
+}
+
+function renderUploadedFile(file, timestamp) {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = 'message file';
+
+    const contentDiv = document.createElement('div');
+    contentDiv.className = 'message-content';
+    contentDiv.textContent = `Uploaded file: ${file.filename}`;
+
+    const previewDiv = document.createElement('div');
+    previewDiv.className = 'file-preview';
+    previewDiv.innerHTML = `
+        <div class="filename">${file.filename}</div>
+        <div class="content">${file.content_preview}</div>
+    `;
+    contentDiv.appendChild(previewDiv);
+
+    messageDiv.appendChild(contentDiv);
+
+    const timeDiv = document.createElement('div');
+    timeDiv.className = 'message-time';
+    timeDiv.textContent = new Date(timestamp).toLocaleTimeString();
+    messageDiv.appendChild(timeDiv);
+
+    return messageDiv;
+}
+
 async function handleFileUpload(input) {
     if (!input.files || input.files.length === 0) return;
 
-    const file = input.files[0];
-    const formData = new FormData();
-    formData.append('file', file);
+    // Several files go up in one request and are extracted server-side in parallel;
+    // a single file is sent as the raw body so large documents stream to disk
+    const files = Array.from(input.files);
+    const multiple = files.length > 1;
+    let url = `/api/upload/stream?filename=${encodeURIComponent(files[0].name)}`;
+    let body = files[0];
+    if (multiple) {
+        url = '/api/upload/batch';
+        body = new FormData();
+        files.forEach(file => body.append('files', file));
+    }
 
     try {
         chatApp.setLoading(true);
 
-        const response = await fetch('/api/upload', {
+        const response = await fetch(url, {
             method: 'POST',
-            body: formData
+            body: body
         });
 
-        if (!response.ok) {
-            const error = await response.json();
-            throw new Error(error.error || 'Failed to upload file');
-        }
-
         const data = await response.json();
+        // A batch where every file failed still reports why per file
+        if (!response.ok && !data.files) {
+            throw new Error(data.error || 'Failed to upload file');
+        }
 
-        // Add file message to UI
-        const messageDiv = document.createElement('div');
-        messageDiv.className = 'message file';
-
-        const contentDiv = document.createElement('div');
-        contentDiv.className = 'message-content';
-        contentDiv.textContent = `Uploaded file: ${data.filename}`;
-
-        const previewDiv = document.createElement('div');
-        previewDiv.className = 'file-preview';
-        previewDiv.innerHTML = `
-            <div class="filename">${data.filename}</div>
-            <div class="content">${data.content_preview}</div>
-        `;
-        contentDiv.appendChild(previewDiv);
+        const results = multiple ? data.files : [{ ...data, success: true }];
+        const uploaded = results.filter(result => result.success);
+        const failed = results.filter(result => !result.success);
 
-        messageDiv.appendChild(contentDiv);
+        uploaded.forEach(appendUploadedFile);
 
-        const timeDiv = document.createElement('div');
-        timeDiv.className = 'message-time';
-        timeDiv.textContent = new Date().toLocaleTimeString();
-        messageDiv.appendChild(timeDiv);
-
-        // Remove empty state if it exists
-        const emptyState = chatApp.messagesContainer.querySelector('.empty-state');
-        if (emptyState) {
-            emptyState.remove();
+        if (uploaded.length === 1) {
+            chatApp.showSuccess(`File "${uploaded[0].filename}" uploaded successfully!`);
+        } else if (uploaded.length > 1) {
+            chatApp.showSuccess(`${uploaded.length} files uploaded successfully!`);
+        }
+        if (failed.length) {
+            chatApp.showError(failed.map(result => `${result.filename}: ${result.error}`).join('; '));
         }
-
-        chatApp.messagesContainer.appendChild(messageDiv);
-        chatApp.scrollToBottom();
-
-        chatApp.showSuccess(`File "${data.filename}" uploaded successfully!`);
 
     } catch (error) {
         chatApp.showError(error.message);
@@ -379,23 +776,14 @@ async function handleFileUpload(input) {
 }
 
 // Export conversation
-async function exportConversation() {
-    try {
-        const response = await fetch('/api/conversation/export');
-        const data = await response.json();
-
-        const blob = new Blob([JSON.stringify(data, null, 2)], { type: 'application/json' });
-        const url = URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = `claude-conversation-${new Date().toISOString().split('T')[0]}.json`;
-        a.click();
-        URL.revokeObjectURL(url);
-
-        chatApp.showSuccess('Conversation exported successfully!');
-    } catch (error) {
-        chatApp.showError('Failed to export conversation');
-    }
+function exportConversation() {
+    // Streamed NDJSON export; the browser writes it to disk as it arrives
+    const a = document.createElement('a');
+    a.href = '/api/conversation/export?format=ndjson';
+    a.download = `claude-conversation-${new Date().toISOString().split('T')[0]}.ndjson`;
+    a.click();
+
+    chatApp.showSuccess('Conversation export started');
 }
 
 // Clear conversation function
@@ -414,12 +802,16 @@ async function clearConversation() {
 
         if (response.ok) {
             // Clear UI
-            chatApp.messagesContainer.innerHTML = `
+            chatApp.messageList.clear();
+            chatApp.oldestMessageId = null;
+            chatApp.hasEarlierMessages = false;
+            chatApp.messagesContainer.querySelectorAll('.empty-state').forEach(node => node.remove());
+            chatApp.messagesContainer.insertAdjacentHTML('afterbegin', `
                 <div class="empty-state">
                     <h3>👋 Hello!</h3>
                     <p>Start a conversation with Claude by typing a message below. You can also upload files and enable web search.</p>
                 </div>
-            `;
+            `);
             chatApp.showSuccess('Conversation cleared successfully!');
         }
     } catch (error) {
@@ -0,0 +1,51 @@
+import re
+from types import SimpleNamespace
+
+
+class FakeStream:
+    """Stand-in for what anthropic's messages.stream() returns, replaying a scripted reply word by word"""
+
+    def __init__(self, text='Answer', input_tokens=10, output_tokens=5, thinking=None):
+        self.text = text
+        self.thinking = thinking
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.events_read = 0
+        self.closed = False
+
+    def __enter__(self):
+        # The same instance may serve several calls, as a mock's return_value
+        self.closed = False
+        return self
+
+    def __exit__(self, *exc_info):
+        self.closed = True
+        return False
+
+    def _usage(self, output_tokens):
+        return SimpleNamespace(input_tokens=self.input_tokens, output_tokens=output_tokens)
+
+    def _events(self):
+        yield SimpleNamespace(type='message_start', message=SimpleNamespace(usage=self._usage(0)))
+        for kind, text in (('thinking', self.thinking), ('text', self.text)):
+            for chunk in re.findall(r'\S+\s*', text or ''):
+                yield SimpleNamespace(type='content_block_delta', delta=SimpleNamespace(type=f'{kind}_delta', **{kind: chunk}))
+        yield SimpleNamespace(type='message_stop')
+
+    def __iter__(self):
+        for event in self._events():
+            if self.closed:
+                return
+            self.events_read += 1
+            yield event
+
+    @property
+    def current_message_snapshot(self):
+        return SimpleNamespace(usage=self._usage(0))
+
+    def get_final_message(self):
+        content = []
+        if self.thinking:
+            content.append(SimpleNamespace(type='thinking', thinking=self.thinking))
+        content.append(SimpleNamespace(type='text', text=self.text))
+        return SimpleNamespace(content=content, usage=self._usage(self.output_tokens))
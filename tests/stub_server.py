@@ -0,0 +1,89 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+class StubServer:
+    """Local HTTP server that replays scripted responses per route"""
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def add(self, method, path, *responses):
+        # Each response is (status, body) or (status, body, headers); the last one repeats
+        self.routes[(method, path)] = list(responses)
+
+    def hits(self, method, path):
+        return [r for r in self.requests if r['method'] == method and r['path'] == path]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next_response(self, method, path):
+        with self._lock:
+            responses = self.routes.get((method, path))
+            if not responses:
+                return 404, {'error': 'not found'}, {}
+            response = responses.pop(0) if len(responses) > 1 else responses[0]
+        status, body = response[0], response[1]
+        headers = response[2] if len(response) > 2 else {}
+        return status, body, headers
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _handle(self):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                with stub._lock:
+                    stub.requests.append({
+                        'method': self.command,
+                        'path': parsed.path,
+                        'query': parsed.query,
+                        'headers': dict(self.headers),
+                        'body': body
+                    })
+                status, payload, headers = stub._next_response(self.command, parsed.path)
+                if isinstance(payload, (dict, list)):
+                    data = json.dumps(payload).encode('utf-8')
+                    headers = {'Content-Type': 'application/json', **headers}
+                elif isinstance(payload, str):
+                    data = payload.encode('utf-8')
+                    headers = {'Content-Type': 'text/html; charset=utf-8', **headers}
+                else:
+                    data = payload or b''
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _handle
+            do_POST = _handle
+            do_PUT = _handle
+            do_DELETE = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
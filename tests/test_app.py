@@ -1,9 +1,10 @@
 import pytest
 import json
 import os
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 
 from app import app, conversation_manager
+from fake_anthropic import FakeStream
 
 @pytest.fixture
 def client():
@@ -46,12 +47,7 @@ def test_chat_api_empty_message(mock_anthropic, client):
 def test_chat_api_valid_message(mock_anthropic, client):
     """Test that the chat API processes valid messages"""
     # Mock the Anthropic client response
-    mock_content = MagicMock()
-    mock_content.text = "This is a test response from Claude"
-    mock_response = MagicMock()
-    mock_response.content = [mock_content]
-    mock_response.usage.output_tokens = 10
-    mock_anthropic.messages.create.return_value = mock_response
+    mock_anthropic.messages.stream.return_value = FakeStream("This is a test response from Claude", output_tokens=10)
     
     response = client.post('/api/chat', 
                           json={'message': 'Hello, Claude!'},
@@ -83,7 +79,7 @@ def test_clear_conversation(client):
     
     # Verify conversation is cleared
     conversation = conversation_manager.get_or_create_conversation('test-session')
-    assert len(conversation['messages']) == 0
+    assert len(conversation.messages) == 0
 
 @patch('app.WebSearcher.search_web')
 def test_search_api(mock_search_web, client):
@@ -139,4 +135,158 @@ def test_fetch_api_empty_url(client):
     
     assert response.status_code == 400
     data = json.loads(response.data)
-    assert 'error' in data
\ No newline at end of file
+    assert 'error' in data
+
+def test_conversation_pagination_and_etag(client):
+    """Test paginated conversation loading with conditional requests"""
+    with client.session_transaction() as session:
+        session['session_id'] = 'paged-session'
+    for i in range(5):
+        conversation_manager.add_message('paged-session', 'user', f'Message {i}')
+    conversation_manager.add_message(
+        'paged-session', 'assistant', 'Answer',
+        metadata={'search_results': [{'title': 'Result', 'url': 'https://example.com', 'snippet': 'Snippet'}]}
+    )
+
+    response = client.get('/api/conversation?limit=2')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert [m['content'] for m in data['messages']] == ['Message 4', 'Answer']
+    assert data['has_more_before'] is True
+    assert 'search_results' not in data['messages'][1]['metadata']
+    assert 'files' not in data
+
+    older = json.loads(client.get(f"/api/conversation?limit=2&before={data['messages'][0]['id']}").data)
+    assert [m['content'] for m in older['messages']] == ['Message 2', 'Message 3']
+
+    etag = response.headers['ETag']
+    assert client.get('/api/conversation?limit=2', headers={'If-None-Match': etag}).status_code == 304
+
+    conversation_manager.add_message('paged-session', 'user', 'Newer')
+    assert client.get('/api/conversation?limit=2', headers={'If-None-Match': etag}).status_code == 200
+
+    changes = json.loads(client.get(f"/api/conversation?since={data['cursor']}").data)
+    assert [m['content'] for m in changes['messages']] == ['Newer']
+
+    full = json.loads(client.get('/api/conversation?limit=2&include=metadata').data)
+    assert full['messages'][0]['metadata']['search_results'][0]['snippet'] == 'Snippet'
+
+def test_conversation_unknown_cursor_message(client):
+    """Test that paging from an unknown message id is rejected"""
+    with client.session_transaction() as session:
+        session['session_id'] = 'paged-session-2'
+
+    response = client.get('/api/conversation?before=missing')
+
+    assert response.status_code == 400
+
+def test_export_ndjson_stream(client):
+    """Test the streaming NDJSON export"""
+    with client.session_transaction() as session:
+        session['session_id'] = 'export-session'
+    conversation_manager.add_message('export-session', 'user', 'Question')
+    conversation_manager.add_message('export-session', 'assistant', 'Answer')
+    conversation_manager.add_file('export-session', {'filename': 'test.txt', 'content': 'File content'})
+    conversation_manager.add_search('export-session', 'query', [{'title': 'Result'}])
+
+    response = client.get('/api/conversation/export?format=ndjson')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert 'attachment' in response.headers['Content-Disposition']
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [r['kind'] for r in records] == ['conversation', 'message', 'message', 'file', 'search']
+    assert records[0]['counts'] == {'messages': 2, 'files': 1, 'search_history': 1}
+    assert records[2]['data']['content'] == 'Answer'
+    assert records[3]['data']['content'] == 'File content'
+
+def test_export_ndjson_gzip(client):
+    """Test on-the-fly gzip compression of the NDJSON export"""
+    import gzip
+
+    with client.session_transaction() as session:
+        session['session_id'] = 'export-gzip-session'
+    for i in range(200):
+        conversation_manager.add_message('export-gzip-session', 'user', f'Message {i} ' + 'x' * 500)
+
+    negotiated = client.get('/api/conversation/export?format=ndjson', headers={'Accept-Encoding': 'gzip'})
+    assert negotiated.headers['Content-Encoding'] == 'gzip'
+    lines = gzip.decompress(negotiated.data).decode('utf-8').splitlines()
+    assert len(lines) == 201
+
+    refused = client.get('/api/conversation/export?format=ndjson', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+    assert 'Content-Encoding' not in refused.headers
+    assert len(refused.get_data(as_text=True).splitlines()) == 201
+
+    download = client.get('/api/conversation/export?format=ndjson&compress=gzip')
+    assert download.mimetype == 'application/gzip'
+    assert 'Content-Encoding' not in download.headers
+    assert download.headers['Content-Disposition'].endswith('.ndjson.gz"')
+    assert len(gzip.decompress(download.data).decode('utf-8').splitlines()) == 201
+
+def test_json_response_compression(client):
+    """Test negotiated compression of large JSON responses"""
+    import gzip
+    from assets import brotli
+
+    with client.session_transaction() as session:
+        session['session_id'] = 'compressed-session'
+    for i in range(50):
+        conversation_manager.add_message('compressed-session', 'user', f'Message {i} ' + 'y' * 200)
+
+    plain = client.get('/api/conversation')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    gzipped = client.get('/api/conversation', headers={'Accept-Encoding': 'gzip'})
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert int(gzipped.headers['Content-Length']) == len(gzipped.data) < len(plain.data)
+    assert json.loads(gzip.decompress(gzipped.data)) == json.loads(plain.data)
+
+    preferred = client.get('/api/conversation', headers={'Accept-Encoding': 'gzip, deflate, br'})
+    if brotli is not None:
+        assert preferred.headers['Content-Encoding'] == 'br'
+        assert json.loads(brotli.decompress(preferred.data)) == json.loads(plain.data)
+
+    # Compressed representations carry a weak validator that still revalidates
+    etag = preferred.headers['ETag']
+    assert etag.startswith('W/')
+    revalidated = client.get('/api/conversation', headers={'Accept-Encoding': 'gzip, br', 'If-None-Match': etag})
+    assert revalidated.status_code == 304
+
+def test_small_response_not_compressed(client):
+    """Test that responses under the size threshold are sent as-is"""
+    response = client.get('/api/health/upstreams', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+
+def test_fingerprinted_assets(client):
+    """Test that the index page references content-hashed, long-cached assets"""
+    import gzip
+    import re
+
+    page = client.get('/').get_data(as_text=True)
+    urls = re.findall(r'/assets/[0-9a-f]+/(?:css/style\.css|js/app\.js)', page)
+    assert len(urls) == 2
+
+    script_url = next(url for url in urls if url.endswith('app.js'))
+    with open(os.path.join(app.static_folder, 'js', 'app.js'), 'rb') as f:
+        source = f.read()
+
+    response = client.get(script_url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == source
+
+    revalidated = client.get(script_url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+    stale = client.get('/assets/000000000000/js/app.js')
+    assert stale.status_code == 200
+    assert stale.headers['Cache-Control'] == 'no-cache'
+    assert stale.data == source
+
+    assert client.get('/assets/000000000000/../app.py').status_code == 404
+    assert client.get('/assets/000000000000/js/missing.js').status_code == 404
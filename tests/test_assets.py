@@ -0,0 +1,47 @@
+import gzip
+import os
+
+from assets import StaticAssets, compress, is_compressible
+
+
+def test_digest_follows_content(tmp_path):
+    """Test that the fingerprint changes when the file changes"""
+    path = tmp_path / 'app.js'
+    path.write_text('console.log("one");')
+    assets = StaticAssets(str(tmp_path))
+
+    first = assets.digest('app.js')
+    assert first == assets.digest('app.js')
+
+    path.write_text('console.log("two");')
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+    assert assets.digest('app.js') != first
+
+
+def test_precompressed_variants(tmp_path):
+    """Test that compressible files get encoded variants and others do not"""
+    (tmp_path / 'style.css').write_text('body { color: black; }\n' * 200)
+    (tmp_path / 'logo.png').write_bytes(b'\x89PNG' + b'\x00' * 2000)
+    assets = StaticAssets(str(tmp_path))
+
+    css = assets.get('style.css')
+    assert css['mimetype'] == 'text/css'
+    assert gzip.decompress(css['variants']['gzip']) == css['variants']['identity']
+    assert set(assets.get('logo.png')['variants']) == {'identity'}
+
+
+def test_missing_and_escaping_paths(tmp_path):
+    """Test that unknown files and paths outside the folder are not served"""
+    assets = StaticAssets(str(tmp_path))
+
+    assert assets.get('missing.js') is None
+    assert assets.get('../secret.txt') is None
+
+
+def test_compress_helpers():
+    """Test mimetype detection and compression round trip"""
+    assert is_compressible('application/json')
+    assert is_compressible('text/html')
+    assert not is_compressible('image/png')
+    assert not is_compressible(None)
+    assert gzip.decompress(compress(b'payload' * 100, 'gzip')) == b'payload' * 100
@@ -0,0 +1,190 @@
+import json
+from io import BytesIO
+from unittest.mock import patch
+
+import anthropic
+import pytest
+
+import batch
+from app import app, batch_params
+from batch import BatchPipeline
+from cache import ResponseCache
+from stub_server import StubServer
+
+BATCH_ID = 'msgbatch_stub'
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def _batch(stub, status, processing=2, succeeded=0, errored=0):
+    return {
+        'id': BATCH_ID,
+        'type': 'message_batch',
+        'processing_status': status,
+        'request_counts': {'processing': processing, 'succeeded': succeeded, 'errored': errored, 'canceled': 0, 'expired': 0},
+        'ended_at': '2026-01-01T00:10:00Z' if status == 'ended' else None,
+        'created_at': '2026-01-01T00:00:00Z',
+        'expires_at': '2026-01-02T00:00:00Z',
+        'cancel_initiated_at': None,
+        'archived_at': None,
+        'results_url': f'{stub.url}/v1/messages/batches/{BATCH_ID}/results' if status == 'ended' else None
+    }
+
+def _succeeded(custom_id, text):
+    return {'custom_id': custom_id, 'result': {'type': 'succeeded', 'message': {
+        'id': f'msg_{custom_id}', 'type': 'message', 'role': 'assistant', 'model': 'claude-sonnet-4-20250514',
+        'content': [{'type': 'text', 'text': text}], 'stop_reason': 'end_turn', 'stop_sequence': None,
+        'usage': {'input_tokens': 50, 'output_tokens': 7}
+    }}}
+
+def _errored(custom_id, message):
+    return {'custom_id': custom_id, 'result': {'type': 'errored', 'error': {
+        'type': 'error', 'error': {'type': 'invalid_request_error', 'message': message}
+    }}}
+
+@pytest.fixture
+def stub():
+    server = StubServer().start()
+    results = '\n'.join(json.dumps(entry) for entry in (
+        _errored('doc-00001', 'Prompt is too long'),
+        _succeeded('doc-00000', 'Summary of a'),
+    )).encode('utf-8')
+    server.add('POST', '/v1/messages/batches', (200, _batch(server, 'in_progress')))
+    server.add('GET', f'/v1/messages/batches/{BATCH_ID}',
+               (200, _batch(server, 'in_progress')),
+               (200, _batch(server, 'in_progress', processing=1, succeeded=1)),
+               (200, _batch(server, 'ended', processing=0, succeeded=1, errored=1)))
+    server.add('GET', f'/v1/messages/batches/{BATCH_ID}/results', (200, results, {'Content-Type': 'application/binary'}))
+    yield server
+    server.stop()
+
+@pytest.fixture
+def stub_client(stub):
+    return anthropic.Anthropic(api_key='test', base_url=stub.url, max_retries=0)
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-key'
+    with app.test_client() as client:
+        yield client
+
+def _pipeline(stub_client, clock):
+    return BatchPipeline(
+        stub_client,
+        lambda document: batch_params('Summarize', 'normal', document),
+        poll_interval=2, max_poll_interval=3, backoff=2, sleep=clock.sleep, clock=clock
+    )
+
+def test_pipeline_submits_polls_with_backoff_and_reads_results(stub, stub_client):
+    """Test the submit -> poll -> results cycle against the batches endpoints"""
+    clock = FakeClock()
+    sleeps = []
+    pipeline = _pipeline(stub_client, clock)
+    pipeline._sleep = lambda seconds: (sleeps.append(seconds), clock.sleep(seconds))
+
+    submitted, documents_by_id = pipeline.submit([
+        {'filename': 'a.txt', 'content': 'Alpha'},
+        {'filename': 'b.txt', 'content': 'Beta'}
+    ])
+    ended = pipeline.wait(submitted.id)
+    rows = {row['custom_id']: row for row in pipeline.results(ended.id, documents_by_id)}
+
+    assert documents_by_id == {'doc-00000': 'a.txt', 'doc-00001': 'b.txt'}
+    assert sleeps == [2, 3]
+    body = json.loads(stub.hits('POST', '/v1/messages/batches')[0]['body'])
+    assert [entry['custom_id'] for entry in body['requests']] == ['doc-00000', 'doc-00001']
+    assert 'File: a.txt\nContent: Alpha' in body['requests'][0]['params']['messages'][0]['content']
+    assert rows['doc-00000'] == {
+        'custom_id': 'doc-00000', 'filename': 'a.txt', 'status': 'succeeded', 'text': 'Summary of a', 'thinking': None,
+        'model': 'claude-sonnet-4-20250514', 'usage': {'input_tokens': 50, 'output_tokens': 7}
+    }
+    assert rows['doc-00001']['status'] == 'errored'
+    assert rows['doc-00001']['error'] == 'Prompt is too long'
+
+def test_wait_gives_up_after_timeout(stub, stub_client):
+    """Test that polling stops once the next wait would pass the timeout"""
+    clock = FakeClock()
+
+    with pytest.raises(TimeoutError):
+        _pipeline(stub_client, clock).wait(BATCH_ID, timeout=4)
+    assert len(stub.hits('GET', f'/v1/messages/batches/{BATCH_ID}')) == 2
+
+def test_batch_params_use_the_thinking_budget():
+    """Test that batch requests are built like chat requests"""
+    with patch('app.THINKING_STRATEGY', 'native'):
+        params = batch_params('Analyse', 'deep_analysis', {'filename': 'a.txt', 'content': 'Alpha'})
+
+    assert params['thinking']['type'] == 'enabled'
+    assert params['messages'][0]['content'].endswith('User query: Analyse')
+
+def test_cli_writes_jsonl_and_manifest(stub, stub_client, tmp_path):
+    """Test the CLI end to end, extraction failures included"""
+    (tmp_path / 'a.txt').write_text('Alpha')
+    (tmp_path / 'b.txt').write_text('Beta')
+    output = tmp_path / 'results.jsonl'
+
+    with patch('app.anthropic_client', stub_client):
+        code = batch.main([
+            str(tmp_path / 'a.txt'), str(tmp_path / 'b.txt'), str(tmp_path / 'missing.txt'),
+            '--prompt', 'Summarize', '--output', str(output), '--workers', '1',
+            '--poll-interval', '0', '--max-poll-interval', '0'
+        ])
+
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert code == 0
+    assert [(row['filename'], row['status']) for row in rows] == [
+        ('missing.txt', 'extraction_error'), ('b.txt', 'errored'), ('a.txt', 'succeeded')
+    ]
+    manifest = json.loads((tmp_path / 'results.jsonl.manifest.json').read_text())
+    assert manifest['batch_id'] == BATCH_ID
+    assert manifest['documents'] == {'doc-00000': 'a.txt', 'doc-00001': 'b.txt'}
+
+def test_batch_api_submits_and_streams_results(stub, stub_client, client):
+    """Test the HTTP endpoints: submit, status and JSONL results"""
+    with patch('app.anthropic_client', stub_client), patch('magic.from_file', return_value='text/plain'):
+        response = client.post('/api/batch', data={
+            'prompt': 'Summarize',
+            'files': [(BytesIO(b'Alpha'), 'a.txt'), (BytesIO(b'Beta'), 'b.txt')]
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 202
+        assert response.get_json()['batch_id'] == BATCH_ID
+
+        assert client.get(f'/api/batch/{BATCH_ID}').get_json()['status'] == 'in_progress'
+        early = client.get(f'/api/batch/{BATCH_ID}/results')
+        assert early.status_code == 409
+
+        results = client.get(f'/api/batch/{BATCH_ID}/results')
+
+    assert results.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in results.get_data(as_text=True).splitlines()]
+    assert {(row['filename'], row['status']) for row in rows} == {('a.txt', 'succeeded'), ('b.txt', 'errored')}
+
+def test_batch_api_remembers_a_bounded_number_of_jobs(stub, stub_client, client):
+    """Test that filenames for older submissions are evicted instead of kept forever"""
+    jobs = ResponseCache(max_entries=1, ttl=60)
+    jobs.put('msgbatch_older', {'documents': {'doc-00000': 'old.txt'}, 'errors': []})
+
+    with patch('app.anthropic_client', stub_client), patch('app.BATCH_JOBS', jobs):
+        response = client.post('/api/batch', data={
+            'prompt': 'Summarize', 'files': [(BytesIO(b'Alpha'), 'a.txt')]
+        }, content_type='multipart/form-data')
+
+    assert response.status_code == 202
+    assert jobs.get('msgbatch_older') is None
+    assert jobs.get(BATCH_ID)['documents'] == {'doc-00000': 'a.txt'}
+
+def test_batch_api_requires_files_and_prompt(client):
+    """Test input validation"""
+    with patch('app.anthropic_client'):
+        assert client.post('/api/batch', data={'prompt': 'Summarize'}, content_type='multipart/form-data').status_code == 400
+        no_prompt = client.post('/api/batch', data={'files': [(BytesIO(b'Alpha'), 'a.txt')]}, content_type='multipart/form-data')
+        assert no_prompt.status_code == 400
@@ -0,0 +1,65 @@
+import pytest
+
+from benchmarks import harness
+
+def _report(**medians):
+    return {'results': {name: {'median_ms': value} for name, value in medians.items()}}
+
+def test_compare_flags_regressions_beyond_tolerance():
+    """Test that only slowdowns larger than the tolerance are regressions"""
+    rows = harness.compare(_report(a=12.0, b=13.0, c=5.0), _report(a=10.0, b=10.0, c=10.0), tolerance=0.25)
+    statuses = {row['name']: row['status'] for row in rows}
+
+    assert statuses == {'a': 'ok', 'b': 'REGRESSION', 'c': 'improved'}
+
+def test_compare_reports_new_benchmarks():
+    """Test that benchmarks missing from the baseline are reported as new"""
+    rows = harness.compare(_report(fresh=1.0), _report(), tolerance=0.1)
+
+    assert rows[0]['status'] == 'new'
+    assert 'fresh' in harness.format_comparison(rows)
+
+def test_run_one_times_the_yielded_callable(monkeypatch):
+    """Test that setup and teardown wrap the timed callable"""
+    events = []
+
+    def bench():
+        events.append('setup')
+        yield lambda: events.append('run')
+        events.append('teardown')
+
+    monkeypatch.setitem(harness.REGISTRY, 'test.bench', {'func': bench, 'min_rounds': 3, 'min_time': 0, 'max_rounds': 3})
+    result = harness.run_one('test.bench')
+
+    assert result['rounds'] == 3
+    assert events[0] == 'setup'
+    assert events.count('run') == 4  # warm-up plus three timed rounds
+
+def test_memory_benchmark_reports_dedup_savings():
+    """Test that the memory benchmark measures the footprint and blob savings"""
+    from benchmarks import memory
+
+    report = memory.measure(sessions=3, turns=30)
+
+    assert report['bytes_per_session'] > 0
+    assert report['blobs']['stored_bytes'] < report['blobs']['referenced_bytes']
+    assert report['blob_bytes_saved_per_session'] > 0
+
+def test_message_benchmark_reports_bytes_and_throughput():
+    """Test that the per-message benchmark compares records with plain dicts"""
+    from benchmarks import memory
+
+    report = memory.measure_messages(total=2000, sessions=20)
+
+    assert report['appends_per_second'] > 0
+    assert 0 < report['bytes_per_message'] < report['dict_bytes_per_message']
+
+def test_concurrency_benchmark_compares_global_and_per_session_locking():
+    """Test that per-session turns stay ordered and outrun a single global lock"""
+    from benchmarks import concurrency
+
+    report = concurrency.measure(sessions=8, clients=2, turns=3, llm_latency=0.002)
+
+    assert report['global_lock']['ordered'] and report['per_session']['ordered']
+    assert report['per_session']['turns'] == 48
+    assert report['speedup'] > 1
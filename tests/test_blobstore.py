@@ -0,0 +1,53 @@
+from blobstore import BlobStore
+
+def test_equal_values_share_one_blob():
+    """Test that equal values get the same id and are stored once"""
+    store = BlobStore()
+
+    first = store.put('x' * 1000)
+    second = store.put(''.join(['x'] * 1000))
+
+    assert first == second
+    assert len(store) == 1
+    assert store.refcount(first) == 2
+    assert store.get(first) == 'x' * 1000
+
+def test_text_and_json_do_not_collide():
+    """Test that a string and a list with the same JSON text are distinct blobs"""
+    store = BlobStore()
+
+    assert store.put('[]') != store.put([])
+    assert store.put({'b': 1, 'a': 2}) == store.put({'a': 2, 'b': 1})
+
+def test_release_drops_unreferenced_blobs():
+    """Test reference counting on release"""
+    store = BlobStore()
+    blob_id = store.put([{'title': 'Result'}])
+    store.put([{'title': 'Result'}])
+
+    store.release(blob_id)
+    assert blob_id in store
+    store.release(blob_id)
+    assert blob_id not in store
+    assert store.get(blob_id) is None
+    store.release(blob_id)  # releasing an unknown id is a no-op
+
+def test_stats():
+    """Test stored versus referenced byte accounting"""
+    store = BlobStore()
+    store.put('abcd')
+    store.put('abcd')
+    store.put('xy')
+
+    assert store.stats() == {'blobs': 2, 'references': 3, 'stored_bytes': 6, 'referenced_bytes': 10}
+
+def test_retain_keeps_a_blob_until_released():
+    """Test that an extra reference keeps a value stored"""
+    store = BlobStore()
+    blob_id = store.put('Alpha')
+
+    assert store.retain(blob_id)
+    store.release(blob_id)
+    assert store.get(blob_id) == 'Alpha'
+    store.release(blob_id)
+    assert not store.retain(blob_id)
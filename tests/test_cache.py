@@ -0,0 +1,102 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app import app
+from cache import ResponseCache
+from fake_anthropic import FakeStream
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-key'
+    with app.test_client() as client:
+        yield client
+
+def test_key_is_stable_across_dict_ordering():
+    """Test that equal payloads hash the same and different ones don't"""
+    a = ResponseCache.key_for({'model': 'm', 'max_tokens': 10, 'messages': [{'role': 'user', 'content': 'hi'}]})
+    b = ResponseCache.key_for({'messages': [{'content': 'hi', 'role': 'user'}], 'max_tokens': 10, 'model': 'm'})
+    c = ResponseCache.key_for({'model': 'm', 'max_tokens': 11, 'messages': [{'role': 'user', 'content': 'hi'}]})
+
+    assert a == b
+    assert a != c
+
+def test_entries_expire_after_ttl():
+    """Test time-to-live expiry"""
+    clock = FakeClock()
+    cache = ResponseCache(max_entries=10, ttl=60, clock=clock)
+    cache.put('key', 'value')
+
+    clock.now = 59
+    assert cache.get('key') == 'value'
+    clock.now = 60
+    assert cache.get('key') is None
+    assert len(cache) == 0
+
+def test_least_recently_used_entry_is_evicted():
+    """Test size-bounded eviction keeps recently used entries"""
+    cache = ResponseCache(max_entries=2, ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.snapshot()['evictions'] == 1
+
+def _mock_response(text, input_tokens=12, output_tokens=30):
+    return FakeStream(text, input_tokens=input_tokens, output_tokens=output_tokens)
+
+def _chat(client, session_id, **payload):
+    with client.session_transaction() as session:
+        session['session_id'] = session_id
+    client.post('/api/clear')
+    return json.loads(client.post('/api/chat', json={'message': 'Same question', **payload}).data)
+
+@patch('app.anthropic_client')
+def test_chat_serves_identical_payloads_from_cache(mock_anthropic, client):
+    """Test cache hits, saved tokens and the regenerate bypass"""
+    mock_anthropic.messages.stream.side_effect = [_mock_response('First'), _mock_response('Second')]
+
+    with patch('app.RESPONSE_CACHE', ResponseCache(max_entries=8, ttl=60)):
+        first = _chat(client, 'cache-session')
+        assert first['cache_hit'] is False
+        assert first['tokens_saved'] == 0
+
+        repeat = _chat(client, 'cache-session')
+        assert repeat['response'] == 'First'
+        assert repeat['cache_hit'] is True
+        assert repeat['tokens_saved'] == 42
+        assert mock_anthropic.messages.stream.call_count == 1
+
+        regenerated = _chat(client, 'cache-session', regenerate=True)
+        assert regenerated['response'] == 'Second'
+        assert regenerated['cache_hit'] is False
+
+        # The regenerated answer replaces the cached one
+        assert _chat(client, 'cache-session')['response'] == 'Second'
+
+        assert client.get('/api/health/cache').get_json()['hits'] == 2
+
+@patch('app.anthropic_client')
+def test_chat_cache_is_opt_in(mock_anthropic, client):
+    """Test that without a configured cache every request reaches Claude"""
+    mock_anthropic.messages.stream.return_value = _mock_response('Answer')
+
+    with patch('app.RESPONSE_CACHE', None):
+        assert _chat(client, 'uncached-session')['cache_hit'] is False
+        assert _chat(client, 'uncached-session')['cache_hit'] is False
+
+    assert mock_anthropic.messages.stream.call_count == 2
+    assert client.get('/api/health/cache').get_json() == {'enabled': False}
@@ -0,0 +1,217 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import app as app_module
+from app import app, CANCELLATIONS, conversation_manager
+from cancellation import CancellationRegistry
+from fake_anthropic import FakeStream
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-key'
+    with app.test_client() as client:
+        yield client
+
+def _use_session(client, session_id):
+    with client.session_transaction() as flask_session:
+        flask_session['session_id'] = session_id
+
+def test_registry_cancels_by_request_and_supersedes():
+    """Test targeted cancels, superseding a session's older request and release"""
+    registry = CancellationRegistry()
+    first = registry.register('s1', 'r1')
+    other = registry.register('s2', 'r1')
+
+    assert registry.cancel('s1', 'missing') == []
+    second = registry.register('s1', 'r2')
+    assert first.cancelled and first.reason == 'superseded'
+    assert not other.cancelled
+
+    assert registry.cancel('s1', 'r2', reason='cancelled') == ['r2']
+    assert second.reason == 'cancelled'
+    # A token is only cancelled once
+    assert registry.cancel('s1') == []
+
+    registry.release(first)
+    registry.release(second)
+    assert registry.active('s1') == []
+    assert len(registry) == 1
+
+def test_detach_reports_remaining_sockets():
+    """Test counting the sockets a session has open"""
+    registry = CancellationRegistry()
+    registry.attach('s1')
+    registry.attach('s1')
+
+    assert registry.detach('s1') == 1
+    assert registry.detach('s1') == 0
+
+@patch('app.anthropic_client')
+def test_cancel_stops_the_stream_and_keeps_the_partial_answer(mock_anthropic, client):
+    """Test that a cancel closes the upstream stream, frees the slot and stores what was generated"""
+    stream = FakeStream('one two three four five six', output_tokens=6)
+    mock_anthropic.messages.stream.return_value = stream
+    _use_session(client, 'cancel-session')
+    client.post('/api/clear')
+    statuses = []
+
+    def emit(session_id, event, payload):
+        # The user presses stop as soon as the first words show up
+        if event == 'chat_delta':
+            CANCELLATIONS.cancel(session_id, 'req-1')
+        if event == 'chat_status':
+            statuses.append(payload['stage'])
+
+    with patch('app.emit_to_session', emit):
+        response = client.post('/api/chat', json={'message': 'Hello', 'request_id': 'req-1'})
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['cancelled'] is True
+    assert data['request_id'] == 'req-1'
+    assert data['response'] == 'one '
+    assert stream.closed
+    assert stream.events_read < 5
+    assert statuses == ['generating', 'cancelled']
+    assert len(CANCELLATIONS) == 0
+
+    metadata = client.get('/api/conversation').get_json()['messages'][-1]['metadata']
+    assert metadata['cancelled'] is True
+    assert metadata['cancel_reason'] == 'cancelled'
+
+@patch('app.anthropic_client')
+def test_answer_cancelled_before_any_text_is_not_sent_back(mock_anthropic, client):
+    """Test that an empty cancelled answer is stored but left out of later prompts"""
+    mock_anthropic.messages.stream.return_value = FakeStream('Answer')
+    _use_session(client, 'early-cancel-session')
+    client.post('/api/clear')
+
+    def emit(session_id, event, payload):
+        if payload.get('stage') == 'generating':
+            CANCELLATIONS.cancel(session_id)
+
+    with patch('app.emit_to_session', emit):
+        data = client.post('/api/chat', json={'message': 'Hello'}).get_json()
+
+    assert data['cancelled'] is True and data['response'] == ''
+    assert [m['role'] for m in conversation_manager.get_messages_for_api('early-cancel-session')] == ['user']
+
+def test_registry_calls_off_a_detached_cancel_on_attach():
+    """Test that only the latest detach counts and an attach within the grace period calls it off"""
+    registry = CancellationRegistry()
+    token = registry.register('s1', 'r1')
+    registry.attach('s1')
+
+    assert registry.detach('s1') == 0
+    registry.cancel_when_detached('s1', grace=0.05)
+    registry.attach('s1')
+    time.sleep(0.1)
+    assert not token.cancelled
+
+    registry.detach('s1')
+    registry.cancel_when_detached('s1', grace=0.2)
+    registry.cancel_when_detached('s1', grace=0.01)
+    time.sleep(0.1)
+    assert token.cancelled and token.reason == 'disconnected'
+
+def test_socket_cancel_event(client):
+    """Test that the cancel event reaches the session's in-flight request and acknowledges"""
+    _use_session(client, 'socket-cancel-session')
+    token = CANCELLATIONS.register('socket-cancel-session', 'req-socket')
+    socket_client = app_module.socketio.test_client(app, flask_test_client=client)
+    try:
+        ack = socket_client.emit('cancel', {'request_id': 'req-socket'}, callback=True)
+
+        assert ack == {'cancelled': ['req-socket']}
+        assert token.cancelled
+    finally:
+        socket_client.disconnect()
+        CANCELLATIONS.release(token)
+
+@patch('app.CHAT_DISCONNECT_GRACE', 0)
+def test_closing_the_last_socket_cancels(client):
+    """Test that generation for a session stops once none of its tabs is connected"""
+    _use_session(client, 'disconnect-session')
+    token = CANCELLATIONS.register('disconnect-session', 'req-tab')
+    first = app_module.socketio.test_client(app, flask_test_client=client)
+    second = app_module.socketio.test_client(app, flask_test_client=client)
+    try:
+        first.disconnect()
+        assert not token.cancelled
+
+        second.disconnect()
+        assert token.cancelled and token.reason == 'disconnected'
+    finally:
+        CANCELLATIONS.release(token)
+
+@patch('app.CHAT_DISCONNECT_GRACE', 0.05)
+def test_reconnecting_within_the_grace_period_keeps_generating(client):
+    """Test that a reload doesn't cancel the answer, while a tab that stays away does"""
+    _use_session(client, 'reload-session')
+    token = CANCELLATIONS.register('reload-session', 'req-reload')
+    try:
+        app_module.socketio.test_client(app, flask_test_client=client).disconnect()
+        reloaded = app_module.socketio.test_client(app, flask_test_client=client)
+        time.sleep(0.1)
+        assert not token.cancelled
+
+        reloaded.disconnect()
+        assert not token.cancelled
+        time.sleep(0.1)
+        assert token.cancelled and token.reason == 'disconnected'
+    finally:
+        CANCELLATIONS.release(token)
+
+def test_cancel_endpoint(client):
+    """Test the HTTP fallback for clients without a socket"""
+    _use_session(client, 'http-cancel-session')
+    token = CANCELLATIONS.register('http-cancel-session', 'req-http')
+    try:
+        assert client.post('/api/chat/cancel', json={'request_id': 'req-http'}).get_json() == {'cancelled': ['req-http']}
+        assert token.cancelled
+    finally:
+        CANCELLATIONS.release(token)
+
+@patch('app.CHAT_SLOT_TIMEOUT', 0)
+@patch('app.anthropic_client')
+def test_chat_is_refused_when_no_slot_is_free(mock_anthropic, client):
+    """Test that a full worker answers 503 instead of queueing indefinitely"""
+    with patch('app.CHAT_SLOTS', threading.BoundedSemaphore(1)) as slots:
+        slots.acquire()
+        response = client.post('/api/chat', json={'message': 'Hello'})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    mock_anthropic.messages.stream.assert_not_called()
+
+@patch('app.CHAT_SLOT_TIMEOUT', 0)
+@patch('app.anthropic_client')
+def test_request_waiting_for_its_turn_holds_no_slot(mock_anthropic, client):
+    """Test that a request queued behind its session's previous turn leaves the slot to other sessions"""
+    mock_anthropic.messages.stream.side_effect = lambda **kwargs: FakeStream('Answer')
+    _use_session(client, 'queued-session')
+    client.post('/api/clear')
+    responses = {}
+
+    def queued():
+        with app.test_client() as queued_client:
+            _use_session(queued_client, 'queued-session')
+            responses['queued'] = queued_client.post('/api/chat', json={'message': 'Hello'})
+
+    with patch('app.CHAT_SLOTS', threading.BoundedSemaphore(1)), patch('app.CHAT_TURN_TIMEOUT', 5):
+        with conversation_manager.turn('queued-session'):
+            waiter = threading.Thread(target=queued)
+            waiter.start()
+            while conversation_manager.turns.waiting('queued-session') < 2:
+                time.sleep(0.001)
+            _use_session(client, 'other-session')
+            responses['other'] = client.post('/api/chat', json={'message': 'Hello'})
+            assert app_module.CHAT_GENERATIONS.value() == 0
+        waiter.join(timeout=5)
+
+    assert responses['other'].status_code == 200
+    assert responses['queued'].status_code == 200
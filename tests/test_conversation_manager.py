@@ -4,6 +4,7 @@ from datetime import datetime
 from unittest.mock import patch, MagicMock
 
 from app import ConversationManager
+from records import format_id
 
 @pytest.fixture
 def conversation_manager():
@@ -18,16 +19,11 @@ def test_get_or_create_conversation(conversation_manager):
     
     # Check that the conversation was created with the expected structure
     assert session_id in conversation_manager.conversations
-    assert 'messages' in conversation
-    assert 'created_at' in conversation
-    assert 'last_updated' in conversation
-    assert 'files' in conversation
-    assert 'search_history' in conversation
-    assert isinstance(conversation['messages'], list)
-    assert isinstance(conversation['files'], list)
-    assert isinstance(conversation['search_history'], list)
-    assert isinstance(conversation['created_at'], datetime)
-    assert isinstance(conversation['last_updated'], datetime)
+    assert isinstance(conversation.messages, list)
+    assert isinstance(conversation.files, list)
+    assert isinstance(conversation.search_history, list)
+    assert isinstance(conversation.created_at, float)
+    assert isinstance(conversation.last_updated, float)
     
     # Get the same conversation again
     conversation2 = conversation_manager.get_or_create_conversation(session_id)
@@ -46,15 +42,20 @@ def test_add_message(conversation_manager):
     
     # Check that the message was added with the expected structure
     conversation = conversation_manager.get_or_create_conversation(session_id)
-    assert len(conversation['messages']) == 1
-    assert conversation['messages'][0] == message
-    assert message['role'] == role
-    assert message['content'] == content
-    assert message['type'] == 'text'
-    assert 'id' in message
-    assert 'timestamp' in message
-    assert 'metadata' in message
-    assert isinstance(message['metadata'], dict)
+    assert len(conversation.messages) == 1
+    assert conversation.messages[0] is message
+    assert message.role == role
+    assert message.content == content
+    assert message.type == 'text'
+    assert isinstance(message.id, int)
+    assert isinstance(message.timestamp, float)
+
+    # The public shape is unchanged
+    data = conversation_manager.resolve_message(message)
+    assert set(data) == {'id', 'role', 'content', 'type', 'timestamp', 'metadata'}
+    assert data['metadata'] == {}
+    assert isinstance(data['id'], str)
+    assert datetime.fromisoformat(data['timestamp']).timestamp() == pytest.approx(message.timestamp)
 
 def test_add_message_with_metadata(conversation_manager):
     """Test adding a message with metadata"""
@@ -69,12 +70,13 @@ def test_add_message_with_metadata(conversation_manager):
     
     # Check that the message was added with the expected structure
     conversation = conversation_manager.get_or_create_conversation(session_id)
-    assert len(conversation['messages']) == 1
-    assert conversation['messages'][0] == message
-    assert message['role'] == role
-    assert message['content'] == content
-    assert message['type'] == message_type
-    assert message['metadata'] == metadata
+    assert len(conversation.messages) == 1
+    assert conversation.messages[0] is message
+    assert message.role == role
+    assert message.content == content
+    assert message.type == message_type
+    assert message.metadata == metadata
+    assert conversation_manager.resolve_message(message)['metadata'] == metadata
 
 def test_add_file(conversation_manager):
     """Test adding a file to a conversation"""
@@ -91,8 +93,8 @@ def test_add_file(conversation_manager):
     
     # Check that the file was added
     conversation = conversation_manager.get_or_create_conversation(session_id)
-    assert len(conversation['files']) == 1
-    assert conversation['files'][0] == file_info
+    assert len(conversation.files) == 1
+    assert conversation_manager.resolve_file(conversation.files[0]) == file_info
 
 def test_add_search(conversation_manager):
     """Test adding a search to a conversation"""
@@ -112,10 +114,11 @@ def test_add_search(conversation_manager):
     
     # Check that the search was added
     conversation = conversation_manager.get_or_create_conversation(session_id)
-    assert len(conversation['search_history']) == 1
-    assert conversation['search_history'][0]['query'] == query
-    assert conversation['search_history'][0]['results'] == results
-    assert 'timestamp' in conversation['search_history'][0]
+    assert len(conversation.search_history) == 1
+    search_entry = conversation_manager.resolve_search(conversation.search_history[0])
+    assert search_entry['query'] == query
+    assert search_entry['results'] == results
+    assert 'timestamp' in search_entry
 
 def test_get_messages_for_api(conversation_manager):
     """Test getting messages formatted for the API"""
@@ -176,4 +179,145 @@ def test_export_conversation(conversation_manager):
     assert len(exported['files']) == 1
     assert len(exported['search_history']) == 1
     assert isinstance(exported['created_at'], str)
-    assert isinstance(exported['last_updated'], str)
\ No newline at end of file
+    assert isinstance(exported['last_updated'], str)
+def test_get_message_page(conversation_manager):
+    """Test cursor-based pagination of messages"""
+    session_id = 'test-session-id'
+    messages = [conversation_manager.add_message(session_id, 'user', f'Message {i}') for i in range(10)]
+
+    latest = conversation_manager.get_message_page(session_id, limit=3)
+    assert [m['content'] for m in latest['messages']] == ['Message 7', 'Message 8', 'Message 9']
+    assert latest['has_more_before'] is True
+    assert latest['has_more_after'] is False
+
+    older = conversation_manager.get_message_page(session_id, before=format_id(messages[7].id), limit=3)
+    assert [m['content'] for m in older['messages']] == ['Message 4', 'Message 5', 'Message 6']
+
+    newer = conversation_manager.get_message_page(session_id, after=format_id(messages[1].id), limit=2)
+    assert [m['content'] for m in newer['messages']] == ['Message 2', 'Message 3']
+    assert newer['has_more_after'] is True
+
+    with pytest.raises(KeyError):
+        conversation_manager.get_message_page(session_id, before='unknown-id')
+
+def test_get_changes_since(conversation_manager):
+    """Test incremental sync from a cursor"""
+    session_id = 'test-session-id'
+    conversation_manager.add_message(session_id, 'user', 'First')
+    cursor = conversation_manager.get_cursor(session_id)
+
+    conversation_manager.add_message(session_id, 'assistant', 'Second')
+    conversation_manager.add_search(session_id, 'query', [{'title': 'Result'}])
+    changes = conversation_manager.get_changes_since(session_id, cursor)
+
+    assert changes['reset'] is False
+    assert [m['content'] for m in changes['messages']] == ['Second']
+    assert len(changes['search_history']) == 1
+    assert changes['files'] == []
+    assert changes['cursor'] == conversation_manager.get_cursor(session_id)
+
+    unchanged = conversation_manager.get_changes_since(session_id, changes['cursor'])
+    assert unchanged['messages'] == []
+
+def test_changes_since_reset_after_clear(conversation_manager):
+    """Test that a cursor from before a clear forces a reset"""
+    session_id = 'test-session-id'
+    conversation_manager.add_message(session_id, 'user', 'Before clear')
+    cursor = conversation_manager.get_cursor(session_id)
+
+    conversation_manager.clear_conversation(session_id)
+    conversation_manager.add_message(session_id, 'user', 'After clear')
+    changes = conversation_manager.get_changes_since(session_id, cursor)
+
+    assert changes['reset'] is True
+    assert [m['content'] for m in changes['messages']] == ['After clear']
+
+def test_project_message_drops_heavy_metadata():
+    """Test the light projection of messages"""
+    message = {
+        'id': '1', 'role': 'assistant', 'content': 'Answer', 'type': 'text', 'timestamp': 'now',
+        'metadata': {
+            'thinking_mode': 'normal',
+            'search_results': [{'title': 'Result', 'url': 'https://example.com', 'snippet': 'Long snippet'}],
+            'file_content': 'x' * 5000
+        }
+    }
+
+    light = ConversationManager.project_message(message)
+
+    assert 'search_results' not in light['metadata']
+    assert 'file_content' not in light['metadata']
+    assert light['metadata']['search_sources'] == [{'title': 'Result', 'url': 'https://example.com'}]
+    assert len(light['metadata']['file_preview']) == 200
+    assert light['metadata']['thinking_mode'] == 'normal'
+    assert ConversationManager.project_message(message, include_metadata=True) is message
+
+def test_large_values_are_deduplicated(conversation_manager):
+    """Test that file contents and search results are stored once and resolved on read"""
+    content = 'Shared file content ' * 100
+    results = [{'title': 'Result', 'url': 'https://example.com', 'snippet': 'Snippet'}]
+    conversation_manager.add_file('session-a', {'filename': 'a.txt', 'content': content})
+    conversation_manager.add_message('session-a', 'user', 'Uploaded file: a.txt', message_type='file',
+                                     metadata={'filename': 'a.txt', 'file_content': content})
+    conversation_manager.add_search('session-a', 'query', results)
+    conversation_manager.add_message('session-a', 'assistant', 'Answer', metadata={'search_results': list(results)})
+    # An equal copy uploaded in another session shares the stored blob
+    conversation_manager.add_file('session-b', {'filename': 'a.txt', 'content': ''.join(content)})
+
+    conversation = conversation_manager.get_or_create_conversation('session-a')
+    assert 'file_content' not in conversation.messages[0].metadata
+    assert len(conversation_manager.blobs) == 2
+    stats = conversation_manager.blobs.stats()
+    assert stats['references'] == 5
+    assert stats['referenced_bytes'] > stats['stored_bytes']
+
+    assert f'Content: {content}' in conversation_manager.get_messages_for_api('session-a')[0]['content']
+    exported = conversation_manager.export_conversation('session-a')
+    assert exported['messages'][0]['metadata']['file_content'] == content
+    assert exported['messages'][1]['metadata']['search_results'] == results
+    assert exported['files'][0]['content'] == content
+    assert exported['search_history'][0]['results'] == results
+
+def test_clear_releases_blobs(conversation_manager):
+    """Test that clearing a conversation drops blobs nobody else references"""
+    conversation_manager.add_file('session-a', {'filename': 'a.txt', 'content': 'Only in a'})
+    conversation_manager.add_file('session-a', {'filename': 'shared.txt', 'content': 'Shared'})
+    conversation_manager.add_file('session-b', {'filename': 'shared.txt', 'content': 'Shared'})
+
+    conversation_manager.clear_conversation('session-a')
+
+    assert len(conversation_manager.blobs) == 1
+    files = conversation_manager.export_conversation('session-b')['files']
+    assert files[0]['content'] == 'Shared'
+
+def test_export_stream_is_a_snapshot(conversation_manager):
+    """Test that appends and a clear during a streamed export don't change what it returns"""
+    conversation_manager.add_message('session-a', 'user', 'Uploaded file: a.txt', message_type='file',
+                                     metadata={'filename': 'a.txt', 'file_content': 'Alpha'})
+    conversation_manager.add_file('session-a', {'filename': 'a.txt', 'content': 'Alpha'})
+    records = conversation_manager.iter_export_records('session-a')
+
+    header = next(records)
+    conversation_manager.add_message('session-a', 'assistant', 'Late answer')
+    conversation_manager.clear_conversation('session-a')
+    rest = list(records)
+
+    assert header['counts'] == {'messages': 1, 'files': 1, 'search_history': 0}
+    assert [record['kind'] for record in rest] == ['message', 'file']
+    assert rest[0]['data']['metadata']['file_content'] == 'Alpha'
+    assert rest[1]['data']['content'] == 'Alpha'
+    # The export's pins are gone with it
+    assert len(conversation_manager.blobs) == 0
+
+def test_memory_bytes_is_a_running_total(conversation_manager):
+    """Test that the memory estimate grows with each record and shrinks back on clear"""
+    conversation_manager.get_or_create_conversation('session-b')
+    empty = conversation_manager.memory_bytes
+
+    conversation_manager.add_message('session-a', 'user', 'x' * 10000)
+    conversation_manager.add_file('session-a', {'filename': 'a.txt', 'content': 'Alpha'})
+    conversation_manager.add_search('session-a', 'query', [{'title': 'Result'}])
+    assert conversation_manager.memory_bytes - 2 * empty >= 10000
+
+    conversation_manager.clear_conversation('session-a')
+    assert conversation_manager.memory_bytes == 2 * empty
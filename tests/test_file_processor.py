@@ -1,10 +1,12 @@
 import pytest
 import os
 import tempfile
+import time
 from unittest.mock import patch, MagicMock
 from io import BytesIO
 
 from app import app, FileProcessor
+from benchmarks import corpus
 from werkzeug.datastructures import FileStorage
 
 @pytest.fixture
@@ -160,4 +162,78 @@ def test_upload_api_no_file(client):
     
     assert response.status_code == 400
     data = response.get_json()
-    assert 'error' in data
\ No newline at end of file
+    assert 'error' in data
+
+def test_upload_batch_api(client):
+    """Test that a multi-file upload reports per-file results and attaches only the extracted files"""
+    def extract(file_path, filename):
+        if filename == 'broken.pdf':
+            raise ValueError('bad xref table')
+        with open(file_path) as f:
+            return {'filename': filename, 'content': f.read(), 'mime_type': 'text/plain', 'size': 5}
+
+    with client.session_transaction() as flask_session:
+        flask_session['session_id'] = 'batch-upload-session'
+    client.post('/api/clear')
+
+    # Inline, so the patched extractor is the one that runs
+    with patch.object(FileProcessor, 'extract', side_effect=extract), patch('app.FILE_EXTRACTION_WORKERS', 0):
+        response = client.post('/api/upload/batch', data={'files': [
+            (BytesIO(b'Alpha'), 'a.txt'), (BytesIO(b'%PDF'), 'broken.pdf'), (BytesIO(b'Gamma'), 'c.txt')
+        ]}, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert (data['uploaded'], data['failed']) == (2, 1)
+    assert [(f['filename'], f['success']) for f in data['files']] == [('a.txt', True), ('broken.pdf', False), ('c.txt', True)]
+    assert 'bad xref table' in data['files'][1]['error']
+    messages = client.get('/api/conversation?include=metadata').get_json()['messages']
+    assert [m['metadata']['filename'] for m in messages] == ['a.txt', 'c.txt']
+
+def test_upload_batch_api_rejects_empty_and_all_failed(client):
+    """Test the batch upload status codes when nothing can be attached"""
+    assert client.post('/api/upload/batch', data={}, content_type='multipart/form-data').status_code == 400
+
+    with patch.object(FileProcessor, 'extract', side_effect=ValueError('unreadable')), patch('app.FILE_EXTRACTION_WORKERS', 0):
+        response = client.post('/api/upload/batch', data={'files': [(BytesIO(b'x'), 'a.txt'), (BytesIO(b'y'), 'b.txt')]},
+                               content_type='multipart/form-data')
+
+    assert response.status_code == 422
+    assert not response.get_json()['success']
+
+def test_process_many_keeps_input_order():
+    """Test that pooled extraction returns results in input order"""
+    def process(name):
+        # Later items finish first
+        time.sleep(0.01 * (3 - int(name)))
+        return {'filename': name}
+
+    results = FileProcessor.process_many(process, ['0', '1', '2'], max_workers=3, use_processes=False)
+
+    assert [result['filename'] for result in results] == ['0', '1', '2']
+
+def _worker_pid(_):
+    return {'filename': str(os.getpid())}
+
+def test_process_many_extracts_in_worker_processes():
+    """Test that pooled extraction runs outside the web worker's process"""
+    results = FileProcessor.process_many(_worker_pid, [0, 1, 2], max_workers=2)
+
+    assert len(results) == 3
+    assert str(os.getpid()) not in {result['filename'] for result in results}
+
+def test_upload_batch_api_extracts_in_the_pool(client):
+    """Test a multi-file upload end to end through the extraction processes"""
+    with client.session_transaction() as flask_session:
+        flask_session['session_id'] = 'pooled-upload-session'
+    client.post('/api/clear')
+
+    response = client.post('/api/upload/batch', data={'files': [
+        (BytesIO(corpus.pdf_bytes(pages=2)), 'report.pdf'), (BytesIO(b'Gamma notes'), 'c.txt')
+    ]}, content_type='multipart/form-data')
+
+    files = response.get_json()['files']
+    assert response.status_code == 200
+    assert [(f['filename'], f['success']) for f in files] == [('report.pdf', True), ('c.txt', True)]
+    assert files[1]['content_preview'] == 'Gamma notes'
+    assert os.listdir(app.config['UPLOAD_FOLDER']) == []
@@ -0,0 +1,94 @@
+import base64
+import io
+import os
+from unittest.mock import patch
+
+import pytest
+
+pytest.importorskip('PIL')
+from PIL import Image
+
+from app import app, conversation_manager, IMAGE_CACHE
+from images import describe_image, prepare_image
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-key'
+    with app.test_client() as client:
+        yield client
+
+def _encode(image, image_format, **options):
+    out = io.BytesIO()
+    image.save(out, format=image_format, **options)
+    return out.getvalue()
+
+def _photo(width, height):
+    # Noise compresses badly, like a real photo
+    return Image.frombytes('RGB', (width, height), os.urandom(width * height * 3))
+
+def _decode(prepared):
+    return Image.open(io.BytesIO(base64.b64decode(prepared['data'])))
+
+def test_large_photo_is_downscaled_and_fits_the_byte_limit():
+    """Test that the longer side and the encoded size are both capped"""
+    prepared = prepare_image(_encode(_photo(3000, 2000), 'JPEG', quality=95), max_dimension=1000, max_bytes=150_000)
+
+    assert prepared['media_type'] == 'image/jpeg'
+    assert max(prepared['width'], prepared['height']) <= 1000
+    assert prepared['bytes'] <= 150_000
+    assert (prepared['original_width'], prepared['original_height']) == (3000, 2000)
+    assert _decode(prepared).size == (prepared['width'], prepared['height'])
+    assert 'downscaled from 3000x2000' in describe_image(prepared)
+
+def test_small_screenshot_stays_png():
+    """Test that a PNG under the limits keeps its lossless format and size"""
+    screenshot = Image.new('RGB', (800, 600), (255, 255, 255))
+    prepared = prepare_image(_encode(screenshot, 'PNG'), max_dimension=1568, max_bytes=1_000_000)
+
+    assert prepared['media_type'] == 'image/png'
+    assert (prepared['width'], prepared['height']) == (800, 600)
+
+def test_transparent_png_over_the_limit_becomes_jpeg():
+    """Test falling back to JPEG, with transparency flattened, when PNG is too large"""
+    noisy = _photo(600, 600).convert('RGBA')
+    prepared = prepare_image(_encode(noisy, 'PNG'), max_dimension=1568, max_bytes=100_000)
+
+    assert prepared['media_type'] == 'image/jpeg'
+    assert prepared['bytes'] <= 100_000
+    assert _decode(prepared).mode == 'RGB'
+
+@patch('app.IMAGE_MAX_DIMENSION', 512)
+def test_uploaded_image_is_sent_as_a_vision_block(client):
+    """Test the upload path end to end: pooled resize, cache by content hash and the API content blocks"""
+    with client.session_transaction() as flask_session:
+        flask_session['session_id'] = 'image-session'
+    client.post('/api/clear')
+    data = _encode(_photo(2048, 1024), 'JPEG', quality=90)
+    hits = IMAGE_CACHE.hits
+
+    first = client.post('/api/upload', data={'file': (io.BytesIO(data), 'scan.jpg')}, content_type='multipart/form-data')
+    second = client.post('/api/upload', data={'file': (io.BytesIO(data), 'again.jpg')}, content_type='multipart/form-data')
+
+    assert first.status_code == 200 and second.status_code == 200
+    assert first.get_json()['content_preview'].startswith('Image 512x256 (image/jpeg')
+    assert IMAGE_CACHE.hits == hits + 1
+
+    messages = conversation_manager.get_messages_for_api('image-session')
+    image_block, text_block = messages[0]['content']
+    assert image_block['type'] == 'image'
+    assert image_block['source']['media_type'] == 'image/jpeg'
+    assert _decode({'data': image_block['source']['data']}).size == (512, 256)
+    assert text_block == {'type': 'text', 'text': 'Uploaded file: scan.jpg'}
+
+    # The base64 payload stays out of the default conversation view
+    listed = client.get('/api/conversation?limit=50').get_json()['messages'][0]['metadata']
+    assert 'image' not in listed
+    assert listed['file_preview'].startswith('Image 512x256')
+
+@patch('app.images_supported', return_value=False)
+def test_images_are_unsupported_without_pillow(_, client):
+    """Test that the stream endpoint refuses images when Pillow is missing"""
+    response = client.post('/api/upload/stream?filename=a.png', data=_encode(Image.new('RGB', (10, 10)), 'PNG'))
+
+    assert response.status_code == 415
@@ -0,0 +1,60 @@
+import pytest
+
+import anthropic
+
+from loadtest.run import dockerfile_command, parse_mix, percentile, summarize
+from loadtest.stubs import UpstreamStubs
+
+@pytest.fixture
+def stubs():
+    server = UpstreamStubs(llm_latency=0, token_delay=0, output_tokens=8, search_latency=0).start()
+    yield server
+    server.stop()
+
+def test_fake_anthropic_messages(stubs):
+    """Test that the stand-in answers like the messages API"""
+    client = anthropic.Anthropic(api_key='stub', base_url=stubs.url, max_retries=0)
+
+    response = client.messages.create(model='claude-stub', max_tokens=100, messages=[{'role': 'user', 'content': 'Hi'}])
+
+    assert response.content[0].text
+    assert response.usage.output_tokens == 8
+    assert stubs.counts['messages'] == 1
+
+def test_fake_anthropic_streaming(stubs):
+    """Test that the stand-in streams text deltas"""
+    client = anthropic.Anthropic(api_key='stub', base_url=stubs.url, max_retries=0)
+
+    with client.messages.stream(model='claude-stub', max_tokens=100, messages=[{'role': 'user', 'content': 'Hi'}]) as stream:
+        chunks = list(stream.text_stream)
+        final = stream.get_final_message()
+
+    assert len(chunks) == 8
+    assert final.content[0].text == ''.join(chunks)
+
+def test_dockerfile_command_rebinds_locally():
+    """Test that the harness runs the DOCKERFILE gunicorn command on a local port"""
+    command = dockerfile_command(6001, workers=2)
+
+    assert command[1:3] == ['-m', 'gunicorn']
+    assert command[command.index('--worker-class') + 1] == 'eventlet'
+    assert command[command.index('--bind') + 1] == '127.0.0.1:6001'
+    assert command[command.index('-w') + 1] == '2'
+
+def test_parse_mix_rejects_unknown_operations():
+    """Test traffic mix parsing"""
+    assert parse_mix('chat=3,poll=1') == {'chat': 3.0, 'poll': 1.0}
+    with pytest.raises(ValueError):
+        parse_mix('chat=1,delete=1')
+
+def test_summarize_percentiles_and_errors():
+    """Test throughput, percentile and error-rate reporting"""
+    samples = [{'op': 'chat', 'latency': i / 100, 'ok': i != 99} for i in range(1, 101)]
+
+    report = summarize(samples, elapsed=10.0)
+
+    assert percentile([1, 2, 3, 4], 0.5) == 2
+    assert report['chat']['throughput_rps'] == 10.0
+    assert report['chat']['p50_ms'] == 500.0
+    assert report['chat']['p99_ms'] == 990.0
+    assert report['all']['error_rate'] == 0.01
@@ -0,0 +1,104 @@
+import pytest
+from unittest.mock import patch
+
+from app import app, socketio, LLM_TOKENS, FILE_EXTRACTION_LATENCY, FileProcessor
+from metrics import Registry, estimate_size
+from fake_anthropic import FakeStream
+from werkzeug.datastructures import FileStorage
+from io import BytesIO
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-key'
+
+    with app.test_client() as client:
+        yield client
+
+def test_histogram_renders_cumulative_buckets():
+    """Test Prometheus text rendering of a labelled histogram"""
+    registry = Registry()
+    histogram = registry.histogram('stage_seconds', 'Stage latency', ('stage',), buckets=(0.1, 1))
+    histogram.observe(0.05, stage='search')
+    histogram.observe(0.5, stage='search')
+    histogram.observe(5, stage='search')
+
+    output = registry.render()
+
+    assert '# TYPE stage_seconds histogram' in output
+    assert 'stage_seconds_bucket{stage="search",le="0.1"} 1' in output
+    assert 'stage_seconds_bucket{stage="search",le="1"} 2' in output
+    assert 'stage_seconds_bucket{stage="search",le="+Inf"} 3' in output
+    assert 'stage_seconds_count{stage="search"} 3' in output
+
+def test_counter_rejects_wrong_labels():
+    """Test that counters validate their label names"""
+    registry = Registry()
+    counter = registry.counter('tokens_total', 'Tokens', ('kind',))
+    counter.inc(3, kind='input')
+
+    with pytest.raises(ValueError):
+        counter.inc(1, mode='input')
+    assert counter.value(kind='input') == 3
+
+def test_label_values_are_escaped():
+    """Test escaping of quotes and newlines in label values"""
+    registry = Registry()
+    registry.counter('events_total', 'Events', ('name',)).inc(name='a"b\nc')
+
+    assert 'events_total{name="a\\"b\\nc"} 1' in registry.render()
+
+def test_estimate_size_counts_nested_content():
+    """Test that the memory estimate grows with nested content"""
+    small = {'messages': [{'content': 'x'}]}
+    large = {'messages': [{'content': 'x' * 10000}]}
+
+    assert estimate_size(large) - estimate_size(small) >= 9999
+
+def test_metrics_endpoint_reports_route_latency(client):
+    """Test that requests are timed per route and exposed at /metrics"""
+    client.get('/api/conversation')
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    body = response.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/conversation",status="200"}' in body
+    assert 'conversations_live ' in body
+    assert 'conversations_memory_bytes ' in body
+    assert 'upstream_circuit_open{upstream="anthropic"} 0' in body
+
+@patch('app.THINKING_STRATEGY', 'template')
+@patch('app.anthropic_client')
+def test_chat_records_token_usage_by_thinking_mode(mock_anthropic, client):
+    """Test that token usage from response.usage feeds the counters"""
+    mock_anthropic.messages.stream.return_value = FakeStream("Analysis", input_tokens=120, output_tokens=30)
+    before = LLM_TOKENS.value(thinking_mode='deep_analysis', kind='output')
+
+    response = client.post('/api/chat', json={'message': 'Why?', 'thinking_mode': 'deep_analysis'})
+
+    assert response.status_code == 200
+    assert LLM_TOKENS.value(thinking_mode='deep_analysis', kind='output') - before == 30
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'llm_duration_seconds_count{model="claude-sonnet-4-20250514",thinking_mode="deep_analysis"}' in body
+    assert 'llm_time_to_first_token_seconds_count{model="claude-sonnet-4-20250514"}' in body
+
+def test_file_extraction_is_timed_per_mime_type():
+    """Test that file extraction latency is labelled by MIME type"""
+    file = FileStorage(stream=BytesIO(b'mock pdf'), filename='test.pdf', content_type='application/pdf')
+    before = FILE_EXTRACTION_LATENCY.count(mime_type='application/pdf')
+
+    with patch('magic.from_file', return_value='application/pdf'):
+        with patch.object(FileProcessor, '_extract_pdf_text', return_value='PDF text'):
+            FileProcessor.process_file(file)
+
+    assert FILE_EXTRACTION_LATENCY.count(mime_type='application/pdf') == before + 1
+
+def test_socketio_client_gauge(client):
+    """Test that connected Socket.IO clients are counted"""
+    socket_client = socketio.test_client(app, flask_test_client=client)
+    assert 'socketio_connected_clients 1' in client.get('/metrics').get_data(as_text=True)
+
+    socket_client.disconnect()
+    assert 'socketio_connected_clients 0' in client.get('/metrics').get_data(as_text=True)
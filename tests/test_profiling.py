@@ -0,0 +1,109 @@
+import signal
+import time
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+
+from app import app, FileProcessor, PROFILER
+from profiling import ProfileStore, SamplingProfiler, collapse
+
+ADMIN = {'X-Admin-Token': 'secret'}
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-key'
+    with app.test_client() as client:
+        yield client
+
+@pytest.fixture
+def store(tmp_path):
+    PROFILER.install()
+    store = ProfileStore(str(tmp_path), keep=2)
+    with patch('app.ADMIN_TOKEN', 'secret'), patch('app.PROFILE_STORE', store):
+        yield store
+
+def burn_cpu(seconds):
+    deadline = time.process_time() + seconds
+    while time.process_time() < deadline:
+        sum(i * i for i in range(1000))
+
+def slow_extract(file_path, filename):
+    burn_cpu(0.2)
+    return {'filename': filename, 'content': 'text', 'mime_type': 'text/plain', 'size': 4}
+
+def test_collapse_orders_frames_root_first():
+    """Test the collapsed-stack line for the current frame"""
+    def inner():
+        import sys
+        return collapse(sys._getframe())
+
+    stack = inner().split(';')
+    assert stack[-1].startswith('inner (tests/test_profiling.py:')
+    assert stack[-2].startswith('test_collapse_orders_frames_root_first ')
+
+def test_profiler_samples_cpu_time():
+    """Test that a session collects samples of the code that was running"""
+    profiler = SamplingProfiler(interval=0.002)
+    previous = signal.getsignal(signal.SIGPROF)
+    try:
+        assert profiler.install()
+        session = profiler.start()
+        burn_cpu(0.1)
+        profiler.stop(session)
+    finally:
+        # Give the SIGPROF handler back to the app's profiler
+        signal.signal(signal.SIGPROF, previous)
+
+    assert profiler.active() == 0
+    assert session.samples > 0
+    assert any('burn_cpu' in stack for stack in session.stacks)
+    assert session.collapsed().splitlines()[0].rsplit(' ', 1)[1].isdigit()
+
+def test_profile_header_requires_admin(client, store):
+    """Test that X-Profile is ignored without the admin token"""
+    with patch.object(FileProcessor, 'extract', side_effect=slow_extract):
+        response = client.post('/api/upload', data={'file': (BytesIO(b'text'), 'a.txt')},
+                               headers={'X-Profile': '1'}, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert 'X-Profile-Id' not in response.headers
+    assert store.list() == []
+
+def test_profiled_upload_can_be_listed_and_downloaded(client, store):
+    """Test profiling one request on demand, then fetching its flamegraph input"""
+    with patch.object(FileProcessor, 'extract', side_effect=slow_extract):
+        response = client.post('/api/upload', data={'file': (BytesIO(b'text'), 'a.txt')},
+                               headers={'X-Profile': '1', **ADMIN}, content_type='multipart/form-data')
+
+    profile_id = response.headers['X-Profile-Id']
+    listing = client.get('/api/admin/profiles', headers=ADMIN).get_json()['profiles']
+    assert [entry['id'] for entry in listing] == [profile_id]
+    assert listing[0]['endpoint'] == 'upload_file'
+    assert listing[0]['samples'] > 0
+
+    assert client.get(f'/api/admin/profiles/{profile_id}?token=secret').status_code == 403
+    download = client.get(f'/api/admin/profiles/{profile_id}', headers=ADMIN)
+    assert download.status_code == 200
+    assert 'burn_cpu' in download.get_data(as_text=True)
+    assert PROFILER.active() == 0
+
+def test_sample_rate_and_retention(client, store):
+    """Test sampling without the header and that only the newest profiles are kept"""
+    with patch('app.PROFILE_SAMPLE_RATE', 1.0):
+        for _ in range(3):
+            client.post('/api/search', json={'query': ''})
+        client.get('/api/conversation')
+
+    profiles = store.list()
+    assert len(profiles) == 2
+    assert {entry['endpoint'] for entry in profiles} == {'search'}
+
+def test_admin_endpoints_are_guarded(client):
+    """Test that profiles are hidden without a configured token and refused with a wrong one"""
+    with patch('app.ADMIN_TOKEN', None):
+        assert client.get('/api/admin/profiles').status_code == 404
+    with patch('app.ADMIN_TOKEN', 'secret'):
+        assert client.get('/api/admin/profiles', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+        assert client.get('/api/admin/profiles/..%2Fapp', headers=ADMIN).status_code == 404
@@ -0,0 +1,94 @@
+import uuid
+from unittest.mock import patch
+
+from flask import Flask
+from flask_socketio import SocketIO
+from socketio.packet import Packet
+
+import app as app_module
+from app import app, emit_to_session
+from fake_anthropic import FakeStream
+from realtime import InProcessManager, queue_options, session_room
+
+def _worker(channel):
+    # A separate Socket.IO server in this process, standing in for another gunicorn worker
+    worker_app = Flask(__name__)
+    sio = SocketIO(worker_app, client_manager=InProcessManager(channel=channel))
+    delivered = []
+
+    def send_eio_packet(eio_sid, eio_packet):
+        decoded = Packet(encoded_packet=eio_packet.data)
+        delivered.append((eio_sid, decoded.data[0], decoded.data[1]))
+
+    # Flask-SocketIO's test client refuses message queues, so capture outgoing packets directly
+    sio.server._send_eio_packet = send_eio_packet
+    sio.server.manager.initialize()
+    return sio, delivered
+
+def test_queue_options():
+    """Test how the configured queue URL maps to SocketIO options"""
+    assert queue_options(None, 'chan') == {}
+    assert queue_options('redis://localhost:6379/0', 'chan') == {'message_queue': 'redis://localhost:6379/0', 'channel': 'chan'}
+    assert isinstance(queue_options('memory://', 'chan')['client_manager'], InProcessManager)
+
+def test_emit_to_session_reaches_only_that_session():
+    """Test that session events go to the session's room"""
+    flask_client = app.test_client()
+    with flask_client.session_transaction() as flask_session:
+        flask_session['session_id'] = 'realtime-session'
+    other_client = app.test_client()
+    with other_client.session_transaction() as flask_session:
+        flask_session['session_id'] = 'other-session'
+
+    socket_client = app_module.socketio.test_client(app, flask_test_client=flask_client)
+    other_socket = app_module.socketio.test_client(app, flask_test_client=other_client)
+    try:
+        emit_to_session('realtime-session', 'chat_status', {'stage': 'generating'})
+
+        received = socket_client.get_received()
+        assert [(p['name'], p['args'][0]) for p in received] == [('chat_status', {'stage': 'generating'})]
+        assert other_socket.get_received() == []
+    finally:
+        socket_client.disconnect()
+        other_socket.disconnect()
+
+@patch('app.anthropic_client')
+def test_chat_reports_progress_to_the_session(mock_anthropic):
+    """Test that chat progress is pushed to the session's sockets"""
+    mock_anthropic.messages.stream.return_value = FakeStream('Answer', output_tokens=3)
+    flask_client = app.test_client()
+    with flask_client.session_transaction() as flask_session:
+        flask_session['session_id'] = 'status-session'
+    socket_client = app_module.socketio.test_client(app, flask_test_client=flask_client)
+    try:
+        response = flask_client.post('/api/chat', json={'message': 'Hello'})
+
+        stages = [p['args'][0]['stage'] for p in socket_client.get_received() if p['name'] == 'chat_status']
+        assert stages == ['generating', 'complete']
+        assert response.status_code == 200
+    finally:
+        socket_client.disconnect()
+
+def test_events_cross_workers_through_the_queue():
+    """Test that an event emitted on one worker reaches a client connected to another"""
+    channel = f'test-{uuid.uuid4().hex}'
+    sio_a, delivered_a = _worker(channel)
+    sio_b, delivered_b = _worker(channel)
+    manager_b = sio_b.server.manager
+    sid = manager_b.connect('client-on-b', '/')
+    manager_b.enter_room(sid, '/', session_room('shared-session'))
+    manager_b.connect('other-client-on-b', '/')
+    try:
+        # Background work on worker A, which has no clients of its own
+        sio_a.emit('job_progress', {'done': 3, 'total': 10}, to=session_room('shared-session'))
+
+        for _ in range(200):
+            if delivered_b:
+                break
+            sio_b.sleep(0.01)
+        sio_b.sleep(0.05)
+        assert delivered_b == [('client-on-b', 'job_progress', {'done': 3, 'total': 10})]
+        assert delivered_a == []
+    finally:
+        sio_a.server.manager.close()
+        manager_b.close()
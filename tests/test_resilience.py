@@ -0,0 +1,238 @@
+import pytest
+import json
+from unittest.mock import patch
+
+import anthropic
+import requests
+
+import app as app_module
+from app import app, WebSearcher, http_get
+from resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    call_with_resilience,
+    classify_requests_error,
+    parse_retry_after,
+)
+from stub_server import StubServer
+
+ANTHROPIC_MESSAGE = {
+    'id': 'msg_stub',
+    'type': 'message',
+    'role': 'assistant',
+    'model': 'claude-sonnet-4-20250514',
+    'content': [{'type': 'text', 'text': 'Hello from the stub'}],
+    'stop_reason': 'end_turn',
+    'stop_sequence': None,
+    'usage': {'input_tokens': 12, 'output_tokens': 5}
+}
+
+def _event_stream(message):
+    # The same reply as a Messages API event stream, which is how chat() reads it
+    text = message['content'][0]['text']
+    events = [
+        {'type': 'message_start', 'message': {**message, 'content': [], 'stop_reason': None,
+                                              'usage': {**message['usage'], 'output_tokens': 0}}},
+        {'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}},
+        {'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': text}},
+        {'type': 'content_block_stop', 'index': 0},
+        {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+         'usage': {'output_tokens': message['usage']['output_tokens']}},
+        {'type': 'message_stop'}
+    ]
+    return ''.join(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n" for event in events).encode('utf-8')
+
+ANTHROPIC_STREAM = (_event_stream(ANTHROPIC_MESSAGE), {'Content-Type': 'text/event-stream'})
+
+BRAVE_RESULTS = {
+    'web': {'results': [{'title': 'Brave Result', 'url': 'https://example.com', 'description': 'From brave'}]}
+}
+
+DDG_HTML = """
+<div class="result">
+    <a class="result__a" href="https://example.com/ddg">DDG Result</a>
+    <a class="result__snippet">From duckduckgo</a>
+</div>
+"""
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def stub():
+    server = StubServer().start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def upstreams(stub):
+    breakers = {name: CircuitBreaker(name, failure_threshold=2, reset_timeout=60) for name in ('anthropic', 'brave', 'duckduckgo')}
+    endpoints = {'brave': f"{stub.url}/brave", 'duckduckgo': f"{stub.url}/ddg"}
+    with patch('app.UPSTREAM_BREAKERS', breakers), \
+            patch('app.SEARCH_ENDPOINTS', endpoints), \
+            patch('app.UPSTREAM_RETRY_POLICY', RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)):
+        yield breakers
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-key'
+
+    with app.test_client() as client:
+        yield client
+
+def test_backoff_is_capped_and_honors_retry_after():
+    """Test that backoff stays under the cap and respects Retry-After"""
+    policy = RetryPolicy(base_delay=1, max_delay=4, max_retry_after=10)
+
+    for attempt in range(10):
+        assert 0 <= policy.backoff(attempt) <= 4
+    assert policy.backoff(0, retry_after=7) == 7
+    assert policy.backoff(0, retry_after=60) is None
+
+def test_parse_retry_after():
+    """Test parsing Retry-After in seconds and HTTP-date form"""
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert parse_retry_after('garbage') is None
+    assert parse_retry_after(None) is None
+
+def test_circuit_breaker_opens_and_probes_half_open():
+    """Test the closed -> open -> half-open -> closed cycle"""
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=10, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now = 11
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()  # the single probe
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()['total_rejections'] == 2
+
+def test_failed_probe_reopens_circuit():
+    """Test that a failing half-open probe opens the circuit again"""
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=10, clock=clock)
+
+    breaker.record_failure()
+    clock.now = 10
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_retry_after_header_is_honored(stub):
+    """Test that a 429 with Retry-After waits the advertised time before retrying"""
+    stub.add('GET', '/search', (429, {'error': 'slow down'}, {'Retry-After': '2'}), (200, {'ok': True}))
+    sleeps = []
+
+    response = call_with_resilience(
+        lambda: http_get(f"{stub.url}/search", timeout=5),
+        None,
+        RetryPolicy(max_attempts=3, base_delay=0, max_delay=0),
+        classify_requests_error,
+        sleep=sleeps.append
+    )
+
+    assert response.json() == {'ok': True}
+    assert sleeps == [2.0]
+
+def test_client_errors_are_not_retried(stub):
+    """Test that non-transient HTTP errors are surfaced without retries"""
+    stub.add('GET', '/search', (404, {'error': 'missing'}))
+
+    response = call_with_resilience(
+        lambda: http_get(f"{stub.url}/search", timeout=5),
+        None,
+        RetryPolicy(max_attempts=3, base_delay=0, max_delay=0),
+        classify_requests_error
+    )
+
+    assert response.status_code == 404
+    assert len(stub.hits('GET', '/search')) == 1
+
+def test_connection_errors_are_retried():
+    """Test that connection failures are classified as transient"""
+    assert classify_requests_error(requests.ConnectionError()) == (True, None)
+    assert classify_requests_error(ValueError()) == (False, None)
+
+def test_brave_search_retries_transient_errors(stub, upstreams):
+    """Test that Brave search survives a transient 503"""
+    stub.add('GET', '/brave', (503, {'error': 'unavailable'}), (200, BRAVE_RESULTS))
+
+    with patch('app.BRAVE_API_KEY', 'mock-api-key'):
+        results = WebSearcher.search_web('test query')
+
+    assert results[0]['title'] == 'Brave Result'
+    assert len(stub.hits('GET', '/brave')) == 2
+    assert upstreams['brave'].state == CircuitBreaker.CLOSED
+
+def test_open_brave_circuit_falls_back_to_duckduckgo(stub, upstreams):
+    """Test that a dead Brave endpoint trips its breaker and is skipped"""
+    stub.add('GET', '/brave', (500, {'error': 'boom'}))
+    stub.add('GET', '/ddg', (200, DDG_HTML))
+
+    with patch('app.BRAVE_API_KEY', 'mock-api-key'):
+        first = WebSearcher.search_web('test query')
+        second = WebSearcher.search_web('test query')
+
+    assert first[0]['source'] == 'duckduckgo'
+    assert second[0]['source'] == 'duckduckgo'
+    assert upstreams['brave'].state == CircuitBreaker.OPEN
+    # The breaker opened during the first search; the second never hit Brave
+    assert len(stub.hits('GET', '/brave')) == 2
+    assert len(stub.hits('GET', '/ddg')) == 2
+
+def test_chat_retries_overloaded_anthropic(stub, upstreams, client):
+    """Test that chat retries a 529 from the Anthropic API"""
+    stub.add('POST', '/v1/messages', (529, {'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'Overloaded'}}), (200, *ANTHROPIC_STREAM))
+    stub_client = anthropic.Anthropic(api_key='test', base_url=stub.url, max_retries=0)
+
+    with patch('app.anthropic_client', stub_client):
+        response = client.post('/api/chat', json={'message': 'Hello'})
+
+    assert response.status_code == 200
+    assert response.get_json()['response'] == 'Hello from the stub'
+    assert len(stub.hits('POST', '/v1/messages')) == 2
+
+def test_chat_fails_fast_when_circuit_open(stub, upstreams, client):
+    """Test that chat returns 503 without calling Anthropic once the breaker is open"""
+    stub.add('POST', '/v1/messages', (500, {'type': 'error', 'error': {'type': 'api_error', 'message': 'boom'}}))
+    stub_client = anthropic.Anthropic(api_key='test', base_url=stub.url, max_retries=0)
+
+    with patch('app.anthropic_client', stub_client):
+        first = client.post('/api/chat', json={'message': 'Hello'})
+        second = client.post('/api/chat', json={'message': 'Hello again'})
+
+    assert first.status_code == 503
+    assert second.status_code == 503
+    assert 'Retry-After' in second.headers
+    assert len(stub.hits('POST', '/v1/messages')) == 2
+
+def test_upstream_health_endpoint(upstreams, client):
+    """Test that breaker state is exposed for monitoring"""
+    upstreams['brave'].record_failure()
+    upstreams['brave'].record_failure()
+
+    response = client.get('/api/health/upstreams')
+
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['brave']['state'] == 'open'
+    assert data['anthropic']['state'] == 'closed'
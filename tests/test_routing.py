@@ -0,0 +1,72 @@
+from unittest.mock import patch
+
+import pytest
+
+from app import app
+from fake_anthropic import FakeStream
+from routing import DEFAULT_MODEL, ModelRouter, Route
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-key'
+    with app.test_client() as client:
+        yield client
+
+@pytest.fixture
+def mock_claude():
+    with patch('app.anthropic_client') as mock_anthropic:
+        mock_anthropic.messages.stream.return_value = FakeStream('Answer')
+        yield mock_anthropic
+
+def test_default_policy():
+    """Test that only short plain turns leave the default model"""
+    router = ModelRouter()
+
+    assert router.route('normal', prompt_chars=200).name == 'quick'
+    assert router.route('normal', prompt_chars=20_000).name == 'standard'
+    assert router.route('normal', prompt_chars=200, has_files=True).name == 'standard'
+    assert router.route('normal', prompt_chars=200, has_search=True).name == 'standard'
+    assert router.route('deep_analysis', prompt_chars=200).model == DEFAULT_MODEL
+
+def test_first_matching_route_wins():
+    """Test table order and the catch-all fallback"""
+    router = ModelRouter([
+        Route('research', 'big-model', max_tokens=8000, thinking_modes=('research_synthesis',), search=True),
+        Route('small', 'small-model', max_prompt_chars=100),
+    ])
+
+    assert router.route('research_synthesis', prompt_chars=50, has_search=True).name == 'research'
+    assert router.route('research_synthesis', prompt_chars=50).name == 'small'
+    assert router.route('normal', prompt_chars=500).name == 'default'
+
+def test_policy_from_json():
+    """Test loading the policy table from configuration"""
+    router = ModelRouter.from_json('[{"name": "fast", "model": "m", "max_tokens": 100, "thinking_modes": ["normal"]}]')
+
+    route = router.route('normal', prompt_chars=10)
+    assert (route.name, route.model, route.max_tokens) == ('fast', 'm', 100)
+    assert ModelRouter.from_json(None).routes == ModelRouter().routes
+
+def test_chat_uses_the_routed_model(client, mock_claude):
+    """Test that the chosen route sets the model and token limit and is recorded on the reply"""
+    response = client.post('/api/chat', json={'message': 'Thanks!'})
+
+    options = mock_claude.messages.stream.call_args.kwargs
+    assert options['model'] == 'claude-3-5-haiku-20241022'
+    assert options['max_tokens'] == 2000
+    data = response.get_json()
+    assert (data['route'], data['model']) == ('quick', options['model'])
+
+    metadata = client.get('/api/conversation').get_json()['messages'][-1]['metadata']
+    assert metadata['route'] == 'quick'
+    assert metadata['model'] == options['model']
+    assert isinstance(metadata['llm_latency_ms'], int)
+
+@patch('app.MODEL_ROUTER', ModelRouter([Route('all', 'custom-model', max_tokens=1234)]))
+def test_chat_follows_the_configured_policy(client, mock_claude):
+    """Test that a custom policy table replaces the defaults"""
+    client.post('/api/chat', json={'message': 'Hello'})
+
+    options = mock_claude.messages.stream.call_args.kwargs
+    assert (options['model'], options['max_tokens']) == ('custom-model', 1234)
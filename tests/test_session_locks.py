@@ -0,0 +1,170 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app import app, CANCELLATIONS, ConversationManager, conversation_manager
+from fake_anthropic import FakeStream
+from sessionlocks import SessionLocks, TurnQueue, TurnTimeout
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-key'
+    with app.test_client() as client:
+        yield client
+
+def _use_session(client, session_id):
+    with client.session_transaction() as flask_session:
+        flask_session['session_id'] = session_id
+
+def test_session_locks_are_stable_and_shared_by_shard():
+    """Test that a session always maps to the same lock and one shard means one global lock"""
+    locks = SessionLocks(shards=8)
+    single = SessionLocks(shards=1)
+
+    assert len(locks) == 8
+    assert locks('abc') is locks('abc')
+    assert single('abc') is single('xyz')
+
+def test_turns_run_in_arrival_order():
+    """Test that queued turns in one session run one at a time, first come first served"""
+    queue = TurnQueue(SessionLocks())
+    order = []
+    first = queue.turn('s1')
+    first.__enter__()
+
+    def later(index):
+        with queue.turn('s1'):
+            order.append(index)
+
+    threads = []
+    for index in range(5):
+        thread = threading.Thread(target=later, args=(index,))
+        thread.start()
+        threads.append(thread)
+        # Wait until the thread holds its ticket so arrival order is deterministic
+        while queue.waiting('s1') < index + 2:
+            time.sleep(0.001)
+    first.__exit__(None, None, None)
+    for thread in threads:
+        thread.join()
+
+    assert order == [0, 1, 2, 3, 4]
+    assert queue.waiting('s1') == 0
+
+def test_timed_out_turn_is_skipped():
+    """Test that a turn that gave up waiting doesn't block the ones behind it"""
+    queue = TurnQueue(SessionLocks())
+    ran = []
+
+    with queue.turn('s1'):
+        with pytest.raises(TurnTimeout):
+            with queue.turn('s1', timeout=0.01):
+                ran.append('timed out')
+        with queue.turn('other', timeout=0.01):
+            ran.append('other session')
+
+        def waiter_turn():
+            with queue.turn('s1'):
+                ran.append('waiter')
+
+        waiter = threading.Thread(target=waiter_turn)
+        waiter.start()
+        while queue.waiting('s1') < 2:
+            time.sleep(0.001)
+    waiter.join(timeout=1)
+
+    assert not waiter.is_alive()
+    assert ran == ['other session', 'waiter']
+    assert queue.waiting('s1') == 0
+
+def test_concurrent_turns_keep_each_session_ordered():
+    """Test that answers always follow their own question with many clients per session"""
+    manager = ConversationManager(locks=SessionLocks(shards=4))
+
+    def client(session_id, name):
+        for index in range(10):
+            with manager.turn(session_id) as epoch:
+                manager.add_message(session_id, 'user', f'{name}-{index}', epoch=epoch)
+                time.sleep(0.0005)
+                manager.add_message(session_id, 'assistant', f're: {name}-{index}', epoch=epoch)
+
+    threads = [threading.Thread(target=client, args=(f'session-{s}', f'c{c}')) for s in range(10) for c in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for index in range(10):
+        messages = manager.conversations[f'session-{index}'].messages
+        assert len(messages) == 60
+        for question, answer in zip(messages[::2], messages[1::2]):
+            assert (question.role, answer.role) == ('user', 'assistant')
+            assert answer.content == f're: {question.content}'
+
+def test_stale_epoch_is_not_stored():
+    """Test that a turn's messages are dropped once the conversation was cleared"""
+    manager = ConversationManager()
+
+    with manager.turn('s1') as epoch:
+        assert manager.add_message('s1', 'user', 'Hello', epoch=epoch) is not None
+        manager.clear_conversation('s1')
+        assert manager.add_message('s1', 'assistant', 'Hi', epoch=epoch) is None
+
+    assert manager.conversations['s1'].messages == []
+
+@patch('app.anthropic_client')
+def test_clear_during_a_turn_drops_the_answer(mock_anthropic, client):
+    """Test that an answer still streaming when the conversation is cleared is cancelled and not stored"""
+    mock_anthropic.messages.stream.return_value = FakeStream('one two three four', output_tokens=4)
+    _use_session(client, 'clear-mid-turn')
+    client.post('/api/clear')
+
+    def emit(session_id, event, payload):
+        # What /api/clear does, as the first words arrive
+        if event == 'chat_delta':
+            CANCELLATIONS.cancel(session_id, reason='cleared')
+            conversation_manager.clear_conversation(session_id)
+
+    with patch('app.emit_to_session', emit):
+        response = client.post('/api/chat', json={'message': 'Hello', 'request_id': 'req-1'})
+
+    assert response.status_code == 409
+    assert response.get_json()['cancelled'] is True
+    assert conversation_manager.conversations['clear-mid-turn'].messages == []
+    assert len(CANCELLATIONS) == 0
+
+@patch('app.anthropic_client')
+def test_busy_session_answers_409(mock_anthropic, client):
+    """Test that a message gives up when the session's previous turn doesn't finish in time"""
+    _use_session(client, 'busy-session')
+    client.post('/api/clear')
+
+    with conversation_manager.turn('busy-session'), patch('app.CHAT_TURN_TIMEOUT', 0.01):
+        response = client.post('/api/chat', json={'message': 'Hello'})
+
+    assert response.status_code == 409
+    assert conversation_manager.conversations['busy-session'].messages == []
+    assert conversation_manager.turns.waiting('busy-session') == 0
+    mock_anthropic.messages.stream.assert_not_called()
+
+@patch('app.anthropic_client')
+def test_clear_before_the_prompt_is_built_ends_the_turn(mock_anthropic, client):
+    """Test that a clear between storing the question and reading the history answers 409, not 500"""
+    _use_session(client, 'clear-before-prompt')
+    client.post('/api/clear')
+    get_messages_for_api = conversation_manager.get_messages_for_api
+
+    def clear_first(session_id, epoch=None):
+        conversation_manager.clear_conversation(session_id)
+        return get_messages_for_api(session_id, epoch=epoch)
+
+    with patch.object(conversation_manager, 'get_messages_for_api', side_effect=clear_first):
+        response = client.post('/api/chat', json={'message': 'Hello', 'thinking_mode': 'deep_analysis'})
+
+    assert response.status_code == 409
+    assert response.get_json()['cancelled'] is True
+    assert conversation_manager.conversations['clear-before-prompt'].messages == []
+    mock_anthropic.messages.stream.assert_not_called()
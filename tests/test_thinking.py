@@ -0,0 +1,90 @@
+from unittest.mock import patch
+
+import anthropic
+import pytest
+
+import app as app_module
+from app import ExtendedThinking, app, LLM_TOKENS
+from fake_anthropic import FakeStream
+from loadtest.stubs import UpstreamStubs
+
+@pytest.fixture
+def stubs():
+    server = UpstreamStubs(llm_latency=0, token_delay=0, output_tokens=40, search_latency=0).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def stub_client(stubs):
+    client = anthropic.Anthropic(api_key='stub', base_url=stubs.url, max_retries=0)
+    with patch('app.anthropic_client', client):
+        yield client
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-key'
+    with app.test_client() as client:
+        yield client
+
+def test_native_options_use_the_mode_budget():
+    """Test that each thinking mode gets its own budget on top of the answer allowance"""
+    options = ExtendedThinking.native_options('research_synthesis')
+
+    budget = app_module.THINKING_BUDGET_TOKENS['research_synthesis']
+    assert options['thinking'] == {'type': 'enabled', 'budget_tokens': budget}
+    assert options['max_tokens'] == budget + app_module.THINKING_ANSWER_TOKENS
+    assert options['system'] == ExtendedThinking.INSTRUCTIONS['research_synthesis']
+    assert ExtendedThinking.native_options('unknown')['system'] == ExtendedThinking.INSTRUCTIONS['deep_analysis']
+
+def test_native_thinking_streams_thinking_separately(client, stub_client):
+    """Test that thinking and answer deltas are pushed as separate events and kept apart in the reply"""
+    events = []
+    before = {kind: LLM_TOKENS.value(thinking_mode='deep_analysis', kind=kind) for kind in ('output', 'thinking')}
+
+    with patch('app.emit_to_session', lambda session_id, event, payload: events.append((event, payload))):
+        response = client.post('/api/chat', json={'message': 'Why?', 'thinking_mode': 'deep_analysis'})
+
+    assert response.status_code == 200
+    data = response.get_json()
+    thinking = ''.join(payload['delta'] for event, payload in events if event == 'chat_thinking')
+    answer = ''.join(payload['delta'] for event, payload in events if event == 'chat_delta')
+    assert thinking == data['thinking'] and thinking
+    assert answer == data['response'] and answer
+    # The stub spends 40 output tokens on the reasoning and the answer together; only that measured count is recorded
+    assert data['token_usage'] == 40
+    assert 0 < data['thinking_tokens_estimated'] < 40
+    assert LLM_TOKENS.value(thinking_mode='deep_analysis', kind='output') - before['output'] == 40
+    assert LLM_TOKENS.value(thinking_mode='deep_analysis', kind='thinking') == before['thinking']
+
+    messages = client.get('/api/conversation?include=metadata').get_json()['messages']
+    assert messages[0]['metadata']['native_thinking'] is True
+    assert messages[0]['metadata']['enhanced_prompt_used'] is False
+    assert messages[1]['metadata']['thinking'] == data['thinking']
+
+@patch('app.anthropic_client')
+def test_native_thinking_sends_the_original_prompt(mock_anthropic, client):
+    """Test that native mode sends a thinking budget instead of the prompt template"""
+    mock_anthropic.messages.stream.return_value = FakeStream('Answer')
+
+    response = client.post('/api/chat', json={'message': 'Why?', 'thinking_mode': 'strategic_thinking'})
+
+    assert response.status_code == 200
+    options = mock_anthropic.messages.stream.call_args.kwargs
+    assert options['messages'][-1]['content'] == 'Why?'
+    assert options['thinking']['budget_tokens'] == app_module.THINKING_BUDGET_TOKENS['strategic_thinking']
+
+@patch('app.THINKING_STRATEGY', 'template')
+@patch('app.anthropic_client')
+def test_template_strategy_is_the_fallback(mock_anthropic, client):
+    """Test that the template strategy still wraps the prompt and sends no thinking budget"""
+    mock_anthropic.messages.stream.return_value = FakeStream('Answer')
+
+    response = client.post('/api/chat', json={'message': 'Why?', 'thinking_mode': 'strategic_thinking'})
+
+    assert response.status_code == 200
+    options = mock_anthropic.messages.stream.call_args.kwargs
+    assert '<thinking>' in options['messages'][-1]['content']
+    assert options['max_tokens'] == 6000
+    assert 'thinking' not in options
+    assert response.get_json()['thinking'] is None
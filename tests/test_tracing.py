@@ -0,0 +1,124 @@
+import pytest
+import json
+import logging
+from io import BytesIO
+from unittest.mock import patch
+
+import tracing
+from fake_anthropic import FakeStream
+from app import app
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-key'
+
+    with app.test_client() as client:
+        yield client
+
+@pytest.fixture(autouse=True)
+def tracing_enabled():
+    with patch('app.TRACING_ENABLED', True):
+        yield
+
+@pytest.fixture
+def mock_claude():
+    with patch('app.anthropic_client') as mock_anthropic:
+        mock_anthropic.messages.stream.return_value = FakeStream("Traced response", output_tokens=10)
+        yield mock_anthropic
+
+def test_span_is_noop_without_trace():
+    """Test that spans cost nothing when no trace is active"""
+    assert tracing.current_trace() is None
+    with tracing.span('search') as current:
+        assert current is None
+
+def test_nested_spans_and_server_timing():
+    """Test span nesting and per-name aggregation in Server-Timing"""
+    trace = tracing.start_trace('chat')
+    try:
+        with tracing.span('search'):
+            with tracing.span('page_fetch'):
+                pass
+            with tracing.span('page_fetch'):
+                pass
+        with tracing.span('llm', model='test'):
+            pass
+    finally:
+        tracing.end_trace(trace)
+
+    tree = trace.to_dict()
+    assert tree['name'] == 'chat'
+    assert [child['name'] for child in tree['children']] == ['search', 'llm']
+    assert len(tree['children'][0]['children']) == 2
+    assert tree['children'][1]['attributes'] == {'model': 'test'}
+
+    header = trace.server_timing()
+    assert header.count('page_fetch;dur=') == 1
+    assert 'llm;dur=' in header
+    assert header.endswith(f"total;dur={trace.root.duration_ms:.1f}")
+    assert tracing.current_trace() is None
+
+def test_traced_decorator_records_span():
+    """Test that the decorator adds a span only inside a trace"""
+    @tracing.traced('work')
+    def work():
+        return 42
+
+    assert work() == 42
+    trace = tracing.start_trace('job')
+    work()
+    tracing.end_trace(trace)
+    assert trace.root.children[0].name == 'work'
+
+@patch('app.THINKING_STRATEGY', 'template')
+def test_chat_response_has_server_timing_and_trace_id(client, mock_claude):
+    """Test that chat responses carry the span breakdown and trace id"""
+    response = client.post('/api/chat', json={'message': 'Hello', 'thinking_mode': 'deep_analysis'})
+
+    assert response.status_code == 200
+    timing = response.headers['Server-Timing']
+    for stage in ('llm;dur=', 'history;dur=', 'store;dur=', 'thinking_prompt;dur=', 'total;dur='):
+        assert stage in timing
+    data = json.loads(response.data)
+    assert data['trace_id'] == response.headers['X-Trace-Id']
+
+def test_incoming_request_id_is_reused(client, mock_claude):
+    """Test that a caller-supplied request id becomes the trace id"""
+    response = client.post('/api/chat', json={'message': 'Hello'}, headers={'X-Request-ID': 'req-1234abcd'})
+
+    assert response.get_json()['trace_id'] == 'req-1234abcd'
+
+def test_upload_response_has_trace(client):
+    """Test that uploads report file extraction time"""
+    with patch('magic.from_file', return_value='application/pdf'):
+        with patch('app.FileProcessor._extract_pdf_text', return_value='PDF text'):
+            response = client.post(
+                '/api/upload',
+                data={'file': (BytesIO(b'%PDF'), 'test.pdf', 'application/pdf')},
+                content_type='multipart/form-data'
+            )
+
+    assert response.status_code == 200
+    assert 'file_extract;dur=' in response.headers['Server-Timing']
+    assert response.get_json()['trace_id'] == response.headers['X-Trace-Id']
+
+def test_tracing_disabled(client, mock_claude):
+    """Test that no trace headers or ids are produced when disabled"""
+    with patch('app.TRACING_ENABLED', False):
+        response = client.post('/api/chat', json={'message': 'Hello'})
+
+    assert response.status_code == 200
+    assert 'Server-Timing' not in response.headers
+    assert 'trace_id' not in response.get_json()
+
+def test_trace_log_emits_json_span_tree(client, mock_claude, caplog):
+    """Test structured JSON logging of the span tree"""
+    with patch('app.TRACE_LOG_ENABLED', True):
+        with caplog.at_level(logging.INFO, logger='claude_chat.trace'):
+            client.post('/api/chat', json={'message': 'Hello'})
+
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record['event'] == 'request_trace'
+    assert record['path'] == '/api/chat'
+    assert any(child['name'] == 'llm' for child in record['children'])
@@ -0,0 +1,125 @@
+import hashlib
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+
+from app import app, FileProcessor
+from upload_stream import UploadRejected, receive_upload
+
+class CountingStream(BytesIO):
+    """A request body or spooled file that records how much of it was read"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-key'
+    with app.test_client() as client:
+        yield client
+
+def _receive(stream, **kwargs):
+    options = {'sniff': lambda head: 'text/plain', 'accept': lambda mime_type: True, 'chunk_size': 1024, 'sniff_bytes': 2048}
+    options.update(kwargs)
+    return receive_upload(stream, 'a.txt', options.pop('max_bytes', 1 << 20), **options)
+
+def test_receive_hashes_and_spools_in_chunks():
+    """Test that the body is hashed incrementally and spills to disk past the spool size"""
+    data = b'x' * 10000
+
+    with _receive(CountingStream(data), spool_bytes=4096) as upload:
+        assert upload.sha256 == hashlib.sha256(data).hexdigest()
+        assert upload.size == len(data)
+        # Rolled over from memory to a real temp file
+        assert upload.file._rolled
+        assert upload.file.read() == data
+
+def test_unsupported_type_is_rejected_from_the_first_bytes():
+    """Test that sniffing stops the read long before the body ends"""
+    stream = CountingStream(b'\x7fELF' + b'\0' * 100000)
+    sniffed = []
+
+    with pytest.raises(UploadRejected) as excinfo:
+        _receive(stream, sniff=lambda head: sniffed.append(len(head)) or 'application/x-executable',
+                 accept=lambda mime_type: mime_type.startswith('text/'))
+
+    assert excinfo.value.status == 415
+    assert sniffed == [2048]
+    assert stream.bytes_read == 2048
+
+def test_short_bodies_are_sniffed_at_the_end():
+    """Test that files smaller than the sniff window are still typed"""
+    with _receive(CountingStream(b'hi'), sniff=lambda head: f'text/{len(head)}') as upload:
+        assert upload.mime_type == 'text/2'
+
+def test_size_limit_is_enforced_while_reading():
+    """Test that a body without a usable length is cut off at the limit"""
+    stream = CountingStream(b'x' * 10000)
+
+    with pytest.raises(UploadRejected) as excinfo:
+        _receive(stream, max_bytes=4096)
+
+    assert excinfo.value.status == 413
+    assert stream.bytes_read < 10000
+
+def test_text_extraction_reads_only_the_kept_prefix():
+    """Test that a large text file is sized from its end rather than read and decoded whole"""
+    data = 'é'.encode('utf-8') * 300000
+    source = CountingStream(data)
+
+    file_info = FileProcessor.extract_stream(source, 'accents.txt', 'text/plain')
+
+    assert file_info['content'] == 'é' * FileProcessor.MAX_CONTENT_CHARS
+    assert file_info['size'] == len(data)
+    assert source.bytes_read == 4 * FileProcessor.MAX_CONTENT_CHARS
+
+def test_stream_endpoint_extracts_and_attaches(client):
+    """Test a raw-body upload end to end, above the form upload limit"""
+    data = b'Hello from a large file\n' * 800000
+
+    with patch('app.STREAM_UPLOAD_MAX_BYTES', 64 * 1024 * 1024):
+        response = client.post('/api/upload/stream?filename=notes.txt', data=data,
+                                content_type='application/octet-stream')
+
+    assert len(data) > app.config['MAX_CONTENT_LENGTH']
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['sha256'] == hashlib.sha256(data).hexdigest()
+    assert body['bytes'] == len(data)
+    assert body['content_preview'].startswith('Hello from a large file')
+    messages = client.get('/api/conversation?include=metadata').get_json()['messages']
+    assert messages[-1]['metadata']['filename'] == 'notes.txt'
+
+def test_stream_endpoint_extracts_in_the_pool(client, tmp_path):
+    """Test that a streamed upload is parsed by an extraction worker and its file removed afterwards"""
+    # Patches don't reach spawned workers: this only fails if the request parses the file itself
+    in_request = patch.object(FileProcessor, 'extract_stream', side_effect=AssertionError('extracted in the request'))
+    with patch.dict(app.config, {'UPLOAD_FOLDER': str(tmp_path)}), patch('app.FILE_EXTRACTION_WORKERS', 1), in_request:
+        response = client.post('/api/upload/stream?filename=notes.txt', data=b'Parsed in a worker\n' * 1000)
+
+    assert response.status_code == 200
+    assert response.get_json()['content_preview'].startswith('Parsed in a worker')
+    assert list(tmp_path.iterdir()) == []
+
+def test_stream_endpoint_rejections(client):
+    """Test the stream endpoint's 400, 413 and 415 answers"""
+    assert client.post('/api/upload/stream', data=b'abc').status_code == 400
+
+    with patch('app.STREAM_UPLOAD_MAX_BYTES', 10):
+        too_large = client.post('/api/upload/stream', data=b'x' * 11, headers={'X-Filename': 'a.txt'})
+    assert too_large.status_code == 413
+
+    with patch.object(FileProcessor, 'extract_stream') as extract:
+        unsupported = client.post('/api/upload/stream', data=b'\x7fELF\x02\x01\x01' + b'\0' * 64,
+                                  headers={'X-Filename': 'tool.bin'})
+    assert unsupported.status_code == 415
+    assert 'Unsupported file type' in unsupported.get_json()['error']
+    extract.assert_not_called()
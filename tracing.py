@@ -0,0 +1,158 @@
+import contextvars
+import functools
+import re
+import time
+import uuid
+from typing import Dict, Optional
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+_TRACE_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{8,64}$')
+
+
+class Span:
+    __slots__ = ('name', 'start', 'end', 'children', 'attributes')
+
+    def __init__(self, name: str, attributes: Optional[Dict] = None):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end = None
+        self.children = []
+        self.attributes = attributes
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self, origin: float) -> Dict:
+        data = {
+            'name': self.name,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round(self.duration_ms, 3),
+        }
+        if self.attributes:
+            data['attributes'] = self.attributes
+        if self.children:
+            data['children'] = [child.to_dict(origin) for child in self.children]
+        return data
+
+
+class Trace:
+    def __init__(self, name: str, trace_id: Optional[str] = None):
+        self.trace_id = trace_id if trace_id and _TRACE_ID_PATTERN.match(trace_id) else uuid.uuid4().hex
+        self.root = Span(name)
+        self._stack = [self.root]
+        self._token = None
+
+    def push(self, name: str, attributes: Optional[Dict] = None) -> Span:
+        span = Span(name, attributes)
+        self._stack[-1].children.append(span)
+        self._stack.append(span)
+        return span
+
+    def pop(self, span: Span):
+        span.end = time.perf_counter()
+        if self._stack[-1] is span:
+            self._stack.pop()
+
+    def finish(self):
+        if self.root.end is None:
+            self.root.end = time.perf_counter()
+
+    def server_timing(self) -> str:
+        # Sum durations per span name so repeated calls show up once
+        totals = {}
+        stack = list(self.root.children)
+        while stack:
+            span = stack.pop()
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+            stack.extend(span.children)
+        entries = [f"{name};dur={duration:.1f}" for name, duration in sorted(totals.items())]
+        entries.append(f"total;dur={self.root.duration_ms:.1f}")
+        return ', '.join(entries)
+
+    def to_dict(self) -> Dict:
+        return {'trace_id': self.trace_id, **self.root.to_dict(self.root.start)}
+
+
+class _SpanContext:
+    __slots__ = ('trace', 'name', 'attributes', 'span')
+
+    def __init__(self, trace: Trace, name: str, attributes: Optional[Dict]):
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes
+        self.span = None
+
+    def __enter__(self):
+        self.span = self.trace.push(self.name, self.attributes)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.pop(self.span)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def start_trace(name: str, trace_id: Optional[str] = None) -> Trace:
+    trace = Trace(name, trace_id)
+    trace._token = _current_trace.set(trace)
+    return trace
+
+
+def end_trace(trace: Trace) -> Trace:
+    trace.finish()
+    if trace._token is not None:
+        try:
+            _current_trace.reset(trace._token)
+        except ValueError:
+            # Reset from a different context; just detach
+            _current_trace.set(None)
+        trace._token = None
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def span(name: str, **attributes):
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return _SpanContext(trace, name, attributes or None)
+
+
+def traced(name: str):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = _current_trace.get()
+            if trace is None:
+                return func(*args, **kwargs)
+            current = trace.push(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                trace.pop(current)
+        return wrapper
+    return decorator
+
@@ -0,0 +1,78 @@
+import hashlib
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, IO, Optional
+
+
+class UploadRejected(Exception):
+    """Raised while receiving an upload that will not be accepted; carries the HTTP status to answer with"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@dataclass
+class SpooledUpload:
+    file: IO[bytes]
+    filename: str
+    mime_type: str
+    sha256: str
+    size: int
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def receive_upload(stream: BinaryIO, filename: str, max_bytes: int,
+                   sniff: Callable[[bytes], str], accept: Callable[[str], bool],
+                   chunk_size: int = 64 * 1024, spool_bytes: int = 1024 * 1024,
+                   sniff_bytes: int = 8192, spool: Optional[IO[bytes]] = None) -> SpooledUpload:
+    """Copies a request body into a spooled temp file in fixed-size chunks
+
+    The body is hashed as it arrives and its type is sniffed from the first
+    sniff_bytes, so an unsupported file is rejected before the rest is read.
+    Memory use is bounded by spool_bytes whatever the upload size. Pass spool
+    to receive into a file of your own instead, such as one at a known path.
+    """
+    spooled = spool if spool is not None else tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+    digest = hashlib.sha256()
+    head = b''
+    mime_type = None
+    size = 0
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadRejected(413, f'Upload exceeds {max_bytes} bytes')
+            digest.update(chunk)
+            spooled.write(chunk)
+            if mime_type is None:
+                head += chunk
+                if len(head) >= sniff_bytes:
+                    mime_type = _check_type(sniff(head), accept)
+                    head = b''
+        if mime_type is None:
+            # Bodies shorter than the sniff window
+            mime_type = _check_type(sniff(head), accept)
+        spooled.seek(0)
+        return SpooledUpload(spooled, filename, mime_type, digest.hexdigest(), size)
+    except BaseException:
+        spooled.close()
+        raise
+
+
+def _check_type(mime_type: str, accept: Callable[[str], bool]) -> str:
+    if not accept(mime_type):
+        raise UploadRejected(415, f'Unsupported file type: {mime_type}')
+    return mime_type